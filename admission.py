@@ -0,0 +1,287 @@
+"""Admission control and pacing for upstream LLM calls.
+
+AdmissionController caps the calls in flight in a worker, overall and per
+session. Callers that cannot start right away wait in a queue ordered by
+priority, so a user waiting on a quiz goes ahead of speculative work such
+as preloads and prefetches, and are shed with LLMBusyError (a 429 with
+Retry-After) once their wait runs out, the queue is full or their session
+already has as many calls waiting as it may have running.
+
+RateLimiter is a token bucket in front of the API. It paces nothing until
+the provider answers 429, then pauses for the provider's Retry-After and
+halves the request rate; the rate doubles again after each quiet period
+and the limit is lifted once it is well above demand.
+
+Who is calling is kept in a context variable: set_caller() for the
+request, background() around speculative work. Thread pools that run
+model calls submit with contextvars.copy_context().run so their jobs
+inherit it.
+"""
+import bisect
+import contextlib
+import contextvars
+import itertools
+import math
+import threading
+import time
+from collections import deque
+
+import metrics
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+_RANK = {INTERACTIVE: 0, BACKGROUND: 1}
+
+_caller = contextvars.ContextVar('llm_caller', default=(None, INTERACTIVE))
+
+
+class LLMBusyError(Exception):
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def set_caller(session_id, priority=INTERACTIVE):
+    if priority not in _RANK:
+        priority = INTERACTIVE
+    return _caller.set((session_id, priority))
+
+
+def reset_caller(token):
+    _caller.reset(token)
+
+
+def current_caller():
+    return _caller.get()
+
+
+@contextlib.contextmanager
+def background():
+    """Runs model calls started in the block (or by jobs submitted from
+    it) at background priority.
+    """
+    session_id, _ = _caller.get()
+    token = _caller.set((session_id, BACKGROUND))
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+
+class AdmissionController:
+
+    def __init__(self,
+                 max_in_flight=12,
+                 per_session=8,
+                 queue_timeout=20,
+                 background_timeout=5,
+                 max_queue=64):
+        self.max_in_flight = max_in_flight
+        self.per_session = per_session
+        self.timeouts = {
+            INTERACTIVE: queue_timeout,
+            BACKGROUND: background_timeout
+        }
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._in_flight = 0
+        self._sessions = {}
+        # Recent slot hold time, used to size Retry-After.
+        self._hold_seconds = 2.0
+        self.admitted = dict.fromkeys(_RANK, 0)
+        self.queued = dict.fromkeys(_RANK, 0)
+        self.shed = dict.fromkeys(_RANK, 0)
+
+    def _session_free(self, session_id):
+        return (session_id is None
+                or self._sessions.get(session_id, 0) < self.per_session)
+
+    def _next(self):
+        # The first waiter, in priority order, whose session is under its
+        # cap; a session at its cap does not hold up the others.
+        if self._in_flight >= self.max_in_flight:
+            return None
+        for waiter in self._waiting:
+            if self._session_free(waiter[2]):
+                return waiter
+        return None
+
+    def _shed(self, priority, reason):
+        self.shed[priority] += 1
+        metrics.inc('llm_admission_total', {
+            'priority': priority,
+            'result': 'shed'
+        })
+        retry_after = max(
+            1,
+            math.ceil(self._hold_seconds * (len(self._waiting) + 1) /
+                      self.max_in_flight))
+        return LLMBusyError(
+            f'The server is busy ({reason}), please retry in '
+            f'{retry_after}s', retry_after)
+
+    def acquire(self, session_id, priority, wait=True):
+        """Waits for a slot; raises LLMBusyError when the call is shed.
+        With wait=False, returns False instead of queueing when no slot is
+        free right away.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeouts[priority]
+        with self._cond:
+            if not wait and (self._waiting
+                             or self._in_flight >= self.max_in_flight
+                             or not self._session_free(session_id)):
+                return False
+            if len(self._waiting) >= self.max_queue:
+                raise self._shed(priority, 'queue is full')
+            if session_id is not None and sum(
+                    1 for waiter in self._waiting
+                    if waiter[2] == session_id) >= self.per_session:
+                raise self._shed(priority, 'too many requests in progress')
+
+            waiter = (_RANK[priority], next(self._seq), session_id)
+            bisect.insort(self._waiting, waiter)
+            try:
+                if self._next() is not waiter:
+                    self.queued[priority] += 1
+                while self._next() is not waiter:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._shed(priority, 'timed out waiting')
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting.remove(waiter)
+                self._cond.notify_all()
+
+            self._in_flight += 1
+            if session_id is not None:
+                self._sessions[session_id] = self._sessions.get(
+                    session_id, 0) + 1
+            self.admitted[priority] += 1
+        metrics.inc('llm_admission_total', {
+            'priority': priority,
+            'result': 'admitted'
+        })
+        metrics.observe('llm_admission_wait_seconds', {'priority': priority},
+                        time.monotonic() - started)
+        return True
+
+    def release(self, session_id, held_seconds):
+        with self._cond:
+            self._in_flight -= 1
+            if session_id is not None:
+                count = self._sessions.get(session_id, 0) - 1
+                if count > 0:
+                    self._sessions[session_id] = count
+                else:
+                    self._sessions.pop(session_id, None)
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held_seconds
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'in_flight': self._in_flight,
+                'waiting': len(self._waiting),
+                'sessions': len(self._sessions),
+                'admitted': dict(self.admitted),
+                'queued': dict(self.queued),
+                'shed': dict(self.shed)
+            }
+
+
+class RateLimiter:
+
+    def __init__(self, rate=0, burst=12, min_rate=0.2, recovery=30,
+                 window=10):
+        self.ceiling = rate or None
+        self.rate = self.ceiling
+        self.burst = burst
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self.window = window
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._limited_at = 0.0
+        self._starts = deque()
+        self.provider_limited = 0
+        self.delayed = 0
+
+    def _demand(self, now):
+        while self._starts and self._starts[0] < now - self.window:
+            self._starts.popleft()
+        return len(self._starts) / self.window
+
+    def _recover(self, now):
+        if not self._limited_at or now - self._limited_at < self.recovery:
+            return
+        self._limited_at = now
+        self.rate *= 2
+        if self.ceiling and self.rate >= self.ceiling:
+            self.rate = self.ceiling
+            self._limited_at = 0.0
+        elif not self.ceiling and self.rate >= 2 * self._demand(now):
+            self.rate = None
+            self._limited_at = 0.0
+
+    def reserve(self, timeout):
+        """Takes a token and returns how long to wait before the call, or
+        raises LLMBusyError if that would be longer than timeout.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._recover(now)
+            delay = max(0.0, self._paused_until - now)
+            if self.rate:
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._refilled) * self.rate)
+                self._refilled = now
+                if self._tokens < 1:
+                    delay = max(delay, (1 - self._tokens) / self.rate)
+            if delay > timeout:
+                raise LLMBusyError(
+                    'The AI provider is rate limiting requests, please '
+                    f'retry in {math.ceil(delay)}s', math.ceil(delay))
+            if self.rate:
+                self._tokens -= 1
+            if delay:
+                self.delayed += 1
+            self._demand(now)
+            self._starts.append(now + delay)
+            return delay
+
+    def provider_rejected(self, retry_after=None):
+        """Records a 429 from the provider: pauses every call for its
+        Retry-After and halves the rate (once per second at most, as calls
+        in flight tend to be rejected together).
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.provider_limited += 1
+            self._paused_until = max(self._paused_until,
+                                     now + (retry_after or 1))
+            if now - self._limited_at < 1:
+                return
+            current = self.rate or max(self._demand(now), self.min_rate)
+            self.rate = max(self.min_rate, current / 2)
+            self._tokens = min(self._tokens, 0.0)
+            self._refilled = now
+            self._limited_at = now
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'rate': self.rate,
+                'ceiling': self.ceiling,
+                'paused_seconds': max(0.0, self._paused_until - now),
+                'demand': self._demand(now),
+                'delayed': self.delayed,
+                'provider_limited': self.provider_limited
+            }
@@ -1,81 +1,453 @@
+import csv
+import mimetypes
 import os
 import json
 import secrets
-from flask import Flask, render_template, request, jsonify, session
-from openai import OpenAI
-
-app = Flask(__name__)
-if not os.environ.get('SESSION_SECRET'):
-    raise RuntimeError("SESSION_SECRET environment variable must be set")
-app.secret_key = os.environ.get('SESSION_SECRET')
+import time
+from collections import Counter
+import click
+from flask import (Blueprint, Flask, Response, abort, current_app, g,
+                   render_template, request, jsonify, send_from_directory,
+                   session, stream_with_context, url_for)
+from pydantic import ValidationError
+import admission
+import assets
+import metrics
+import prompts
+from cache import ResponseCache
+from clients import WorkerClient, create_openai_client
+from fanout import FanOut
+import grading
+from lazy_sections import SectionLoader
+from library import ContentLibrary, LibraryWriter, build
+import llm
+from llm import LLMBusyError, chat_completion, stream_chat_completion
+from prompts import compact_whitespace, fit, html_to_text
+from quiz_pipeline import QuizPipeline
+from results import ResultsLedger
+from sessions import StoreSessionInterface
+from similarity import SimilarityCache
+from storage import create_store
+from streaming import LearningContentStreamParser
+from structured import (InterviewQuiz, LearningOutline, LearningPlan, Quiz,
+                        Section, parse_document, parse_reply, response_format,
+                        structured_completion)
+
+# Routes and hooks live on a blueprint; create_app() builds the Flask app.
+bp = Blueprint('learning', __name__, cli_group=None)
+
+
+def new_session_id():
+    return secrets.token_urlsafe(32)
+
+
+# 'server' keeps session data in a store and only the session id in the
+# cookie; 'cookie' is Flask's default signed-cookie session.
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'server')
+session_storage = create_store(
+    'session',
+    ttl=int(os.environ.get('SESSION_TTL_SECONDS', 6 * 60 * 60)),
+    max_entries=int(os.environ.get('SESSION_MAX_ENTRIES', 100000))
+) if SESSION_BACKEND == 'server' else None
 
 # the newest OpenAI model is "gpt-5" which was released August 7, 2025.
 # do not change this unless explicitly requested by the user
-openai_client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-
-quiz_storage = {}
-content_storage = {}
+# Models are chosen per route; see ROUTES in llm.py.
+# The SDK is imported and the client built in each worker on first use; see
+# clients.py.
+openai_client = WorkerClient(
+    lambda: create_openai_client(api_key=os.environ.get('OPENAI_API_KEY')))
+
+quiz_storage = create_store('quiz')
+content_storage = create_store('content')
+
+# Bump whenever learning_plan_messages() changes so cached plans generated
+# from the old prompt are no longer served.
+LEARNING_PLAN_PROMPT_VERSION = 1
+
+content_cache = ResponseCache(
+    create_store('content_cache',
+                 ttl=int(os.environ.get('CONTENT_CACHE_TTL_SECONDS',
+                                        24 * 60 * 60)),
+                 max_entries=int(
+                     os.environ.get('CONTENT_CACHE_MAX_ENTRIES', 500)),
+                 max_bytes=int(
+                     os.environ.get('CONTENT_CACHE_MAX_BYTES',
+                                    64 * 1024 * 1024))),
+    version=LEARNING_PLAN_PROMPT_VERSION)
+
+# Bump whenever create_section_quiz() changes its prompt.
+SECTION_QUIZ_PROMPT_VERSION = 1
+
+# Section quizzes by the section they were written for, so a plan served
+# from the cache or the library does not cost a quiz generation per
+# section in every session that gets it.
+quiz_cache = ResponseCache(
+    create_store('quiz_cache',
+                 ttl=int(os.environ.get('CONTENT_CACHE_TTL_SECONDS',
+                                        24 * 60 * 60)),
+                 max_entries=int(
+                     os.environ.get('QUIZ_CACHE_MAX_ENTRIES', 5000))),
+    version=SECTION_QUIZ_PROMPT_VERSION)
+
+# Plans and quizzes pre-generated for popular topics with
+# `flask --app app pregenerate`, served before the cache and the API.
+CONTENT_LIBRARY_PATH = os.environ.get(
+    'CONTENT_LIBRARY_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'library',
+                 'content.lib'))
+content_library = ContentLibrary(CONTENT_LIBRARY_PATH)
+
+# Every graded submission, appended to a local log; /quiz-stats serves the
+# aggregates kept over it.
+results_ledger = ResultsLedger(
+    os.environ.get(
+        'RESULTS_LOG_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                     'results.log')),
+    max_entries=int(os.environ.get('RESULTS_MAX_TRACKED', 10000)),
+    snapshot_every=int(os.environ.get('RESULTS_SNAPSHOT_EVERY', 500)))
+
+# Fingerprinted, precompressed static files built by `python assets.py`.
+# Without a build (or in debug mode) templates link the plain static files.
+asset_manifest = assets.AssetManifest(
+    os.environ.get('ASSET_DIR', assets.DIST_DIR))
+ASSET_MAX_AGE = int(
+    os.environ.get('ASSET_MAX_AGE_SECONDS', 365 * 24 * 60 * 60))
+
+# Responses of these types are compressed when the client accepts it and
+# the body is at least COMPRESS_MIN_BYTES; smaller ones gain little.
+COMPRESS_MIMETYPES = frozenset(
+    os.environ.get('COMPRESS_MIMETYPES', 'application/json text/html').split())
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+
+eli5_cache = SimilarityCache(
+    create_store('eli5_cache',
+                 ttl=int(os.environ.get('ELI5_CACHE_TTL_SECONDS',
+                                        24 * 60 * 60)),
+                 max_entries=int(os.environ.get('ELI5_CACHE_MAX_SECTIONS',
+                                                2000))),
+    threshold=float(os.environ.get('ELI5_SIMILARITY_THRESHOLD', 0.9)),
+    per_bucket=int(os.environ.get('ELI5_CACHE_PER_SECTION', 20)))
+
+QUIZ_PIPELINE_ENABLED = os.environ.get('QUIZ_PIPELINE_ENABLED', '1') == '1'
+# Generate an outline first and each section's content when it is opened.
+# Clients can override it per request with "lazy" in the request body.
+CONTENT_LAZY_SECTIONS = os.environ.get('CONTENT_LAZY_SECTIONS', '0') == '1'
+
+# Upper bounds (estimated tokens) for the variable parts of prompts.
+PROMPT_SECTION_TOKEN_BUDGET = int(
+    os.environ.get('PROMPT_SECTION_TOKEN_BUDGET', 1500))
+PROMPT_JOB_DESCRIPTION_TOKEN_BUDGET = int(
+    os.environ.get('PROMPT_JOB_DESCRIPTION_TOKEN_BUDGET', 1500))
+QUIZ_WAIT_TIMEOUT = float(os.environ.get('QUIZ_WAIT_TIMEOUT_SECONDS', 60))
+# How long a streamed plan request waits for an identical one in flight.
+CONTENT_WAIT_TIMEOUT = float(
+    os.environ.get('CONTENT_WAIT_TIMEOUT_SECONDS', 120))
 
 API_KEY=123456
 API_KEY="123456"
 
-@app.route('/')
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.monotonic()
+
+
+@bp.before_app_request
+def identify_llm_caller():
+    # Model calls made for this request are admitted against its session;
+    # clients mark speculative requests (quiz preloads) as background. A
+    # visitor without a session yet is its own caller for this request: the
+    # client address would be the proxy's, shared by every new visitor.
+    g.llm_caller = admission.set_caller(
+        session.get('session_id') or f'request:{new_session_id()}',
+        request.headers.get('X-Request-Priority', admission.INTERACTIVE))
+
+
+@bp.teardown_app_request
+def forget_llm_caller(error=None):
+    token = g.pop('llm_caller', None)
+    if token is not None:
+        admission.reset_caller(token)
+
+
+@bp.after_app_request
+def record_request_duration(response):
+    started = g.get('request_started')
+    if started is not None:
+        metrics.observe(
+            'http_request_duration_seconds', {
+                'route': request.url_rule.rule
+                if request.url_rule else 'unmatched',
+                'method': request.method,
+                'status': response.status_code
+            }, time.monotonic() - started)
+        metrics.observe('http_request_header_bytes', {
+            'session_backend': SESSION_BACKEND
+        }, sum(
+            len(name) + len(value) + 4
+            for name, value in request.headers.items()))
+    return response
+
+
+@bp.after_app_request
+def compress_response(response):
+    if (response.mimetype not in COMPRESS_MIMETYPES
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.status_code < 200
+            or response.status_code in (204, 304)):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = None
+    if len(data) >= COMPRESS_MIN_BYTES:
+        encoding = assets.negotiate(request.headers.get('Accept-Encoding'),
+                                    assets.available_encodings())
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.inc('http_response_bytes_total', {
+        'route': route,
+        'stage': 'raw'
+    }, len(data))
+    if encoding:
+        data = assets.compress(data, encoding, COMPRESS_LEVEL)
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+    metrics.inc('http_response_bytes_total', {
+        'route': route,
+        'stage': 'sent'
+    }, len(data))
+    return response
+
+
+@bp.app_template_global()
+def asset_url(filename):
+    built = None if current_app.debug else asset_manifest.url_name(filename)
+    if built is None:
+        return url_for('static', filename=filename)
+    return url_for('learning.asset', filename=built)
+
+
+@bp.route('/assets/<path:filename>')
+def asset(filename):
+    encodings = asset_manifest.encodings(filename)
+    if encodings is None:
+        abort(404)
+    encoding = assets.negotiate(request.headers.get('Accept-Encoding'),
+                                encodings)
+    response = send_from_directory(
+        asset_manifest.dist_dir,
+        filename + {'br': '.br', 'gzip': '.gz'}.get(encoding, ''),
+        mimetype=mimetypes.guess_type(filename)[0],
+        max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
 
+@bp.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
 API_KEY=123456
 
+def learning_content_from(fields, sections):
+    overview = fields.get('overview')
+    if not isinstance(overview, str) or not overview.strip():
+        overview = 'Welcome to your learning session!'
+    return {'overview': overview, 'sections': sections}
+
+
 def validate_learning_content(content):
-    if not isinstance(content, dict):
+    parsed = parse_document(LearningPlan, content)
+    if not parsed or not parsed.valid_items():
         return None
+    return learning_content_from(parsed.fields, parsed.valid_items())
 
-    if 'overview' not in content or not isinstance(content['overview'], str):
-        content['overview'] = 'Welcome to your learning session!'
 
-    if 'sections' not in content or not isinstance(content['sections'], list):
+def validate_section(section):
+    try:
+        return Section.model_validate(section).model_dump()
+    except ValidationError:
         return None
 
-    validated_sections = []
-    for section in content['sections']:
-        if not isinstance(section, dict):
-            continue
 
-        estimated_time = section.get('estimated_time', 5)
-        if not isinstance(estimated_time, (int, float)):
-            try:
-                estimated_time = int(estimated_time)
-            except:
-                estimated_time = 5
-
-        validated_section = {
-            'title':
-            section.get('title', 'Untitled Section') if isinstance(
-                section.get('title'), str) else 'Untitled Section',
-            'estimated_time':
-            int(estimated_time),
-            'content':
-            section.get('content', 'Content not available') if isinstance(
-                section.get('content'), str) else 'Content not available',
-            'key_points':
-            section.get('key_points', []) if isinstance(
-                section.get('key_points'), list) else []
-        }
+def unsent_sections(sent, sections):
+    """The sections that are not among those already sent, matched by
+    title rather than position, so a section the stream skipped or the
+    model reordered is neither lost nor sent twice. Sections that share a
+    title are matched in order.
+    """
 
-        validated_section['key_points'] = [
-            str(point) for point in validated_section['key_points']
-            if point and isinstance(point, (str, int, float))
-        ]
+    def title(section):
+        return ' '.join(section['title'].casefold().split())
+
+    remaining = Counter(title(section) for section in sent)
+    unsent = []
+    for section in sections:
+        key = title(section)
+        if remaining[key]:
+            remaining[key] -= 1
+        else:
+            unsent.append(section)
+    return unsent
 
-        validated_sections.append(validated_section)
 
-    if not validated_sections:
+def llm_busy_response(error):
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+
+def more_questions_messages(messages, note=None):
+    """Follow-up request for the questions that came back invalid."""
+
+    def build(missing, questions, invalid):
+        asked = '\n'.join(f"- {q['question']}" for q in questions)
+        extra = f' {note(questions)}' if note else ''
+        return messages + [{
+            "role":
+            "user",
+            "content":
+            f"Create {missing} more question(s) in the same JSON format.{extra} They must be different from these:\n{asked}"
+        }]
+
+    return build
+
+
+def replacement_sections_messages(messages):
+    """Follow-up request for only the sections that came back invalid."""
+
+    def build(missing, sections, invalid):
+        titles = [
+            section['title'] for section in invalid
+            if isinstance(section, dict) and isinstance(
+                section.get('title'), str)
+        ]
+        which = ('these sections: ' + '; '.join(titles)
+                 if titles else f'{missing} section(s) that were incomplete')
+        written = '; '.join(section['title'] for section in sections)
+        return messages + [{
+            "role":
+            "user",
+            "content":
+            f"Some sections of the plan came back incomplete. Respond in the same JSON format with only {which}, written in full. Sections that are already done: {written}."
+        }]
+
+    return build
+
+
+def learning_plan_messages(topic, familiarity, time_available):
+    return [{
+        "role":
+        "system",
+        "content":
+        "You are an expert educator. Create a detailed learning plan with well-formatted content. IMPORTANT: Always include a recap/summary section as the LAST section to review all key concepts before the quiz. Use HTML formatting in the content field: <p> for paragraphs, <strong> for emphasis, <ul><li> for lists, <br> for line breaks. Respond with JSON using double quotes in this exact format: {\"overview\": \"brief overview text\", \"sections\": [{\"title\": \"section title\", \"estimated_time\": 5, \"content\": \"HTML formatted content with multiple paragraphs\", \"key_points\": [\"point1\", \"point2\"]}]} where estimated_time is in minutes."
+    }, {
+        "role":
+        "user",
+        "content":
+        f"Create a comprehensive, detailed learning plan for a {familiarity} level student who has {time_available} minutes to study the topic: {topic}. The content should be substantial and rich - each section should have multiple paragraphs with detailed explanations, examples, and context. Use the full time available to provide thorough coverage. Include estimated_time (in minutes) for each section. Make sure to include a final recap section that summarizes all the main concepts covered. Format the content with HTML tags for better readability."
+    }]
+
+
+def learning_plan_cache_key(topic, familiarity, time_available):
+    return content_cache.key(' '.join(str(topic).casefold().split()),
+                             str(familiarity).strip().casefold(),
+                             str(time_available).strip())
+
+
+def generate_learning_plan(topic, familiarity, time_available):
+    messages = learning_plan_messages(topic, familiarity, time_available)
+    fields, sections = structured_completion(
+        openai_client,
+        'content',
+        LearningPlan,
+        messages,
+        retry_messages=replacement_sections_messages(messages),
+        max_completion_tokens=8192)
+    if not sections:
         return None
 
-    return {'overview': content['overview'], 'sections': validated_sections}
+    return learning_content_from(fields, sections)
+
+
+def learning_outline_messages(topic, familiarity, time_available):
+    return [{
+        "role":
+        "system",
+        "content":
+        "You are an expert educator. Create the outline of a detailed learning plan. IMPORTANT: Always include a recap/summary section as the LAST section to review all key concepts before the quiz. Do not write the section content yet. Respond with JSON using double quotes in this exact format: {\"overview\": \"brief overview text\", \"sections\": [{\"title\": \"section title\", \"estimated_time\": 5, \"key_points\": [\"point1\", \"point2\"]}]} where estimated_time is in minutes."
+    }, {
+        "role":
+        "user",
+        "content":
+        f"Create the outline of a comprehensive learning plan for a {familiarity} level student who has {time_available} minutes to study the topic: {topic}. Use the full time available to provide thorough coverage. Include estimated_time (in minutes) and the key points for each section. Make sure to include a final recap section that summarizes all the main concepts covered."
+    }]
+
+
+def learning_outline_cache_key(topic, familiarity, time_available):
+    return content_cache.key('outline', ' '.join(str(topic).casefold().split()),
+                             str(familiarity).strip().casefold(),
+                             str(time_available).strip())
+
+
+def generate_learning_outline(topic, familiarity, time_available):
+    messages = learning_outline_messages(topic, familiarity, time_available)
+    fields, sections = structured_completion(
+        openai_client,
+        'content_outline',
+        LearningOutline,
+        messages,
+        retry_messages=replacement_sections_messages(messages),
+        max_completion_tokens=4096)
+    if not sections:
+        return None
+
+    for section in sections:
+        section['content'] = None
+    return learning_content_from(fields, sections)
+
+
+def generate_section_content(stored_data, index):
+    sections = stored_data['learning_content']['sections']
+    section = sections[index]
+    titles = '\n'.join(f'{i + 1}. {s["title"]}' for i, s in enumerate(sections))
+    key_points = '; '.join(section['key_points'])
+    response = chat_completion(
+        openai_client,
+        'section_content',
+        messages=[{
+            "role":
+            "system",
+            "content":
+            "You are an expert educator writing one section of a learning plan. Use HTML formatting: <p> for paragraphs, <strong> for emphasis, <ul><li> for lists, <br> for line breaks. Respond with only the HTML content of the section, without the section title."
+        }, {
+            "role":
+            "user",
+            "content":
+            f"The learning plan on {stored_data['topic']} for a {stored_data['familiarity']} level student who has {stored_data['time_available']} minutes has these sections:\n{titles}\n\nWrite the content of section {index + 1}, \"{section['title']}\" (about {section['estimated_time']} minutes of study), covering these key points: {key_points}. The content should be substantial and rich, with multiple paragraphs of detailed explanations, examples, and context."
+        }],
+        max_completion_tokens=4096)
+
+    content = response.choices[0].message.content
+    if not content or not content.strip():
+        metrics.record_parse_failure('section_content', 'empty')
+        return None
+    return content.strip()
 
 
-@app.route('/generate-content', methods=['POST'])
+@bp.route('/generate-content', methods=['POST'])
 def generate_content():
     data = request.json
     if not data or not isinstance(data, dict):
@@ -84,111 +456,420 @@ def generate_content():
     topic = data.get('topic')
     familiarity = data.get('familiarity')
     time_available = data.get('time')
+    fresh = bool(data.get('fresh', False))
+    lazy = bool(data.get('lazy', CONTENT_LAZY_SECTIONS))
 
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-5",
-            messages=[{
-                "role":
-                "system",
-                "content":
-                "You are an expert educator. Create a detailed learning plan with well-formatted content. IMPORTANT: Always include a recap/summary section as the LAST section to review all key concepts before the quiz. Use HTML formatting in the content field: <p> for paragraphs, <strong> for emphasis, <ul><li> for lists, <br> for line breaks. Respond with JSON using double quotes in this exact format: {\"overview\": \"brief overview text\", \"sections\": [{\"title\": \"section title\", \"estimated_time\": 5, \"content\": \"HTML formatted content with multiple paragraphs\", \"key_points\": [\"point1\", \"point2\"]}]} where estimated_time is in minutes."
-            }, {
-                "role":
-                "user",
-                "content":
-                f"Create a comprehensive, detailed learning plan for a {familiarity} level student who has {time_available} minutes to study the topic: {topic}. The content should be substantial and rich - each section should have multiple paragraphs with detailed explanations, examples, and context. Use the full time available to provide thorough coverage. Include estimated_time (in minutes) for each section. Make sure to include a final recap section that summarizes all the main concepts covered. Format the content with HTML tags for better readability."
-            }],
-            response_format={"type": "json_object"},
-            max_completion_tokens=8192)
-
-        raw_content = response.choices[0].message.content
-        if not raw_content:
-            return jsonify({'error': 'Failed to generate content'}), 500
-
-        content = json.loads(raw_content)
-        validated_content = validate_learning_content(content)
+        library_entry = None if fresh else content_library.get(
+            learning_plan_cache_key(topic, familiarity, time_available))
+        if library_entry:
+            session_id = get_session_id()
+            store_learning_content(session_id,
+                                   library_entry['learning_content'],
+                                   topic,
+                                   quizzes=library_entry.get('quizzes'))
+
+            session['current_section'] = 0
+            session['completed_sections'] = []
+
+            response = jsonify(library_entry['learning_content'])
+            response.headers['X-Cache'] = 'LIBRARY'
+            return response
+
+        if lazy:
+            cache_key = learning_outline_cache_key(topic, familiarity,
+                                                   time_available)
+            validated_content, cache_status = content_cache.get_or_compute(
+                cache_key,
+                lambda: generate_learning_outline(topic, familiarity,
+                                                  time_available),
+                refresh=fresh)
+        else:
+            cache_key = learning_plan_cache_key(topic, familiarity,
+                                                time_available)
+            validated_content, cache_status = content_cache.get_or_compute(
+                cache_key,
+                lambda: generate_learning_plan(topic, familiarity,
+                                               time_available),
+                refresh=fresh)
 
         if not validated_content:
             return jsonify({'error': 'Invalid content format generated'}), 500
 
         session_id = get_session_id()
-        content_storage[session_id] = {
-            'learning_content': validated_content,
-            'topic': topic
-        }
+        store_learning_content(
+            session_id, validated_content, topic,
+            lazy_outline(cache_key, familiarity, time_available)
+            if lazy else None)
 
         session['current_section'] = 0
         session['completed_sections'] = []
 
-        return jsonify(validated_content)
+        response = jsonify(validated_content)
+        response.headers['X-Cache'] = cache_status.upper()
+        return response
     except json.JSONDecodeError as e:
         return jsonify({'error': 'Failed to parse AI response'}), 500
+    except LLMBusyError as e:
+        return llm_busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-def validate_quiz(quiz):
-    if not isinstance(quiz, dict) or 'questions' not in quiz:
-        return None
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
 
-    if not isinstance(quiz['questions'], list):
-        return None
 
-    validated_questions = []
-    for q in quiz['questions']:
-        if not isinstance(q, dict):
-            continue
+@bp.route('/generate-content-stream', methods=['POST'])
+def generate_content_stream():
+    data = request.json
+    if not data or not isinstance(data, dict):
+        return jsonify({'error': 'Invalid request body'}), 400
 
-        question_text = q.get('question', 'Question not available')
-        if not isinstance(question_text, str):
-            question_text = str(question_text)
+    topic = data.get('topic')
+    familiarity = data.get('familiarity')
+    time_available = data.get('time')
+    fresh = bool(data.get('fresh', False))
+    lazy = bool(data.get('lazy', CONTENT_LAZY_SECTIONS))
+    cache_key = learning_plan_cache_key(topic, familiarity, time_available)
 
-        options = q.get('options', [])
-        if not isinstance(options, list) or len(options) < 2:
-            continue
+    # The session cookie is written with the response headers, so it has to
+    # be settled before the first byte of the stream goes out.
+    session_id = get_session_id()
+    session['current_section'] = 0
+    session['completed_sections'] = []
+
+    def events():
+        started = time.monotonic()
+        first_section_ms = None
+        overview = None
+        sections = []
+        parser = LearningContentStreamParser()
+        leader = False
+
+        try:
+            library_entry = None if fresh else content_library.get(cache_key)
+            if library_entry:
+                cached_content = library_entry['learning_content']
+                store_learning_content(session_id,
+                                       cached_content,
+                                       topic,
+                                       quizzes=library_entry.get('quizzes'))
+                cache_status = 'library'
+            elif lazy:
+                # The outline is small, so it is generated in one call and
+                # replayed as events; section bodies arrive via
+                # /section-content.
+                outline_key = learning_outline_cache_key(
+                    topic, familiarity, time_available)
+                cached_content, cache_status = content_cache.get_or_compute(
+                    outline_key,
+                    lambda: generate_learning_outline(
+                        topic, familiarity, time_available),
+                    refresh=fresh)
+                if not cached_content:
+                    yield sse_event(
+                        'error', {'error': 'Invalid content format generated'})
+                    return
+                store_learning_content(
+                    session_id, cached_content, topic,
+                    lazy_outline(outline_key, familiarity, time_available))
+            else:
+                # Identical requests in flight stream one generation; the
+                # others wait for it to be cached and replay it.
+                if fresh:
+                    cached_content = None
+                else:
+                    cached_content, leader = content_cache.claim(
+                        cache_key, CONTENT_WAIT_TIMEOUT)
+                if cached_content:
+                    store_learning_content(session_id, cached_content, topic)
+                cache_status = 'hit'
+
+            if cached_content:
+                yield sse_event('overview',
+                                {'overview': cached_content['overview']})
+                for index, section in enumerate(cached_content['sections']):
+                    yield sse_event('section', {
+                        'index': index,
+                        'section': section
+                    })
+                yield sse_event('done', {
+                    'sections': len(cached_content['sections']),
+                    'first_section_ms': 0,
+                    'total_ms': int((time.monotonic() - started) * 1000),
+                    'cached': cache_status in ('hit', 'library'),
+                    'lazy': lazy and cache_status != 'library'
+                })
+                return
+
+            stream = stream_chat_completion(
+                openai_client,
+                'content_stream',
+                messages=learning_plan_messages(topic, familiarity,
+                                                time_available),
+                response_format=response_format(LearningPlan),
+                max_completion_tokens=8192)
+
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                for kind, value in parser.feed(delta):
+                    if kind == 'overview' and overview is None:
+                        overview = value
+                        yield sse_event('overview', {'overview': overview})
+                    elif kind == 'section':
+                        section = validate_section(value)
+                        if not section:
+                            continue
+                        if first_section_ms is None:
+                            first_section_ms = int(
+                                (time.monotonic() - started) * 1000)
+                        sections.append(section)
+                        yield sse_event('section', {
+                            'index': len(sections) - 1,
+                            'section': section
+                        })
+
+            # The incremental parser only sees well-formed sections; give
+            # the full document a final pass (repairing a cut-off reply) and
+            # send whichever sections it missed.
+            parsed = parse_reply(LearningPlan, parser.text)
+            validated_content = learning_content_from(
+                parsed.fields,
+                parsed.valid_items()) if parsed and parsed.valid_items() else None
+
+            if validated_content:
+                if overview is None:
+                    overview = validated_content['overview']
+                    yield sse_event('overview', {'overview': overview})
+                for section in unsent_sections(sections,
+                                               validated_content['sections']):
+                    sections.append(section)
+                    yield sse_event('section', {
+                        'index': len(sections) - 1,
+                        'section': section
+                    })
+
+            if not sections:
+                metrics.record_parse_failure('content_stream', 'invalid')
+                yield sse_event('error',
+                                {'error': 'Invalid content format generated'})
+                return
+
+            learning_content = {
+                'overview': overview or 'Welcome to your learning session!',
+                'sections': sections
+            }
+            store_learning_content(session_id, learning_content, topic)
+            if leader:
+                leader = False
+                content_cache.release(cache_key, learning_content)
+            else:
+                content_cache.set(cache_key, learning_content)
+
+            yield sse_event(
+                'done', {
+                    'sections': len(sections),
+                    'first_section_ms': first_section_ms,
+                    'total_ms': int((time.monotonic() - started) * 1000)
+                })
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+        finally:
+            if leader:
+                content_cache.release(cache_key)
+
+    return Response(stream_with_context(events()),
+                    mimetype='text/event-stream',
+                    headers={
+                        'Cache-Control': 'no-cache',
+                        'X-Accel-Buffering': 'no'
+                    })
 
-        options = [str(opt) for opt in options if opt][:4]
-        if len(options) < 2:
-            continue
 
-        correct_answer = q.get('correct_answer', 0)
-        if isinstance(correct_answer, str):
-            try:
-                correct_answer = int(correct_answer)
-            except:
-                correct_answer = 0
-
-        if not isinstance(
-                correct_answer,
-                int) or correct_answer < 0 or correct_answer >= len(options):
-            correct_answer = 0
-
-        category = q.get('category', 'general')
-        if not isinstance(category, str):
-            category = 'general'
-
-        validated_questions.append({
-            'question': question_text,
-            'options': options,
-            'correct_answer': correct_answer,
-            'category': category
-        })
-
-    if not validated_questions:
+def validate_quiz(quiz):
+    parsed = parse_document(Quiz, quiz)
+    if not parsed or not parsed.valid_items():
         return None
 
-    return {'questions': validated_questions}
+    questions = []
+    for original, question in zip(quiz['questions'], parsed.items):
+        if question is None:
+            continue
+        category = original.get('category')
+        questions.append(
+            dict(question,
+                 category=category
+                 if isinstance(category, str) else 'general'))
+    return {'questions': questions}
 
 
 def get_session_id():
     if 'session_id' not in session:
-        session['session_id'] = secrets.token_urlsafe(32)
+        session['session_id'] = new_session_id()
     return session['session_id']
 
 
-@app.route('/generate-quiz', methods=['POST'])
-def generate_quiz():
+def section_prompt_text(content):
+    return fit(html_to_text(content), PROMPT_SECTION_TOKEN_BUDGET)
+
+
+def section_with_text(stored_data, index, section):
+    """Returns the section with the plain-text form of its content that was
+    prepared when the plan was stored, or prepares it now.
+    """
+    texts = stored_data.get('section_texts') or []
+    text = texts[index] if index < len(texts) else None
+    return dict(section, text=text or section_prompt_text(section['content']))
+
+
+def job_description_prompt_text(job_description):
+    return fit(compact_whitespace(job_description),
+               PROMPT_JOB_DESCRIPTION_TOKEN_BUDGET)
+
+
+def create_section_quiz(topic, section):
+    text = section.get('text') or section_prompt_text(section['content'])
+    prompts.record_prompt('section_quiz', section['content'], text)
+    messages = [{
+        "role":
+        "system",
+        "content":
+        "You are a quiz generator. Create 3 multiple choice questions. Respond with JSON using double quotes in this exact format: {\"questions\": [{\"question\": \"question text\", \"options\": [\"option1\", \"option2\", \"option3\", \"option4\"], \"correct_answer\": 0}]} where correct_answer is the index of the correct option (0-3)."
+    }, {
+        "role":
+        "user",
+        "content":
+        f"Create quiz questions about the topic '{topic}' based on this section:\nTitle: {section['title']}\nContent: {text}\n\nIMPORTANT: All questions must be specifically about {topic}."
+    }]
+    _, questions = structured_completion(
+        openai_client,
+        'section_quiz',
+        Quiz,
+        messages,
+        expected=3,
+        retry_messages=more_questions_messages(messages),
+        max_completion_tokens=4096)
+    if not questions:
+        return None
+
+    return grading.with_answer_key(
+        {'questions': [dict(q, category='general') for q in questions]},
+        'section', topic, section['title'])
+
+
+def cached_section_quiz(topic, section):
+    key = quiz_cache.key(' '.join(topic.casefold().split()), section['title'],
+                         section['content'])
+    quiz, _ = quiz_cache.get_or_compute(
+        key, lambda: create_section_quiz(topic, section))
+    return quiz
+
+
+def section_quiz_key(session_id, section_index):
+    return f'{session_id}_quiz_{section_index}'
+
+
+def is_current_plan(session_id, plan_id):
+    stored_data = content_storage.get(session_id)
+    return bool(stored_data) and stored_data.get('plan_id') == plan_id
+
+
+quiz_pipeline = QuizPipeline(
+    cached_section_quiz,
+    quiz_storage,
+    section_quiz_key,
+    is_current_plan,
+    max_workers=int(os.environ.get('QUIZ_PIPELINE_WORKERS', 4)),
+    job_timeout=int(os.environ.get('QUIZ_PIPELINE_JOB_TIMEOUT_SECONDS', 180)))
+
+
+def lazy_outline(outline_key, familiarity, time_available):
+    return {
+        'outline_key': outline_key,
+        'familiarity': familiarity,
+        'time_available': time_available
+    }
+
+
+def start_section_quiz(session_id, plan_id, index, topic, section):
+    if QUIZ_PIPELINE_ENABLED:
+        with admission.background():
+            quiz_pipeline.start_section(session_id, plan_id, index, topic,
+                                        section)
+
+
+section_loader = SectionLoader(
+    generate_section_content,
+    content_cache,
+    content_storage,
+    on_loaded=start_section_quiz,
+    compact=section_prompt_text,
+    max_workers=int(os.environ.get('SECTION_PREFETCH_WORKERS', 2)))
+
+
+def store_learning_content(session_id,
+                           learning_content,
+                           topic,
+                           outline=None,
+                           quizzes=None):
+    """Stores the session's plan. outline carries the cache key, familiarity
+    and time of an outline-only plan whose sections are generated lazily;
+    quizzes holds section quizzes generated with the plan (None for any
+    that still have to be generated).
+    """
+    # Quizzes from the session's previous plan must not be served or graded
+    # against the new one.
+    previous = content_storage.get(session_id)
+    if previous and previous.get('learning_content'):
+        for index in range(len(previous['learning_content']['sections'])):
+            quiz_storage.delete(section_quiz_key(session_id, index))
+
+    plan_id = secrets.token_urlsafe(8)
+    sections = learning_content['sections']
+    stored_data = {
+        'learning_content': learning_content,
+        'topic': topic,
+        'plan_id': plan_id,
+        # Prompt-ready plain text of each section, prepared once per plan.
+        'section_texts': [
+            section_prompt_text(section['content'])
+            if section.get('content') is not None else None
+            for section in sections
+        ]
+    }
+    stored_data.update(outline or {})
+    content_storage.set(session_id, stored_data, owner=session_id)
+    if outline:
+        # Quizzes are started as each section body is generated; the first
+        # section is almost always opened right away.
+        with admission.background():
+            section_loader.prefetch(session_id, stored_data, 0)
+    elif quizzes:
+        for index, section in enumerate(sections):
+            quiz = quizzes[index] if index < len(quizzes) else None
+            if quiz:
+                quiz_storage.set(section_quiz_key(session_id, index),
+                                 quiz,
+                                 owner=session_id)
+            else:
+                start_section_quiz(
+                    session_id, plan_id, index, topic,
+                    section_with_text(stored_data, index, section))
+    elif QUIZ_PIPELINE_ENABLED:
+        with admission.background():
+            quiz_pipeline.start(session_id, plan_id, topic, [
+                section_with_text(stored_data, index, section)
+                for index, section in enumerate(sections)
+            ])
+
+
+@bp.route('/section-content', methods=['POST'])
+def section_content():
     data = request.json
     if not data or not isinstance(data, dict):
         return jsonify({'error': 'Invalid request body'}), 400
@@ -200,7 +881,47 @@ def generate_quiz():
     except (TypeError, ValueError):
         return jsonify({'error': 'Invalid section index type'}), 400
 
-    store_quiz = data.get('store_quiz', True)
+    session_id = get_session_id()
+    stored_data = content_storage.get(session_id)
+
+    if not stored_data or not stored_data.get('learning_content'):
+        return jsonify({'error': 'No learning content found'}), 400
+
+    if section_index >= len(stored_data['learning_content']['sections']):
+        return jsonify({'error': 'Invalid section index'}), 400
+
+    try:
+        section = section_loader.ensure(session_id, stored_data,
+                                        section_index)
+        if not section:
+            return jsonify({'error':
+                            'Failed to generate section content'}), 500
+
+        # Speculatively write the section the user is most likely to open
+        # next while they read this one.
+        with admission.background():
+            section_loader.prefetch(session_id, stored_data,
+                                    section_index + 1)
+
+        return jsonify({'index': section_index, 'section': section})
+    except LLMBusyError as e:
+        return llm_busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/generate-quiz', methods=['POST'])
+def generate_quiz():
+    data = request.json
+    if not data or not isinstance(data, dict):
+        return jsonify({'error': 'Invalid request body'}), 400
+
+    try:
+        section_index = int(data.get('section_index', 0))
+        if section_index < 0:
+            return jsonify({'error': 'Invalid section index'}), 400
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid section index type'}), 400
 
     session_id = get_session_id()
     stored_data = content_storage.get(session_id)
@@ -217,46 +938,25 @@ def generate_quiz():
     if section_index >= len(learning_content['sections']):
         return jsonify({'error': 'Invalid section index'}), 400
 
-    section = learning_content['sections'][section_index]
-
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-5",
-            messages=[{
-                "role":
-                "system",
-                "content":
-                "You are a quiz generator. Create 3 multiple choice questions. Respond with JSON using double quotes in this exact format: {\"questions\": [{\"question\": \"question text\", \"options\": [\"option1\", \"option2\", \"option3\", \"option4\"], \"correct_answer\": 0}]} where correct_answer is the index of the correct option (0-3)."
-            }, {
-                "role":
-                "user",
-                "content":
-                f"Create quiz questions about the topic '{topic}' based on this section:\nTitle: {section['title']}\nContent: {section['content']}\n\nIMPORTANT: All questions must be specifically about {topic}."
-            }],
-            response_format={"type": "json_object"},
-            max_completion_tokens=4096)
-
-        raw_quiz = response.choices[0].message.content
-        if not raw_quiz:
-            return jsonify({'error': 'Failed to generate quiz'}), 500
+        section = section_loader.ensure(session_id, stored_data,
+                                        section_index)
+        if not section:
+            return jsonify({'error':
+                            'Failed to generate section content'}), 500
 
-        quiz = json.loads(raw_quiz)
-        validated_quiz = validate_quiz(quiz)
+        # Preloads, retries and the pipeline all resolve to the single quiz
+        # stored under the section key, so whatever the client shows is
+        # what /submit-quiz grades.
+        validated_quiz = quiz_pipeline.get_or_generate(
+            session_id, stored_data.get('plan_id'), section_index, topic,
+            section_with_text(stored_data, section_index, section),
+            QUIZ_WAIT_TIMEOUT)
 
         if not validated_quiz:
             return jsonify({'error': 'Invalid quiz format generated'}), 500
 
-        session_id = get_session_id()
-        quiz_id = secrets.token_urlsafe(16)
-        quiz_storage[quiz_id] = validated_quiz
-
-        if store_quiz:
-            quiz_key = f'{session_id}_quiz_{section_index}'
-            quiz_storage[quiz_key] = validated_quiz
-
         client_quiz = {
-            'quiz_id':
-            quiz_id,
             'questions': [{
                 'question': q['question'],
                 'options': q['options']
@@ -266,20 +966,18 @@ def generate_quiz():
         return jsonify(client_quiz)
     except json.JSONDecodeError as e:
         return jsonify({'error': 'Failed to parse quiz response'}), 500
+    except LLMBusyError as e:
+        return llm_busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/activate-quiz', methods=['POST'])
+@bp.route('/activate-quiz', methods=['POST'])
 def activate_quiz():
     data = request.json
     if not data or not isinstance(data, dict):
         return jsonify({'error': 'Invalid request body'}), 400
 
-    quiz_id = data.get('quiz_id')
-    if not quiz_id:
-        return jsonify({'error': 'Missing quiz_id'}), 400
-
     try:
         section_index = int(data.get('section_index', 0))
         if section_index < 0:
@@ -287,17 +985,17 @@ def activate_quiz():
     except (TypeError, ValueError):
         return jsonify({'error': 'Invalid section index type'}), 400
 
-    if quiz_id not in quiz_storage:
-        return jsonify({'error': 'Quiz not found'}), 400
-
+    # Quizzes are stored under their section key as soon as they are
+    # generated, so there is nothing left to promote. Kept so clients that
+    # still call it after a preload keep working.
     session_id = get_session_id()
-    quiz_key = f'{session_id}_quiz_{section_index}'
-    quiz_storage[quiz_key] = quiz_storage[quiz_id]
+    if section_quiz_key(session_id, section_index) not in quiz_storage:
+        return jsonify({'error': 'Quiz not found'}), 400
 
     return jsonify({'success': True})
 
 
-@app.route('/eli5-explain', methods=['POST'])
+@bp.route('/eli5-explain', methods=['POST'])
 def eli5_explain():
     data = request.json
     if not data or not isinstance(data, dict):
@@ -329,15 +1027,32 @@ def eli5_explain():
     if section_index >= len(learning_content['sections']):
         return jsonify({'error': 'Invalid section index'}), 400
 
-    section = learning_content['sections'][section_index]
+    try:
+        section = section_loader.ensure(session_id, stored_data,
+                                        section_index)
+    except LLMBusyError as e:
+        return llm_busy_response(e)
+    except Exception as e:
+        return jsonify({'error':
+                        f'Failed to generate section content: {str(e)}'}), 500
+
+    if not section:
+        return jsonify({'error': 'Failed to generate section content'}), 500
 
-    import re
-    clean_content = re.sub(r'<[^>]+>', '', section['content'])
-    clean_content = re.sub(r'\s+', ' ', clean_content).strip()
+    bucket_key = eli5_cache.bucket_key(' '.join(topic.casefold().split()),
+                                       section['title'], section['content'])
+    cached_explanation, signature = eli5_cache.lookup(bucket_key, question)
+    if cached_explanation:
+        return jsonify({'explanation': cached_explanation, 'cached': True})
+
+    clean_content = section_with_text(stored_data, section_index,
+                                      section)['text']
+    prompts.record_prompt('eli5', section['content'], clean_content)
 
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-5",
+        response = chat_completion(
+            openai_client,
+            'eli5',
             messages=[{
                 "role":
                 "system",
@@ -355,7 +1070,10 @@ def eli5_explain():
         if not explanation:
             return jsonify({'error': 'Failed to generate explanation'}), 500
 
+        eli5_cache.add(bucket_key, question, explanation, signature)
         return jsonify({'explanation': explanation})
+    except LLMBusyError as e:
+        return llm_busy_response(e)
     except Exception as e:
         print(f"ELI5 Error: {str(e)}", flush=True)
         import traceback
@@ -364,7 +1082,12 @@ def eli5_explain():
                         f'Failed to generate explanation: {str(e)}'}), 500
 
 
-@app.route('/submit-quiz', methods=['POST'])
+def record_quiz_result(record):
+    metrics.inc('quiz_submissions_total', {'kind': record['kind']})
+    results_ledger.record(record)
+
+
+@bp.route('/submit-quiz', methods=['POST'])
 def submit_quiz():
     data = request.json
     if not data or not isinstance(data, dict):
@@ -387,124 +1110,339 @@ def submit_quiz():
         return jsonify({'error': 'Invalid answer values'}), 400
 
     session_id = get_session_id()
-    quiz_key = f'{session_id}_quiz_{section_index}'
+    quiz_key = section_quiz_key(session_id, section_index)
     stored_quiz = quiz_storage.get(quiz_key)
 
     if not stored_quiz or 'questions' not in stored_quiz:
         return jsonify({'error': 'Quiz not found'}), 400
 
-    correct_answers = [q['correct_answer'] for q in stored_quiz['questions']]
-
-    if len(answers) != len(correct_answers):
-        return jsonify({'error': 'Invalid number of answers'}), 400
-
-    score = sum(1 for i, answer in enumerate(answers)
-                if answer == correct_answers[i])
-    total = len(correct_answers)
-    percentage = (score / total * 100) if total > 0 else 0
-
-    incorrect_questions = []
-    for i, answer in enumerate(answers):
-        if answer != correct_answers[i]:
-            q = stored_quiz['questions'][i]
-            incorrect_questions.append({
-                'question_number':
-                i + 1,
-                'question':
-                q['question'],
-                'your_answer':
-                q['options'][answer]
-                if 0 <= answer < len(q['options']) else 'Not answered',
-                'correct_answer':
-                q['options'][q['correct_answer']]
-            })
+    key = None
+    if 'key' not in stored_quiz:
+        # Quizzes stored before answer keys existed, e.g. in an older
+        # content library.
+        stored_data = content_storage.get(session_id) or {}
+        sections = (stored_data.get('learning_content') or {}).get(
+            'sections') or []
+        key = grading.answer_key(
+            stored_quiz['questions'], 'section', stored_data.get('topic'),
+            sections[section_index]['title']
+            if section_index < len(sections) else None)
+
+    try:
+        result, record = grading.grade(stored_quiz, answers, key)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    record_quiz_result(record)
 
     completed = session.get('completed_sections', [])
     if section_index not in completed:
         completed.append(section_index)
         session['completed_sections'] = completed
 
-    return jsonify({
-        'score': score,
-        'total': total,
-        'percentage': percentage,
-        'completed_sections': completed,
-        'incorrect_questions': incorrect_questions
-    })
+    return jsonify(dict(result, completed_sections=completed))
 
 
-@app.route('/reset', methods=['POST'])
+@bp.route('/reset', methods=['POST'])
 def reset():
+    session_id = session.get('session_id')
+    if session_id:
+        quiz_storage.evict_owner(session_id)
+        content_storage.evict_owner(session_id)
     session.clear()
     return jsonify({'success': True})
 
 
-@app.route('/generate-interview-quiz', methods=['POST'])
-def generate_interview_quiz():
+@bp.route('/storage-stats')
+def storage_stats():
+    return jsonify({
+        'quiz': quiz_storage.stats(),
+        'content': content_storage.stats(),
+        'content_cache': content_cache.stats(),
+        'quiz_cache': quiz_cache.stats(),
+        'content_library': content_library.stats(),
+        'quiz_pipeline': quiz_pipeline.stats(),
+        'eli5_cache': eli5_cache.stats(),
+        'interview_fanout': interview_fanout.stats(),
+        'section_loader': section_loader.stats(),
+        'llm_admission': dict(llm.admission.stats(),
+                              rate_limiter=llm.rate_limiter.stats()),
+        'llm_client': dict(openai_client.stats(),
+                           hedging=llm.hedger.stats()),
+        'llm_routing': llm.router.stats(),
+        'prompts': {
+            'input_savings': prompts.savings(),
+            'completion_budget': prompts.completion_budget.stats()
+        }
+    })
+
+
+@bp.route('/quiz-stats')
+def quiz_stats():
+    return jsonify(results_ledger.stats())
+
+
+INTERVIEW_QUIZ_FANOUT = os.environ.get('INTERVIEW_QUIZ_FANOUT', '1') == '1'
+
+# (category, focus, number of questions) for each concurrent sub-generation;
+# together they cover the 10 behavioral + 10 technical questions the single
+# completion asks for.
+INTERVIEW_QUIZ_CHUNKS = [
+    ('behavioral', 'handling difficult situations and conflicts', 2),
+    ('behavioral', 'leadership, decision-making, and taking initiative', 2),
+    ('behavioral', 'teamwork, collaboration, and communication', 2),
+    ('behavioral', 'adaptability, learning from failure, and resilience', 2),
+    ('behavioral', 'ethics, time management, or stakeholder management', 2),
+    ('technical',
+     'the core job-specific skills and knowledge from the job description', 5),
+    ('technical',
+     'tools, systems, and practical problem solving the role involves', 5),
+]
+
+interview_fanout = FanOut(
+    max_workers=int(os.environ.get('INTERVIEW_QUIZ_FANOUT_WORKERS', 12)),
+    retries=int(os.environ.get('INTERVIEW_QUIZ_CHUNK_RETRIES', 1)))
+
+
+def generate_interview_quiz_single(position_title, company, job_description):
+    job_description_text = job_description_prompt_text(job_description)
+    prompts.record_prompt('interview_quiz', job_description,
+                          job_description_text)
+    messages = [{
+        "role":
+        "system",
+        "content":
+        f"You are a hiring manager at {company} interviewing candidates for the {position_title} position. Create exactly 20 multiple choice realistic interview questions: 10 behavioral questions and 10 technical questions.\n\nFor the 10 BEHAVIORAL questions, create diverse scenarios covering different aspects:\n- Handling difficult situations and conflicts (2 questions)\n- Leadership, decision-making, and taking initiative (2 questions)\n- Teamwork, collaboration, and communication (2 questions)\n- Adaptability, learning from failure, and resilience (2 questions)\n- Ethics, time management, or stakeholder management (2 questions)\n\nFor the 10 TECHNICAL questions, focus on job-specific skills and knowledge from the job description.\n\nRespond with JSON using double quotes in this exact format: {{\"questions\": [{{\"question\": \"question text\", \"options\": [\"option1\", \"option2\", \"option3\", \"option4\"], \"correct_answer\": 0, \"category\": \"behavioral\"}}]}} where correct_answer is the index of the correct option (0-3) and category is either \"behavioral\" or \"technical\"."
+    }, {
+        "role":
+        "user",
+        "content":
+        f"Create 20 interview questions for the {position_title} position at {company} (10 behavioral + 10 technical). Job description:\n\n{job_description_text}"
+    }]
+
+    def balance(questions):
+        behavioral = sum(1 for q in questions if q['category'] == 'behavioral')
+        return (f'Make {max(0, 10 - behavioral)} of them behavioral and the '
+                f'rest technical.')
+
+    _, questions = structured_completion(
+        openai_client,
+        'interview_quiz',
+        InterviewQuiz,
+        messages,
+        expected=20,
+        retry_messages=more_questions_messages(messages, balance),
+        max_completion_tokens=8192)
+    if not questions:
+        return None
+
+    return {'questions': questions}
+
+
+def generate_interview_chunk(position_title, company, job_description,
+                             index):
+    category, focus, count = INTERVIEW_QUIZ_CHUNKS[index]
+    job_description_text = job_description_prompt_text(job_description)
+    prompts.record_prompt('interview_quiz_chunk', job_description,
+                          job_description_text)
+    messages = [{
+        "role":
+        "system",
+        "content":
+        f"You are a hiring manager at {company} interviewing candidates for the {position_title} position. Create exactly {count} multiple choice realistic {category} interview questions focused on {focus}.\n\nRespond with JSON using double quotes in this exact format: {{\"questions\": [{{\"question\": \"question text\", \"options\": [\"option1\", \"option2\", \"option3\", \"option4\"], \"correct_answer\": 0, \"category\": \"{category}\"}}]}} where correct_answer is the index of the correct option (0-3)."
+    }, {
+        "role":
+        "user",
+        "content":
+        f"Create {count} {category} interview questions about {focus} for the {position_title} position at {company}. Job description:\n\n{job_description_text}"
+    }]
+    _, questions = structured_completion(
+        openai_client,
+        'interview_quiz_chunk',
+        InterviewQuiz,
+        messages,
+        expected=count,
+        retry_messages=more_questions_messages(messages),
+        max_completion_tokens=4096)
+    if not questions:
+        return None
+
+    for q in questions:
+        q['category'] = category
+    return questions
+
+
+def interview_quiz_chunks(position_title, company, job_description):
+    """Yields (chunk index, questions, error) as each sub-generation
+    finishes; failed chunks are retried on their own by the fan-out.
+    """
+    return interview_fanout.run(
+        list(range(len(INTERVIEW_QUIZ_CHUNKS))),
+        lambda index: generate_interview_chunk(position_title, company,
+                                               job_description, index))
+
+
+def generate_interview_quiz_fanout(position_title, company, job_description):
+    results = {}
+    last_error = None
+    for index, questions, error in interview_quiz_chunks(
+            position_title, company, job_description):
+        if questions:
+            results[index] = questions
+        elif error:
+            last_error = error
+
+    if not results and last_error:
+        raise last_error
+
+    return validate_quiz({
+        'questions': [q for index in sorted(results) for q in results[index]]
+    })
+
+
+def interview_client_questions(questions):
+    return [{
+        'question': q['question'],
+        'options': q['options'],
+        'category': q.get('category', 'general')
+    } for q in questions]
+
+
+def interview_quiz_request():
     data = request.json
     if not data or not isinstance(data, dict):
-        return jsonify({'error': 'Invalid request body'}), 400
+        return None, (jsonify({'error': 'Invalid request body'}), 400)
 
     position_title = data.get('position_title')
     company = data.get('company')
     job_description = data.get('job_description')
 
     if not position_title or not company or not job_description:
-        return jsonify(
-            {'error': 'Position title, company name and job description are required'}), 400
+        return None, (jsonify({
+            'error':
+            'Position title, company name and job description are required'
+        }), 400)
 
-    try:
-        response = openai_client.chat.completions.create(
-            model="gpt-5",
-            messages=[{
-                "role":
-                "system",
-                "content":
-                f"You are a hiring manager at {company} interviewing candidates for the {position_title} position. Create exactly 20 multiple choice realistic interview questions: 10 behavioral questions and 10 technical questions.\n\nFor the 10 BEHAVIORAL questions, create diverse scenarios covering different aspects:\n- Handling difficult situations and conflicts (2 questions)\n- Leadership, decision-making, and taking initiative (2 questions)\n- Teamwork, collaboration, and communication (2 questions)\n- Adaptability, learning from failure, and resilience (2 questions)\n- Ethics, time management, or stakeholder management (2 questions)\n\nFor the 10 TECHNICAL questions, focus on job-specific skills and knowledge from the job description.\n\nRespond with JSON using double quotes in this exact format: {{\"questions\": [{{\"question\": \"question text\", \"options\": [\"option1\", \"option2\", \"option3\", \"option4\"], \"correct_answer\": 0, \"category\": \"behavioral\"}}]}} where correct_answer is the index of the correct option (0-3) and category is either \"behavioral\" or \"technical\"."
-            }, {
-                "role":
-                "user",
-                "content":
-                f"Create 20 interview questions for the {position_title} position at {company} (10 behavioral + 10 technical). Job description:\n\n{job_description}"
-            }],
-            response_format={"type": "json_object"},
-            max_completion_tokens=8192)
+    return (position_title, company, job_description), None
+
+
+def remember_interview(position_title, company, job_description):
+    session['position_title'] = position_title
+    session['company'] = company
+    session['job_description'] = job_description
 
-        raw_quiz = response.choices[0].message.content
-        if not raw_quiz:
-            return jsonify({'error':
-                            'Failed to generate interview questions'}), 500
 
-        quiz = json.loads(raw_quiz)
-        validated_quiz = validate_quiz(quiz)
+@bp.route('/generate-interview-quiz', methods=['POST'])
+def generate_interview_quiz():
+    fields, error_response = interview_quiz_request()
+    if error_response:
+        return error_response
+    position_title, company, job_description = fields
+
+    try:
+        if INTERVIEW_QUIZ_FANOUT:
+            validated_quiz = generate_interview_quiz_fanout(
+                position_title, company, job_description)
+        else:
+            validated_quiz = generate_interview_quiz_single(
+                position_title, company, job_description)
 
         if not validated_quiz:
             return jsonify({'error': 'Invalid quiz format generated'}), 500
 
         session_id = get_session_id()
         quiz_key = f'{session_id}_interview_quiz'
-        quiz_storage[quiz_key] = validated_quiz
+        quiz_storage.set(quiz_key,
+                         grading.with_answer_key(validated_quiz, 'interview',
+                                                 position_title),
+                         owner=session_id)
 
-        session['position_title'] = position_title
-        session['company'] = company
-        session['job_description'] = job_description
+        remember_interview(position_title, company, job_description)
 
         client_quiz = {
-            'questions': [{
-                'question': q['question'],
-                'options': q['options'],
-                'category': q.get('category', 'general')
-            } for q in validated_quiz['questions']]
+            'questions':
+            interview_client_questions(validated_quiz['questions'])
         }
 
         return jsonify(client_quiz)
     except json.JSONDecodeError as e:
         return jsonify({'error': 'Failed to parse quiz response'}), 500
+    except LLMBusyError as e:
+        return llm_busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/submit-interview-quiz', methods=['POST'])
+@bp.route('/generate-interview-quiz-stream', methods=['POST'])
+def generate_interview_quiz_stream():
+    fields, error_response = interview_quiz_request()
+    if error_response:
+        return error_response
+    position_title, company, job_description = fields
+
+    # The session cookie is written with the response headers, so it has to
+    # be settled before the first byte of the stream goes out.
+    session_id = get_session_id()
+    remember_interview(position_title, company, job_description)
+
+    def events():
+        started = time.monotonic()
+        questions = []
+        failed_chunks = 0
+        last_error = None
+
+        try:
+            # Questions are numbered in arrival order; the stored quiz keeps
+            # that order so submitted answers line up with what was shown.
+            for index, chunk_questions, error in interview_quiz_chunks(
+                    position_title, company, job_description):
+                if not chunk_questions:
+                    failed_chunks += 1
+                    last_error = error or last_error
+                    continue
+                yield sse_event(
+                    'questions', {
+                        'offset':
+                        len(questions),
+                        'category':
+                        INTERVIEW_QUIZ_CHUNKS[index][0],
+                        'questions':
+                        interview_client_questions(chunk_questions)
+                    })
+                questions.extend(chunk_questions)
+
+            validated_quiz = validate_quiz({'questions': questions})
+            if not validated_quiz:
+                yield sse_event(
+                    'error', {
+                        'error':
+                        str(last_error)
+                        if last_error else 'Invalid quiz format generated'
+                    })
+                return
+
+            quiz_storage.set(f'{session_id}_interview_quiz',
+                             grading.with_answer_key(validated_quiz,
+                                                     'interview',
+                                                     position_title),
+                             owner=session_id)
+            yield sse_event(
+                'done', {
+                    'questions': len(validated_quiz['questions']),
+                    'failed_chunks': failed_chunks,
+                    'total_ms': int((time.monotonic() - started) * 1000)
+                })
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+
+    return Response(stream_with_context(events()),
+                    mimetype='text/event-stream',
+                    headers={
+                        'Cache-Control': 'no-cache',
+                        'X-Accel-Buffering': 'no'
+                    })
+
+
+@bp.route('/submit-interview-quiz', methods=['POST'])
 def submit_interview_quiz():
     data = request.json
     if not data or not isinstance(data, dict):
@@ -526,39 +1464,113 @@ def submit_interview_quiz():
     if not stored_quiz or 'questions' not in stored_quiz:
         return jsonify({'error': 'Quiz not found'}), 400
 
-    correct_answers = [q['correct_answer'] for q in stored_quiz['questions']]
-
-    if len(answers) != len(correct_answers):
-        return jsonify({'error': 'Invalid number of answers'}), 400
-
-    score = sum(1 for i, answer in enumerate(answers)
-                if answer == correct_answers[i])
-    total = len(correct_answers)
-    percentage = (score / total * 100) if total > 0 else 0
-
-    incorrect_questions = []
-    for i, answer in enumerate(answers):
-        if answer != correct_answers[i]:
-            q = stored_quiz['questions'][i]
-            incorrect_questions.append({
-                'question_number':
-                i + 1,
-                'question':
-                q['question'],
-                'your_answer':
-                q['options'][answer]
-                if 0 <= answer < len(q['options']) else 'Not answered',
-                'correct_answer':
-                q['options'][q['correct_answer']]
-            })
+    # Quizzes stored before answer keys existed get one built here.
+    key = stored_quiz.get('key') or grading.answer_key(
+        stored_quiz['questions'], 'interview')
+    try:
+        result, record = grading.grade(stored_quiz, answers, key)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    record_quiz_result(record)
 
-    return jsonify({
-        'score': score,
-        'total': total,
-        'percentage': percentage,
-        'incorrect_questions': incorrect_questions
-    })
+    return jsonify(result)
+
+
+def pregenerate_entry(meta, quizzes=True):
+    learning_content = generate_learning_plan(meta['topic'],
+                                              meta['familiarity'],
+                                              meta['time'])
+    if not learning_content:
+        return None
 
+    entry = {'learning_content': learning_content}
+    if quizzes:
+        entry['quizzes'] = [
+            create_section_quiz(
+                meta['topic'],
+                dict(section, text=section_prompt_text(section['content'])))
+            for section in learning_content['sections']
+        ]
+    return entry
+
+
+@bp.cli.command('pregenerate')
+@click.argument('topics_file', type=click.File(encoding='utf-8'))
+@click.option('--output',
+              default=CONTENT_LIBRARY_PATH,
+              show_default=True,
+              help='Library data file to write.')
+@click.option('--concurrency',
+              default=4,
+              show_default=True,
+              help='Plans generated at once.')
+@click.option('--quizzes/--no-quizzes',
+              default=True,
+              help='Also generate every section\'s quiz.')
+def pregenerate(topics_file, output, concurrency, quizzes):
+    """Pre-generates learning plans into the content library.
+
+    TOPICS_FILE is a CSV file of topic,familiarity,time rows. Plans already
+    in the library are skipped, so an interrupted run can simply be
+    started again.
+    """
+    jobs = []
+    for line, row in enumerate(csv.reader(topics_file), 1):
+        if not row or row[0].startswith('#') or row[0] == 'topic':
+            continue
+        if len(row) != 3:
+            raise click.BadParameter(
+                f'line {line}: expected topic,familiarity,time',
+                param_hint='TOPICS_FILE')
+        topic, familiarity, time_available = (value.strip() for value in row)
+        jobs.append((learning_plan_cache_key(topic, familiarity,
+                                             time_available), {
+                                                 'topic': topic,
+                                                 'familiarity': familiarity,
+                                                 'time': time_available
+                                             }))
+
+    writer = LibraryWriter(output)
+    total = len(dict(jobs))
+    done = sum(1 for key in dict(jobs) if key in writer)
+    click.echo(f'{done} of {total} plans already in {output}')
+
+    def report(key, meta, ok, error):
+        nonlocal done
+        done += 1
+        status = 'ok' if ok else f'failed ({error or "invalid content"})'
+        click.echo(f'[{done}/{total}] {meta["topic"]} '
+                   f'({meta["familiarity"]}, {meta["time"]} min): {status}')
+
+    try:
+        generated, failed = build(
+            writer,
+            jobs,
+            lambda meta: pregenerate_entry(meta, quizzes),
+            concurrency=concurrency,
+            on_result=report)
+    finally:
+        writer.finish()
+    click.echo(f'{generated} generated, {failed} failed, '
+               f'{len(writer.entries)} plans in the library')
+    if failed:
+        raise SystemExit(1)
+
+
+def create_app():
+    if not os.environ.get('SESSION_SECRET'):
+        raise RuntimeError("SESSION_SECRET environment variable must be set")
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('SESSION_SECRET')
+    if session_storage is not None:
+        app.session_interface = StoreSessionInterface(session_storage,
+                                                      new_session_id)
+    app.register_blueprint(bp)
+    return app
+
+
+# gunicorn and `flask --app app` load this instance.
+app = create_app()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,411 @@
+"""Static asset build and HTTP compression helpers.
+
+`python assets.py` minifies the CSS and JavaScript in static/, names each
+file after a hash of its content (style.<hash>.css) and writes gzip and,
+when the brotli module is installed, brotli variants next to it in
+static/dist/, together with manifest.json mapping the source name to the
+built one. Because a built name changes whenever its content does, the app
+serves these files with a one-year immutable Cache-Control and picks the
+precompressed variant the client accepts, so nothing is compressed per
+request.
+
+The minifiers are deliberately conservative: they drop comments and
+redundant whitespace, copy strings, template literals and regular
+expressions verbatim, and keep line breaks wherever dropping one could
+change how JavaScript inserts semicolons.
+
+negotiate() and compress() are shared with the app's response compression
+for large JSON bodies.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST = 'manifest.json'
+
+# Compressed variants are only kept for text and only when they are smaller.
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.html', '.txt', '.map')
+
+_WORD = re.compile(r'[\w$]')
+_REGEX_KEYWORDS = frozenset(('return', 'typeof', 'case', 'do', 'else', 'in',
+                             'of', 'new', 'delete', 'void', 'throw', 'yield',
+                             'await'))
+
+
+def _is_word(char):
+    return bool(char) and bool(_WORD.match(char))
+
+
+def _skip_string(source, i):
+    # Returns the index just past the string literal that starts at i.
+    quote = source[i]
+    i += 1
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        i += 1
+        if char == quote or char == '\n':
+            break
+    return i
+
+
+def _skip_template(source, i):
+    # Returns the index just past the template literal that starts at i,
+    # stepping over ${...} expressions, which may nest strings and
+    # templates of their own.
+    i += 1
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+        elif char == '`':
+            return i + 1
+        elif source.startswith('${', i):
+            i += 2
+            depth = 1
+            while i < len(source) and depth:
+                char = source[i]
+                if char in '\'"':
+                    i = _skip_string(source, i)
+                    continue
+                if char == '`':
+                    i = _skip_template(source, i)
+                    continue
+                if char == '{':
+                    depth += 1
+                elif char == '}':
+                    depth -= 1
+                i += 1
+        else:
+            i += 1
+    return i
+
+
+def _skip_regex(source, i):
+    i += 1
+    in_class = False
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        i += 1
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            break
+        elif char == '\n':
+            break
+    return i
+
+
+def minify_js(source):
+    out = []
+    last = ''  # last character emitted
+    word = ''  # last identifier or keyword emitted
+    pending = ''  # whitespace seen since then: '', ' ' or '\n'
+    i = 0
+    n = len(source)
+    while i < n:
+        char = source[i]
+        if char in ' \t\r\n\f\v':
+            if char == '\n':
+                pending = '\n'
+            elif not pending:
+                pending = ' '
+            i += 1
+            continue
+        if source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            if '\n' in source[i:end]:
+                pending = '\n'
+            elif not pending:
+                pending = ' '
+            i = end
+            continue
+
+        if pending and out:
+            if pending == '\n' and not (last in '{[(,;' or char in ')]},;'):
+                out.append('\n')
+            elif ((_is_word(last) and _is_word(char))
+                  or (last in '+-' and char in '+-')
+                  or (last == '/' and char in '/*')):
+                out.append(' ')
+        pending = ''
+
+        if char in '\'"':
+            end = _skip_string(source, i)
+        elif char == '`':
+            end = _skip_template(source, i)
+        elif char == '/' and (not last or last in '(,=:[!&|?{};+-*%<>~^'
+                              or (_is_word(last) and word in _REGEX_KEYWORDS)):
+            end = _skip_regex(source, i)
+        elif _is_word(char):
+            end = i + 1
+            while end < n and _is_word(source[end]):
+                end += 1
+            word = source[i:end]
+        else:
+            end = i + 1
+        out.append(source[i:end])
+        last = source[end - 1]
+        if not _is_word(char):
+            word = ''
+        i = end
+    return ''.join(out).strip() + '\n'
+
+
+def minify_css(source):
+    out = []
+    last = ''
+    pending = False
+    i = 0
+    n = len(source)
+    while i < n:
+        char = source[i]
+        if char in ' \t\r\n\f':
+            pending = True
+            i += 1
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            pending = True
+            continue
+        if pending and out and last not in '{};,>:' and char not in '{};,>':
+            out.append(' ')
+        pending = False
+        if char in '\'"':
+            end = _skip_string(source, i)
+        elif char == '}' and last == ';':
+            out.pop()
+            end = i + 1
+        else:
+            end = i + 1
+        out.append(source[i:end])
+        last = source[end - 1]
+        i = end
+    return ''.join(out).strip() + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def gzip_bytes(data, level=9):
+    # mtime=0 keeps the output identical across builds of the same input.
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress(data, encoding, level=6):
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip_bytes(data, level)
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip', )
+
+
+def negotiate(accept_encoding, offered):
+    """Returns the first encoding in offered (most preferred first) that
+    the Accept-Encoding header allows, or None for identity.
+    """
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    for encoding in offered:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class AssetManifest:
+    """The built assets the app may serve, loaded once at startup.
+
+    Entries whose source file has changed since the build are dropped, so
+    a stale build falls back to the plain static file instead of serving
+    old code.
+    """
+
+    def __init__(self, dist_dir=DIST_DIR, static_dir=STATIC_DIR):
+        self.dist_dir = dist_dir
+        self.assets = {}
+        self.files = {}
+        try:
+            with open(os.path.join(dist_dir, MANIFEST),
+                      encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return
+        for name, entry in manifest['assets'].items():
+            try:
+                with open(os.path.join(static_dir, name), 'rb') as f:
+                    current = _digest(f.read())
+            except OSError:
+                continue
+            if current == entry['source_sha256']:
+                self.assets[name] = entry['file']
+                self.files[entry['file']] = tuple(entry['encodings'])
+
+    def url_name(self, name):
+        return self.assets.get(name)
+
+    def encodings(self, filename):
+        """Precompressed variants of a built file, or None if it is not
+        one.
+        """
+        return self.files.get(filename)
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Builds every file in static_dir into dist_dir and returns a size
+    report: one dict per asset.
+    """
+    os.makedirs(dist_dir, exist_ok=True)
+    previous = set()
+    try:
+        with open(os.path.join(dist_dir, MANIFEST), encoding='utf-8') as f:
+            for entry in json.load(f)['assets'].values():
+                previous.add(entry['file'])
+    except FileNotFoundError:
+        pass
+
+    assets = {}
+    report = []
+    for directory, subdirectories, filenames in os.walk(static_dir):
+        if os.path.abspath(directory) == os.path.abspath(dist_dir):
+            subdirectories[:] = []
+            continue
+        subdirectories[:] = [
+            subdirectory for subdirectory in subdirectories
+            if os.path.abspath(os.path.join(directory, subdirectory)) !=
+            os.path.abspath(dist_dir)
+        ]
+        for filename in sorted(filenames):
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                source = f.read()
+            stem, extension = os.path.splitext(name)
+            minifier = MINIFIERS.get(extension)
+            data = (minifier(source.decode('utf-8')).encode('utf-8')
+                    if minifier else source)
+            built = f'{stem}.{_digest(data)[:12]}{extension}'
+            target = os.path.join(dist_dir, built)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+
+            sizes = {'source': len(source), 'minified': len(data)}
+            encodings = []
+            if extension in COMPRESSIBLE:
+                variants = [('gzip', '.gz', gzip_bytes(data))]
+                if brotli is not None:
+                    variants.insert(0, ('br', '.br',
+                                        brotli.compress(data, quality=11)))
+                for encoding, suffix, compressed in variants:
+                    sizes[encoding] = len(compressed)
+                    if len(compressed) < len(data):
+                        with open(target + suffix, 'wb') as f:
+                            f.write(compressed)
+                        encodings.append(encoding)
+            assets[name] = {
+                'file': built,
+                'source_sha256': _digest(source),
+                'encodings': encodings
+            }
+            report.append(dict(sizes, name=name, file=built))
+
+    tmp = os.path.join(dist_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'assets': assets}, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(dist_dir, MANIFEST))
+
+    # Drop the previous build's files once the new manifest is in place.
+    current = {entry['file'] for entry in assets.values()}
+    for built in previous - current:
+        for suffix in ('', '.gz', '.br'):
+            try:
+                os.remove(os.path.join(dist_dir, built + suffix))
+            except FileNotFoundError:
+                pass
+    return report
+
+
+def print_report(report, out=sys.stdout):
+    columns = ('source', 'minified', 'gzip', 'br')
+    print(f'{"asset":<24} {"file":<32}' +
+          ''.join(f' {column:>9}' for column in columns),
+          file=out)
+    totals = dict.fromkeys(columns, 0)
+    for row in report:
+        cells = []
+        for column in columns:
+            value = row.get(column)
+            if value is None:
+                cells.append(f' {"-":>9}')
+            else:
+                totals[column] += value
+                cells.append(f' {value:>9}')
+        print(f'{row["name"]:<24} {row["file"]:<32}' + ''.join(cells),
+              file=out)
+    print(f'{"total":<24} {"":<32}' +
+          ''.join(f' {totals[column] or "-":>9}' for column in columns),
+          file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Minify, fingerprint and precompress static assets.')
+    parser.add_argument('--static', default=STATIC_DIR)
+    parser.add_argument('--output', default=DIST_DIR)
+    parser.add_argument('--clean',
+                        action='store_true',
+                        help='remove the output directory first')
+    options = parser.parse_args()
+    if options.clean:
+        shutil.rmtree(options.output, ignore_errors=True)
+    print_report(build(options.static, options.output))
+    if brotli is None:
+        print('brotli is not installed; only gzip variants were written')
+
+
+if __name__ == '__main__':
+    main()
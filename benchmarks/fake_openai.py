@@ -0,0 +1,389 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+    python benchmarks/fake_openai.py --port 8090 --latency 2.0
+    OPENAI_BASE_URL=http://127.0.0.1:8090/v1 gunicorn app:app
+
+Responses are canned but shaped like the app's prompts expect (learning
+plan, quiz questions or a plain-text explanation). Each completion waits a
+time-to-first-token drawn from the configured latency distribution, then
+emits tokens at --tokens-per-second (streamed when the request asks for
+it). --malformed-rate truncates that fraction of JSON responses to
+exercise the app's parse-failure paths. --model-latency and
+--model-malformed-rate (MODEL=VALUE, repeatable) make individual models
+faster, slower or less reliable, e.g. --model-latency gpt-5-mini=0.25.
+--rate-limit answers 429 with Retry-After, like the real API, to requests
+beyond that many per second. GET /stats reports how many completions were
+served (in total and per model), how many were malformed or rate limited
+and the peak number in flight.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LEARNING_PLAN = {
+    'overview':
+    'A practical tour of the topic.',
+    'sections': [{
+        'title': f'Section {i + 1}',
+        'estimated_time': 5,
+        'content': '<p>' + 'Explanation with an example. ' * 60 + '</p>',
+        'key_points': ['First idea', 'Second idea', 'Third idea']
+    } for i in range(5)]
+}
+
+
+def quiz_payload(count, category='technical'):
+    return {
+        'questions': [{
+            'question': f'Question {i + 1}?',
+            'options': ['Option A', 'Option B', 'Option C', 'Option D'],
+            'correct_answer': i % 4,
+            'category': category
+        } for i in range(count)]
+    }
+
+
+_INTERVIEW_CHUNK = re.compile(
+    r'exactly (\d+) multiple choice realistic (behavioral|technical)')
+
+
+def canned_reply(messages):
+    system = messages[0]['content'] if messages else ''
+    if 'writing one section' in system:
+        return LEARNING_PLAN['sections'][0]['content']
+    if 'expert educator' in system:
+        return json.dumps(LEARNING_PLAN)
+    chunk = _INTERVIEW_CHUNK.search(system)
+    if chunk:
+        return json.dumps(quiz_payload(int(chunk.group(1)), chunk.group(2)))
+    if 'hiring manager' in system:
+        questions = quiz_payload(10, 'behavioral')['questions']
+        questions += quiz_payload(10, 'technical')['questions']
+        return json.dumps({'questions': questions})
+    if 'quiz generator' in system:
+        return json.dumps(quiz_payload(3))
+    return 'Imagine the idea is a toy box: everything has its own place.'
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self,
+                 address,
+                 latency=1.0,
+                 distribution='fixed',
+                 jitter=0.25,
+                 tokens_per_second=0,
+                 malformed_rate=0.0,
+                 rate_limit=0,
+                 seed=None,
+                 model_latency=None,
+                 model_malformed_rate=None):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.distribution = distribution
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.malformed_rate = malformed_rate
+        self.rate_limit = rate_limit
+        # model -> latency factor / malformed rate overriding the defaults.
+        self.model_latency = model_latency or {}
+        self.model_malformed_rate = model_malformed_rate or {}
+        self.window_started = 0.0
+        self.window_requests = 0
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.models = {}
+        self.malformed = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def handle_error(self, request, client_address):
+        # Clients closing keep-alive connections are expected noise.
+        pass
+
+    def time_to_first_token(self, model=None):
+        latency = self.latency * self.model_latency.get(model, 1.0)
+        with self.lock:
+            if self.distribution == 'uniform':
+                return self.random.uniform(latency * (1 - self.jitter),
+                                           latency * (1 + self.jitter))
+            if self.distribution == 'lognormal':
+                return latency * self.random.lognormvariate(0, self.jitter)
+            return latency
+
+    def generation_time(self, content, model=None):
+        if not self.tokens_per_second:
+            return 0.0
+        return ((len(content) / 4) / self.tokens_per_second *
+                self.model_latency.get(model, 1.0))
+
+    def over_rate_limit(self):
+        """Counts the request against a one-second window and returns the
+        seconds until the next window if it is over --rate-limit.
+        """
+        if not self.rate_limit:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            if now - self.window_started >= 1:
+                self.window_started = now
+                self.window_requests = 0
+            self.window_requests += 1
+            if self.window_requests <= self.rate_limit:
+                return None
+            self.rate_limited += 1
+            return 1 - (now - self.window_started)
+
+    def maybe_corrupt(self, content, model=None):
+        if not content.startswith('{'):
+            return content
+        rate = self.model_malformed_rate.get(model, self.malformed_rate)
+        with self.lock:
+            if self.random.random() >= rate:
+                return content
+            self.malformed += 1
+        return content[:len(content) // 2]
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = 0
+            self.models = {}
+            self.malformed = 0
+            self.rate_limited = 0
+            self.peak_in_flight = self.in_flight
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'models': dict(self.models),
+                'malformed': self.malformed,
+                'rate_limited': self.rate_limited,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.endswith('/models'):
+            # Used by the app's client warm-up.
+            self._send_json(200, {
+                'object': 'list',
+                'data': [{
+                    'id': 'gpt-5',
+                    'object': 'model',
+                    'created': 0,
+                    'owned_by': 'fake'
+                }]
+            })
+            return
+        if self.path != '/stats':
+            self.send_error(404)
+            return
+        self._send_json(200, self.server.stats())
+
+    def do_POST(self):
+        if not self.path.endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server
+        retry_after = server.over_rate_limit()
+        if retry_after is not None:
+            self._send_json(429, {
+                'error': {
+                    'message': 'Rate limit reached for requests',
+                    'type': 'requests',
+                    'code': 'rate_limit_exceeded'
+                }
+            }, {'retry-after-ms': str(int(retry_after * 1000))})
+            return
+        model = body.get('model')
+        with server.lock:
+            server.requests += 1
+            server.models[model] = server.models.get(model, 0) + 1
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight,
+                                        server.in_flight)
+        try:
+            content = server.maybe_corrupt(
+                canned_reply(body.get('messages', [])), model)
+            if body.get('stream'):
+                self._stream(body, content)
+            else:
+                time.sleep(
+                    server.time_to_first_token(model) +
+                    server.generation_time(content, model))
+                self._send_json(200, completion(body, content))
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _stream(self, body, content):
+        model = body.get('model')
+        pieces = [content[i:i + 40] for i in range(0, len(content), 40)]
+        delay = self.server.generation_time(content, model) / max(
+            len(pieces), 1)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        time.sleep(self.server.time_to_first_token(model))
+        for piece in pieces:
+            time.sleep(delay)
+            chunk = {
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': body.get('model', 'gpt-5'),
+                'choices': [{
+                    'index': 0,
+                    'delta': {
+                        'content': piece
+                    },
+                    'finish_reason': None
+                }]
+            }
+            self._write_chunk(f'data: {json.dumps(chunk)}\n\n'.encode())
+        if (body.get('stream_options') or {}).get('include_usage'):
+            chunk = {
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': body.get('model', 'gpt-5'),
+                'choices': [],
+                'usage': usage(body, content)
+            }
+            self._write_chunk(f'data: {json.dumps(chunk)}\n\n'.encode())
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def usage(body, content):
+    prompt_chars = sum(len(m.get('content', '')) for m in body['messages'])
+    return {
+        'prompt_tokens': prompt_chars // 4,
+        'completion_tokens': len(content) // 4,
+        'total_tokens': (prompt_chars + len(content)) // 4
+    }
+
+
+def completion(body, content):
+    return {
+        'id': 'chatcmpl-fake',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'gpt-5'),
+        'choices': [{
+            'index': 0,
+            'message': {
+                'role': 'assistant',
+                'content': content
+            },
+            'finish_reason': 'stop'
+        }],
+        'usage': usage(body, content)
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency',
+                        type=float,
+                        default=1.0,
+                        help='median time to first token in seconds')
+    parser.add_argument('--latency-distribution',
+                        choices=['fixed', 'uniform', 'lognormal'],
+                        default='fixed')
+    parser.add_argument('--jitter',
+                        type=float,
+                        default=0.25,
+                        help='relative spread (uniform) or sigma (lognormal)')
+    parser.add_argument('--tokens-per-second',
+                        type=float,
+                        default=0,
+                        help='completion token throughput, 0 for instant')
+    parser.add_argument('--malformed-rate',
+                        type=float,
+                        default=0.0,
+                        help='fraction of JSON responses to truncate')
+    parser.add_argument('--rate-limit',
+                        type=int,
+                        default=0,
+                        help='requests per second before answering 429, '
+                        '0 for no limit')
+    parser.add_argument('--model-latency',
+                        action='append',
+                        default=[],
+                        metavar='MODEL=FACTOR',
+                        help='scale the latency of one model')
+    parser.add_argument('--model-malformed-rate',
+                        action='append',
+                        default=[],
+                        metavar='MODEL=RATE',
+                        help='malformed rate for one model')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def _per_model(values):
+    return {
+        model: float(value)
+        for model, value in (item.split('=', 1) for item in values)
+    }
+
+
+def from_arguments(options, host='127.0.0.1', port=0):
+    return FakeOpenAIServer((host, port),
+                            latency=options.latency,
+                            distribution=options.latency_distribution,
+                            jitter=options.jitter,
+                            tokens_per_second=options.tokens_per_second,
+                            malformed_rate=options.malformed_rate,
+                            rate_limit=options.rate_limit,
+                            seed=options.seed,
+                            model_latency=_per_model(options.model_latency),
+                            model_malformed_rate=_per_model(
+                                options.model_malformed_rate))
+
+
+def start_in_thread(host='127.0.0.1', port=0, latency=1.0, server=None):
+    server = server or FakeOpenAIServer((host, port), latency=latency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    add_arguments(parser)
+    options = parser.parse_args()
+    from_arguments(options, options.host, options.port).serve_forever()
@@ -0,0 +1,77 @@
+"""Helpers for booting the app under gunicorn in benchmarks."""
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'{url} did not come up')
+
+
+def start_gunicorn(fake, port, args=(), env=None):
+    """Starts gunicorn on port with OPENAI_BASE_URL pointing at fake."""
+    environment = dict(os.environ,
+                       SESSION_SECRET='benchmark',
+                       OPENAI_API_KEY='sk-benchmark',
+                       OPENAI_BASE_URL='http://127.0.0.1:%d/v1' %
+                       fake.server_address[1])
+    environment.update(env or {})
+    command = [
+        sys.executable, '-m', 'gunicorn', '--config=gunicorn.conf.py',
+        f'--bind=127.0.0.1:{port}', *args, 'app:app'
+    ]
+    process = subprocess.Popen(command,
+                               cwd=ROOT,
+                               env=environment,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        wait_for(f'http://127.0.0.1:{port}/')
+    except RuntimeError:
+        process.kill()
+        raise
+    return process
+
+
+def worker_pids(master_pid):
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == master_pid:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def rss_kib(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
@@ -0,0 +1,241 @@
+"""End-to-end load test of the app under gunicorn against a fake OpenAI.
+
+    python benchmarks/loadtest.py --users 40 --concurrency 10 \
+        --workers 2 --worker-class gthread --threads 16 \
+        --storage-backend sqlite --latency 1.5 \
+        --latency-distribution lognormal --tokens-per-second 400 \
+        --malformed-rate 0.05 [--json report.json]
+
+Each virtual user runs the learning flow (/generate-content ->
+/generate-quiz -> /submit-quiz, plus /eli5-explain) or, for every
+--interview-every'th user, the interview flow (/generate-interview-quiz ->
+/submit-interview-quiz). Topics are drawn from --topics distinct values,
+so the content cache sees a realistic mix of hits and misses.
+
+Reports throughput, p50/p95/p99 latency and error counts per route (with
+the 429s admission control shed broken out), the fake server's upstream
+call count (in total and per model), and the RSS of every gunicorn worker
+before and after the run. Run it once per worker class or storage backend
+with the same --seed to compare them.
+"""
+import argparse
+import http.cookiejar
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import fake_openai
+from harness import free_port, rss_kib, start_gunicorn, worker_pids
+
+
+class Recorder:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self.shed = {}
+
+    def record(self, route, seconds, ok, shed=False):
+        with self._lock:
+            self.samples.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+            if shed:
+                self.shed[route] = self.shed.get(route, 0) + 1
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1,
+                max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class VirtualUser:
+
+    def __init__(self, base, recorder):
+        self.base = base
+        self.recorder = recorder
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def post(self, route, payload):
+        request = urllib.request.Request(self.base + route,
+                                         data=json.dumps(payload).encode(),
+                                         headers={
+                                             'Content-Type':
+                                             'application/json'
+                                         })
+        started = time.monotonic()
+        shed = False
+        try:
+            with self.opener.open(request, timeout=300) as response:
+                body = json.loads(response.read() or b'null')
+                ok = True
+        except urllib.error.HTTPError as e:
+            e.read()
+            body, ok, shed = None, False, e.code == 429
+        except OSError:
+            body, ok = None, False
+        self.recorder.record(route, time.monotonic() - started, ok, shed)
+        return body
+
+    def learning_flow(self, topic):
+        content = self.post('/generate-content', {
+            'topic': topic,
+            'familiarity': 'beginner',
+            'time': 30
+        })
+        if not content:
+            return
+        quiz = self.post('/generate-quiz', {'section_index': 0})
+        if quiz:
+            self.post('/submit-quiz', {
+                'section_index': 0,
+                'answers': [0] * len(quiz['questions'])
+            })
+        self.post('/eli5-explain', {
+            'question': 'What is this section about?',
+            'section_index': 0
+        })
+
+    def interview_flow(self, company):
+        quiz = self.post(
+            '/generate-interview-quiz', {
+                'position_title': 'Backend Engineer',
+                'company': company,
+                'job_description': 'Build and operate Python web services. '
+                * 40
+            })
+        if quiz:
+            self.post('/submit-interview-quiz',
+                      {'answers': [0] * len(quiz['questions'])})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--topics', type=int, default=10)
+    parser.add_argument('--interview-every', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='gthread')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--storage-backend', default='sqlite')
+    parser.add_argument('--json', help='also write the report to this file')
+    fake_openai.add_arguments(parser)
+    options = parser.parse_args()
+
+    rng = random.Random(options.seed)
+    fake = fake_openai.start_in_thread(
+        server=fake_openai.from_arguments(options))
+    port = free_port()
+    process = start_gunicorn(
+        fake,
+        port, [
+            f'--workers={options.workers}',
+            f'--worker-class={options.worker_class}',
+            f'--threads={options.threads}', '--timeout=300'
+        ],
+        env={
+            'STORAGE_BACKEND': options.storage_backend,
+            'STORAGE_PATH': f'/tmp/learning-app-loadtest-{port}.sqlite3'
+        })
+
+    try:
+        base = f'http://127.0.0.1:{port}'
+        workers = worker_pids(process.pid)
+        rss_before = {pid: rss_kib(pid) for pid in workers}
+        recorder = Recorder()
+
+        plan = []
+        for i in range(options.users):
+            topic = f'Topic {rng.randrange(options.topics)}'
+            interview = (options.interview_every
+                         and i % options.interview_every == 0)
+            plan.append(('interview' if interview else 'learning', topic))
+
+        def run(job):
+            kind, topic = job
+            user = VirtualUser(base, recorder)
+            if kind == 'interview':
+                user.interview_flow(topic)
+            else:
+                user.learning_flow(topic)
+
+        fake.reset_stats()
+        started = time.monotonic()
+        with ThreadPoolExecutor(options.concurrency) as pool:
+            list(pool.map(run, plan))
+        elapsed = time.monotonic() - started
+        rss_after = {pid: rss_kib(pid) for pid in workers}
+    finally:
+        process.terminate()
+        process.wait()
+
+    total = sum(len(v) for v in recorder.samples.values())
+    report = {
+        'config': {
+            k: v
+            for k, v in vars(options).items() if k != 'json'
+        },
+        'elapsed_seconds': elapsed,
+        'requests': total,
+        'requests_per_second': total / elapsed if elapsed else 0.0,
+        'upstream': fake.stats(),
+        'routes': {},
+        'workers': [{
+            'pid': pid,
+            'rss_kib_before': rss_before[pid],
+            'rss_kib_after': rss_after[pid]
+        } for pid in workers]
+    }
+
+    print(f'{options.users} users, concurrency {options.concurrency}, '
+          f'{options.workers}x {options.worker_class} '
+          f'({options.threads} threads), storage {options.storage_backend}')
+    print(f'{total} requests in {elapsed:.2f}s '
+          f'({report["requests_per_second"]:.2f} req/s), '
+          f'{report["upstream"]["requests"]} upstream calls '
+          f'({report["upstream"]["malformed"]} malformed, '
+          f'{report["upstream"]["rate_limited"]} rate limited)')
+    print('upstream calls by model: ' + ', '.join(
+        f'{model} {count}'
+        for model, count in sorted(report['upstream']['models'].items(),
+                                   key=lambda item: str(item[0]))) + '\n')
+    print(f'{"route":<26} {"count":>6} {"errors":>6} {"429s":>6} '
+          f'{"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}')
+    for route in sorted(recorder.samples):
+        values = sorted(recorder.samples[route])
+        stats = {
+            'count': len(values),
+            'errors': recorder.errors.get(route, 0),
+            'shed': recorder.shed.get(route, 0),
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000
+        }
+        report['routes'][route] = stats
+        print(f'{route:<26} {stats["count"]:>6} {stats["errors"]:>6} '
+              f'{stats["shed"]:>6} {stats["p50_ms"]:>9.1f} {stats["p95_ms"]:>9.1f} '
+              f'{stats["p99_ms"]:>9.1f}')
+    print(f'\n{"worker pid":<12} {"RSS before":>12} {"RSS after":>12} '
+          f'{"growth":>10}')
+    for worker in report['workers']:
+        growth = worker['rss_kib_after'] - worker['rss_kib_before']
+        print(f'{worker["pid"]:<12} {worker["rss_kib_before"]:>9} KiB '
+              f'{worker["rss_kib_after"]:>9} KiB {growth:>+7} KiB')
+
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
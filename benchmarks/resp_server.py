@@ -0,0 +1,140 @@
+"""Minimal in-process stand-in for a Redis server.
+
+Implements just the commands RedisStore uses so the redis storage backend
+can be exercised and benchmarked without a real Redis install:
+
+    python benchmarks/resp_server.py --port 6390
+    STORAGE_BACKEND=redis STORAGE_REDIS_URL=redis://127.0.0.1:6390/0 ...
+"""
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            self.wfile.write(self.server.execute(args))
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            raise ValueError('inline commands are not supported')
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, _Handler)
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def execute(self, args):
+        name = args[0].upper()
+        with self._lock:
+            if name == b'PING':
+                return b'+PONG\r\n'
+            if name in (b'SELECT', b'AUTH'):
+                return b'+OK\r\n'
+            if name == b'GET':
+                if not self._alive(args[1]):
+                    return b'$-1\r\n'
+                value = self._data[args[1]]
+                return b'$%d\r\n%s\r\n' % (len(value), value)
+            if name == b'SET':
+                self._data[args[1]] = args[2]
+                self._expires.pop(args[1], None)
+                if len(args) >= 5 and args[3].upper() == b'PX':
+                    self._expires[args[1]] = (time.monotonic() +
+                                              int(args[4]) / 1000)
+                return b'+OK\r\n'
+            if name in (b'DEL', b'EXISTS'):
+                count = sum(1 for key in args[1:] if self._alive(key))
+                if name == b'DEL':
+                    for key in args[1:]:
+                        self._data.pop(key, None)
+                        self._expires.pop(key, None)
+                return b':%d\r\n' % count
+            if name == b'SADD':
+                members = self._data.get(args[1]) if self._alive(
+                    args[1]) else None
+                if not isinstance(members, set):
+                    members = set()
+                    self._data[args[1]] = members
+                before = len(members)
+                members.update(args[2:])
+                return b':%d\r\n' % (len(members) - before)
+            if name == b'SMEMBERS':
+                members = self._data.get(args[1]) if self._alive(
+                    args[1]) else set()
+                reply = [b'*%d\r\n' % len(members)]
+                reply.extend(b'$%d\r\n%s\r\n' % (len(m), m) for m in members)
+                return b''.join(reply)
+            if name == b'PEXPIRE':
+                if not self._alive(args[1]):
+                    return b':0\r\n'
+                self._expires[args[1]] = time.monotonic() + int(args[2]) / 1000
+                return b':1\r\n'
+            if name == b'PTTL':
+                if not self._alive(args[1]):
+                    return b':-2\r\n'
+                expires_at = self._expires.get(args[1])
+                if expires_at is None:
+                    return b':-1\r\n'
+                return b':%d\r\n' % int(
+                    (expires_at - time.monotonic()) * 1000)
+            if name == b'SCAN':
+                # One pass over every key; the cursor always comes back 0.
+                pattern = b'*'
+                for option, value in zip(args[2::2], args[3::2]):
+                    if option.upper() == b'MATCH':
+                        pattern = value
+                keys = [
+                    key for key in list(self._data)
+                    if self._alive(key) and fnmatch.fnmatchcase(key, pattern)
+                ]
+                reply = [b'*2\r\n$1\r\n0\r\n*%d\r\n' % len(keys)]
+                reply.extend(b'$%d\r\n%s\r\n' % (len(k), k) for k in keys)
+                return b''.join(reply)
+        return b'-ERR unknown command\r\n'
+
+
+def start_in_thread(host='127.0.0.1', port=0):
+    server = RespServer((host, port))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    options = parser.parse_args()
+    RespServer((options.host, options.port)).serve_forever()
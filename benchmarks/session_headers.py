@@ -0,0 +1,127 @@
+"""Per-request header bytes with cookie sessions vs. server-side sessions.
+
+    python benchmarks/session_headers.py [--job-description-kb 6]
+
+Runs the interview flow once per SESSION_BACKEND against the fake OpenAI
+server, then replays the requests a browser keeps making afterwards
+(static assets, quiz submission) and reports the Cookie header the client
+sends and the mean request header size the app observed
+(http_request_header_bytes in /metrics).
+"""
+import argparse
+import http.cookiejar
+import json
+import random
+import re
+import tempfile
+import urllib.error
+import urllib.request
+
+import fake_openai
+from harness import free_port, start_gunicorn
+
+FOLLOW_UP = ['/', '/static/style.css', '/static/script.js']
+VOCABULARY = ('design', 'build', 'operate', 'scalable', 'python', 'service',
+              'team', 'customer', 'deploy', 'monitor', 'database', 'query',
+              'latency', 'incident', 'review', 'mentor', 'roadmap', 'api',
+              'cloud', 'security', 'test', 'automate', 'pipeline', 'own',
+              'collaborate', 'product', 'metric', 'reliable', 'cost', 'data')
+
+
+def header_bytes(metrics_text):
+    values = {}
+    for name in ('sum', 'count'):
+        match = re.search(
+            rf'^http_request_header_bytes_{name}\{{[^}}]*\}} (\S+)$',
+            metrics_text, re.M)
+        values[name] = float(match.group(1)) if match else 0.0
+    return values['sum'], values['count']
+
+
+def run_backend(fake, backend, job_description, repeat):
+    port = free_port()
+    metrics_dir = tempfile.mkdtemp(prefix='session-headers-')
+    process = start_gunicorn(fake,
+                             port, ['--workers=1'],
+                             env={
+                                 'SESSION_BACKEND': backend,
+                                 'STORAGE_BACKEND': 'memory',
+                                 'METRICS_DIR': metrics_dir,
+                                 'METRICS_FLUSH_INTERVAL_SECONDS': '0'
+                             })
+    base = f'http://127.0.0.1:{port}'
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(jar))
+
+    def post(path, payload):
+        request = urllib.request.Request(base + path,
+                                         data=json.dumps(payload).encode(),
+                                         headers={
+                                             'Content-Type':
+                                             'application/json'
+                                         })
+        with opener.open(request) as response:
+            return json.loads(response.read())
+
+    try:
+        quiz = post(
+            '/generate-interview-quiz', {
+                'position_title': 'Backend Engineer',
+                'company': 'Example Corp',
+                'job_description': job_description
+            })
+        cookie = '; '.join(f'{c.name}={c.value}' for c in jar)
+
+        before_sum, before_count = header_bytes(
+            opener.open(base + '/metrics').read().decode())
+        for _ in range(repeat):
+            for path in FOLLOW_UP:
+                opener.open(base + path).read()
+            post('/submit-interview-quiz',
+                 {'answers': [0] * len(quiz['questions'])})
+        after_sum, after_count = header_bytes(
+            opener.open(base + '/metrics').read().decode())
+    finally:
+        process.terminate()
+        process.wait()
+
+    # The two /metrics requests themselves are in the window too; they
+    # carry the same cookie as every other follow-up request.
+    requests = after_count - before_count
+    return {
+        'cookie_bytes': len(cookie),
+        'mean_header_bytes':
+        (after_sum - before_sum) / requests if requests else 0.0,
+        'requests': int(requests)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--job-description-kb', type=float, default=6)
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args()
+
+    # Varied text, since Flask compresses the cookie payload and a
+    # repeated sentence would compress unrealistically well.
+    rng = random.Random(0)
+    words = []
+    while sum(len(word) + 1 for word in words) < (options.job_description_kb *
+                                                   1024):
+        words.append(rng.choice(VOCABULARY) + rng.choice(('', '', 's', 'ing')))
+    job_description = ' '.join(words)
+    fake = fake_openai.start_in_thread(latency=0.05)
+
+    print(f'job description: {len(job_description)} bytes\n')
+    print(f'{"session backend":<16} {"Cookie header":>14} '
+          f'{"mean request headers":>21} {"requests":>9}')
+    for backend in ('cookie', 'server'):
+        result = run_backend(fake, backend, job_description, options.repeat)
+        print(f'{backend:<16} {result["cookie_bytes"]:>8} bytes '
+              f'{result["mean_header_bytes"]:>15.0f} bytes '
+              f'{result["requests"]:>9}')
+
+
+if __name__ == '__main__':
+    main()
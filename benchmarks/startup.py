@@ -0,0 +1,167 @@
+"""Import time, cold start and worker memory.
+
+    python benchmarks/startup.py [--workers 2] [--top 12]
+
+First runs `python -X importtime -c "import app"` and lists the modules
+app pulls in with the most cumulative import time. Then, for each profile,
+starts gunicorn against benchmarks/fake_openai.py and reports the time
+from spawn to the first 200 on /, the latency of the first model call,
+and the RSS and PSS of every worker before and after it. PSS counts pages
+shared between the master and the workers once, so it shows what
+--preload saves.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import fake_openai
+from harness import ROOT, free_port, worker_pids
+
+PROFILES = {
+    'default': {},
+    'preload': {
+        'GUNICORN_PRELOAD': '1'
+    },
+}
+
+
+def import_times(top):
+    environment = dict(os.environ, SESSION_SECRET='benchmark')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app, sys; '
+         'print("openai" in sys.modules)'],
+        cwd=ROOT,
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((int(cumulative), depth, name.strip()))
+    total = sum(cumulative for cumulative, depth, _ in modules if depth == 0)
+    print(f'import app: {total / 1000:.0f} ms, openai imported: '
+          f'{result.stdout.strip()}')
+    print(f'{"module":<40} {"cumulative ms":>14}')
+    # Depth 1 is whatever app imports directly (or is first to pull in).
+    for cumulative, _, name in sorted(
+        (module for module in modules if module[1] == 1),
+            reverse=True)[:top]:
+        print(f'{name:<40} {cumulative / 1000:>14.1f}')
+
+
+def smaps_kib(pid, field):
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def memory(master_pid):
+    pids = worker_pids(master_pid)
+    return [(smaps_kib(pid, 'Rss'), smaps_kib(pid, 'Pss')) for pid in pids]
+
+
+def first_response(url, started, timeout=30):
+    deadline = started + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.monotonic() - started
+        except OSError:
+            time.sleep(0.005)
+    raise RuntimeError(f'{url} did not come up')
+
+
+def post(url, payload):
+    request = urllib.request.Request(url,
+                                     data=json.dumps(payload).encode(),
+                                     headers={
+                                         'Content-Type': 'application/json'
+                                     })
+    started = time.monotonic()
+    with urllib.request.urlopen(request, timeout=60) as response:
+        response.read()
+    return time.monotonic() - started
+
+
+def describe(samples):
+    rss = sum(rss for rss, _ in samples) / 1024
+    pss = sum(pss for _, pss in samples) / 1024
+    return f'{rss:>8.1f} {pss:>8.1f}'
+
+
+def run_profile(name, env, fake, workers):
+    port = free_port()
+    environment = dict(os.environ,
+                       SESSION_SECRET='benchmark',
+                       OPENAI_API_KEY='sk-benchmark',
+                       OPENAI_BASE_URL='http://127.0.0.1:%d/v1' %
+                       fake.server_address[1],
+                       STORAGE_BACKEND='memory',
+                       QUIZ_PIPELINE_ENABLED='0',
+                       LLM_CLIENT_WARMUP_CONNECTIONS='0',
+                       **env)
+    started = time.monotonic()
+    process = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn', '--config=gunicorn.conf.py',
+        f'--bind=127.0.0.1:{port}', f'--workers={workers}', 'app:app'
+    ],
+                               cwd=ROOT,
+                               env=environment,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        base = f'http://127.0.0.1:{port}'
+        ready = first_response(base + '/', started)
+        # Let the remaining workers finish booting before measuring them.
+        time.sleep(1)
+        before = memory(process.pid)
+        llm = post(base + '/generate-content', {
+            'topic': 'SQL joins',
+            'familiarity': 'beginner',
+            'time': 30,
+            'fresh': True
+        })
+        after = memory(process.pid)
+        print(f'{name:<8} {ready * 1000:>9.0f} {llm * 1000:>9.0f} '
+              f'{describe(before)} {describe(after)}')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--top', type=int, default=12)
+    parser.add_argument('--profiles', nargs='*', default=list(PROFILES))
+    options = parser.parse_args()
+
+    import_times(options.top)
+    print()
+    fake = fake_openai.start_in_thread(latency=0)
+    print(f'{"":<8} {"":>9} {"":>9} {"before first call":>17} '
+          f'{"after first call":>17}')
+    print(f'{"profile":<8} {"ready ms":>9} {"LLM ms":>9} {"RSS MiB":>8} '
+          f'{"PSS MiB":>8} {"RSS MiB":>8} {"PSS MiB":>8}')
+    for name in options.profiles:
+        run_profile(name, PROFILES[name], fake, options.workers)
+
+
+if __name__ == '__main__':
+    main()
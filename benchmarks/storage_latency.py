@@ -0,0 +1,91 @@
+"""Lookup latency of the storage backends against a plain dict.
+
+    python benchmarks/storage_latency.py [--iterations 5000]
+
+The redis backend is measured against benchmarks/resp_server.py unless
+STORAGE_REDIS_URL points at a real server.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import MemoryStore, RedisStore, SQLiteStore  # noqa: E402
+
+import resp_server  # noqa: E402
+
+SAMPLE_PLAN = {
+    'learning_content': {
+        'overview': 'A short overview of the topic. ' * 4,
+        'sections': [{
+            'title': f'Section {i}',
+            'estimated_time': 5,
+            'content': '<p>' + 'Detailed explanation. ' * 150 + '</p>',
+            'key_points': ['point one', 'point two', 'point three']
+        } for i in range(6)]
+    },
+    'topic': 'SQL joins'
+}
+
+
+class DictStore:
+
+    def __init__(self):
+        self._data = {}
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def set(self, key, value, ttl=None, owner=None):
+        self._data[key] = value
+
+
+def measure(store, iterations):
+    keys = [f'session-{i}' for i in range(200)]
+    for key in keys:
+        store.set(key, SAMPLE_PLAN, owner=key)
+    samples = []
+    for i in range(iterations):
+        key = keys[i % len(keys)]
+        started = time.perf_counter()
+        store.get(key)
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {
+        'p50': statistics.median(samples),
+        'p99': samples[int(len(samples) * 0.99) - 1],
+        'mean': statistics.fmean(samples)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=5000)
+    options = parser.parse_args()
+
+    redis_url = os.environ.get('STORAGE_REDIS_URL')
+    if not redis_url:
+        server = resp_server.start_in_thread()
+        redis_url = 'redis://127.0.0.1:%d/0' % server.server_address[1]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [
+            ('dict', DictStore()),
+            ('memory', MemoryStore('bench')),
+            ('sqlite', SQLiteStore('bench', os.path.join(tmp,
+                                                         'bench.sqlite3'))),
+            ('redis', RedisStore('bench', redis_url)),
+        ]
+        print(f'{"backend":<8} {"p50 us":>10} {"p99 us":>10} {"mean us":>10}')
+        for name, store in backends:
+            result = measure(store, options.iterations)
+            print(f'{name:<8} {result["p50"]:>10.1f} {result["p99"]:>10.1f} '
+                  f'{result["mean"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
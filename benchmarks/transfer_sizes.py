@@ -0,0 +1,102 @@
+"""Bytes on the wire for the page, its assets and the largest API payloads.
+
+    python benchmarks/transfer_sizes.py [--fanout]
+
+Builds the static assets into a temporary directory, starts gunicorn
+against benchmarks/fake_openai.py and fetches /, each asset the page links
+and the /generate-content and /generate-interview-quiz responses with
+Accept-Encoding set to identity, gzip and "br, gzip", as a browser sends
+it. The API requests are replayed with each encoding, so the fake answers
+all three with the same content size.
+"""
+import argparse
+import json
+import re
+import sys
+import tempfile
+import urllib.request
+
+import fake_openai
+from harness import ROOT, free_port, start_gunicorn
+
+sys.path.insert(0, ROOT)
+import assets  # noqa: E402
+
+ENCODINGS = ('identity', 'gzip', 'br, gzip')
+
+
+def fetch(url, accept_encoding, payload=None):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode() if payload is not None else None,
+        headers={
+            'Accept-Encoding': accept_encoding,
+            'Content-Type': 'application/json'
+        })
+    with urllib.request.urlopen(request, timeout=120) as response:
+        # urllib does not decode Content-Encoding, so this is what was sent.
+        return (len(response.read()),
+                response.headers.get('Content-Encoding', 'identity'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fanout',
+                        action='store_true',
+                        help='generate interview quizzes with the fan-out')
+    options = parser.parse_args()
+
+    dist = tempfile.mkdtemp(prefix='assets-')
+    assets.print_report(assets.build(dist_dir=dist))
+    print()
+
+    fake = fake_openai.start_in_thread(latency=0)
+    port = free_port()
+    process = start_gunicorn(fake,
+                             port,
+                             ['--workers=1'],
+                             env={
+                                 'ASSET_DIR': dist,
+                                 'STORAGE_BACKEND': 'memory',
+                                 'QUIZ_PIPELINE_ENABLED': '0',
+                                 'INTERVIEW_QUIZ_FANOUT':
+                                 '1' if options.fanout else '0'
+                             })
+    base = f'http://127.0.0.1:{port}'
+    try:
+        page = urllib.request.urlopen(base + '/').read().decode()
+        requests = [('/', None)]
+        requests += [(path, None) for path in re.findall(
+            r'(?:href|src)="(/assets/[^"]+)"', page)]
+        requests += [('/generate-content', {
+            'topic': 'SQL joins',
+            'familiarity': 'beginner',
+            'time': 60,
+            'fresh': True
+        }),
+                     ('/generate-interview-quiz', {
+                         'position_title': 'Data engineer',
+                         'company': 'Example Corp',
+                         'job_description':
+                         'Build and run batch and streaming pipelines.'
+                     })]
+
+        print(f'{"path":<40}' +
+              ''.join(f' {encoding:>18}' for encoding in ENCODINGS))
+        totals = [0] * len(ENCODINGS)
+        for path, payload in requests:
+            cells = []
+            for i, accept_encoding in enumerate(ENCODINGS):
+                size, encoding = fetch(base + path, accept_encoding, payload)
+                totals[i] += size
+                cells.append(f' {size:>9} {encoding:>8}')
+            print(f'{path[:40]:<40}' + ''.join(cells))
+        print(f'{"total":<40}' +
+              ''.join(f' {total:>9} {"":>8}' for total in totals))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Concurrent LLM-bound requests one gunicorn worker can hold at once.
+
+    python benchmarks/worker_concurrency.py [--clients 16] [--latency 2]
+
+Starts benchmarks/fake_openai.py, then for each worker profile boots a
+single-worker gunicorn and fires --clients simultaneous /generate-content
+requests. Reports wall time, throughput and the peak number of upstream
+calls that were in flight at the same time.
+"""
+import argparse
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import fake_openai
+from harness import free_port, start_gunicorn
+
+PROFILES = {
+    'sync': ['--worker-class', 'sync', '--threads', '1'],
+    'gthread': ['--worker-class', 'gthread', '--threads', '16'],
+}
+
+
+def post(url, payload):
+    request = urllib.request.Request(url,
+                                     data=json.dumps(payload).encode(),
+                                     headers={
+                                         'Content-Type': 'application/json'
+                                     })
+    with urllib.request.urlopen(request, timeout=300) as response:
+        response.read()
+        return response.status
+
+
+def run_profile(name, args, fake, clients):
+    port = free_port()
+    process = start_gunicorn(fake,
+                             port,
+                             ['--workers=1', '--timeout=300', *args],
+                             env={
+                                 'STORAGE_BACKEND': 'memory',
+                                 'QUIZ_PIPELINE_ENABLED': '0'
+                             })
+    try:
+        base = f'http://127.0.0.1:{port}'
+        fake.reset_stats()
+        # fresh bypasses the content cache so every request goes upstream.
+        payload = {
+            'topic': 'SQL joins',
+            'familiarity': 'beginner',
+            'time': 30,
+            'fresh': True
+        }
+        started = time.monotonic()
+        with ThreadPoolExecutor(clients) as pool:
+            statuses = list(
+                pool.map(lambda _: post(base + '/generate-content', payload),
+                         range(clients)))
+        elapsed = time.monotonic() - started
+        stats = fake.stats()
+        ok = sum(1 for status in statuses if status == 200)
+        print(f'{name:<8} {ok:>4}/{clients:<4} {elapsed:>8.2f} '
+              f'{ok / elapsed:>8.2f} {stats["peak_in_flight"]:>10}')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=2.0)
+    parser.add_argument('--profiles', nargs='*', default=list(PROFILES))
+    options = parser.parse_args()
+
+    fake = fake_openai.start_in_thread(latency=options.latency)
+    print(f'{"profile":<8} {"ok":>9} {"wall s":>8} {"req/s":>8} '
+          f'{"peak LLM":>10}')
+    for name in options.profiles:
+        run_profile(name, PROFILES[name], fake, options.clients)
+
+
+if __name__ == '__main__':
+    main()
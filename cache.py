@@ -0,0 +1,185 @@
+import hashlib
+import json
+import threading
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; everyone who arrives while
+    it is still running waits for and shares its result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def claim(self, key):
+        """Claims key for a caller that runs the work itself instead of
+        through do(), e.g. while streaming its result. Returns True if the
+        caller now leads and must call release(key) when done, or False if
+        another call for key is in flight.
+        """
+        with self._lock:
+            if key in self._calls:
+                return False
+            self._calls[key] = _Call()
+            return True
+
+    def release(self, key, result=None):
+        with self._lock:
+            call = self._calls.pop(key)
+        call.result = result
+        call.done.set()
+
+    def wait(self, key, timeout=None):
+        """Waits for the call in flight for key, if any. Returns False if
+        it is still running after timeout.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+        return call is None or call.done.wait(timeout)
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResponseCache:
+    """Content-addressed cache for generated responses.
+
+    Keys are a hash of the normalized request parameters plus a prompt
+    version, so changing a prompt invalidates old entries. Misses go
+    through SingleFlight so identical concurrent requests in a worker
+    trigger a single upstream call.
+    """
+
+    def __init__(self, store, version):
+        self.store = store
+        self.version = version
+        self.flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bypassed = 0
+
+    def key(self, *parts):
+        raw = json.dumps([self.version, *parts], separators=(',', ':'))
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key):
+        value = self.store.get(key)
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value):
+        self.store.set(key, value)
+
+    def get_or_compute(self, key, compute, refresh=False):
+        """Returns (value, status) where status is hit/miss/coalesced/bypass.
+
+        compute() may return None to signal a result that must not be
+        cached; it is handed back to the caller as-is.
+        """
+        if refresh:
+            self._count('bypassed')
+            value = compute()
+            if value is not None:
+                self.store.set(key, value)
+            return value, 'bypass'
+
+        value = self.store.get(key)
+        if value is not None:
+            self._count('hits')
+            return value, 'hit'
+
+        def fill():
+            value = compute()
+            if value is not None:
+                self.store.set(key, value)
+            return value
+
+        value, shared = self.flight.do(key, fill)
+        self._count('coalesced' if shared else 'misses')
+        return value, 'coalesced' if shared else 'miss'
+
+    def claim(self, key, timeout):
+        """get_or_compute() for callers that compute the value themselves,
+        e.g. while streaming it. Returns (value, leader): the stored value,
+        or the one stored by a caller already computing it within timeout;
+        otherwise None and whether this caller now leads. A leader must
+        call release(key, value) when done, with None if it failed.
+        """
+        value = self.store.get(key)
+        if value is not None:
+            self._count('hits')
+            return value, False
+
+        leader = self.flight.claim(key)
+        if not leader:
+            self.flight.wait(key, timeout)
+            value = self.store.get(key)
+            if value is not None:
+                self._count('coalesced')
+                return value, False
+            # The other caller failed or is slow; go ahead, leading if the
+            # key has been released.
+            leader = self.flight.claim(key)
+        self._count('misses')
+        return None, leader
+
+    def release(self, key, value=None):
+        if value is not None:
+            self.store.set(key, value)
+        self.flight.release(key, value)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            served = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'bypassed': self.bypassed,
+                'hit_ratio':
+                (self.hits + self.coalesced) / served if served else 0.0,
+                'store': self.store.stats()
+            }
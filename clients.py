@@ -0,0 +1,115 @@
+"""Per-worker OpenAI clients.
+
+An OpenAI client owns an httpx connection pool. Created at import time, a
+client built in the gunicorn master (with --preload) would hand the same
+sockets to every forked worker. WorkerClient builds the client lazily in
+each process instead, with explicit keep-alive pool limits, and can open
+its first connections ahead of the first request (warm_up, run from
+gunicorn's post_worker_init hook), so no user pays for connection and TLS
+setup.
+"""
+import os
+import threading
+import weakref
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get('LLM_HTTP_MAX_CONNECTIONS', 32))
+HTTP_MAX_KEEPALIVE = int(os.environ.get('LLM_HTTP_MAX_KEEPALIVE', 16))
+HTTP_KEEPALIVE_SECONDS = float(
+    os.environ.get('LLM_HTTP_KEEPALIVE_SECONDS', 60))
+# Defaults for calls that do not set their own timeout (see llm.py).
+CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT_SECONDS', 5))
+READ_TIMEOUT = float(os.environ.get('LLM_READ_TIMEOUT_SECONDS', 120))
+MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 2))
+WARMUP_CONNECTIONS = int(os.environ.get('LLM_CLIENT_WARMUP_CONNECTIONS', 2))
+
+_clients = weakref.WeakSet()
+
+
+def create_openai_client(**kwargs):
+    # The SDK takes most of the app's import time, so it is only imported
+    # once a worker actually talks to the API (or, with GUNICORN_PRELOAD,
+    # once in the master; see gunicorn.conf.py).
+    # The pool limits and timeouts are built from what the SDK exports,
+    # not from its HTTP library, which the app does not depend on directly.
+    from openai import (DEFAULT_CONNECTION_LIMITS, DefaultHttpxClient, OpenAI,
+                        Timeout)
+
+    limits = type(DEFAULT_CONNECTION_LIMITS)(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS)
+    return OpenAI(http_client=DefaultHttpxClient(limits=limits),
+                  timeout=Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                  max_retries=MAX_RETRIES,
+                  **kwargs)
+
+
+class WorkerClient:
+    """Stands in for an OpenAI client, building the real one on first use
+    in every process.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_pid = None
+        self.warmed = 0
+        self.warmup_failed = 0
+        _clients.add(self)
+
+    def get(self):
+        with self._lock:
+            if self._client is None or self._client_pid != os.getpid():
+                self._client = self._factory()
+                self._client_pid = os.getpid()
+            return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def warm_up(self, connections=WARMUP_CONNECTIONS):
+        """Builds the client and opens up to connections pooled connections
+        by listing models, which needs no tokens, all in the background.
+        Failures only cost the first real call its connection setup.
+        """
+
+        def connect(client):
+            try:
+                client.models.list()
+            except Exception:
+                with self._lock:
+                    self.warmup_failed += 1
+            else:
+                with self._lock:
+                    self.warmed += 1
+
+        def run():
+            client = self.get().with_options(max_retries=0, timeout=10)
+            for _ in range(connections):
+                threading.Thread(target=connect,
+                                 args=(client, ),
+                                 name='llm-client-warmup',
+                                 daemon=True).start()
+
+        threading.Thread(target=run, name='llm-client-warmup',
+                         daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pid': self._client_pid,
+                'warmed_connections': self.warmed,
+                'warmup_failed': self.warmup_failed
+            }
+
+
+def import_sdk():
+    import openai  # noqa: F401
+
+
+def warm_up_all():
+    if not WARMUP_CONNECTIONS:
+        return
+    for client in list(_clients):
+        client.warm_up()
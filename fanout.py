@@ -0,0 +1,84 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class FanOut:
+    """Runs independent sub-generations of one response concurrently.
+
+    run() submits one job per chunk and yields (chunk, result, error) in
+    completion order, so callers can deliver each part as soon as it is
+    ready. A chunk whose generation raises or returns nothing is resubmitted
+    on its own, up to retries times; the other chunks are never regenerated.
+    A chunk that still fails is yielded with a None result and the exception
+    from its last attempt, if any.
+    """
+
+    def __init__(self, max_workers=8, retries=1):
+        self.max_workers = max_workers
+        self.retries = retries
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self.runs = 0
+        self.chunks = 0
+        self.retried = 0
+        self.failed = 0
+
+    def _pool(self):
+        # Executor threads do not survive a fork, so each gunicorn worker
+        # builds its own pool on first use.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='fanout')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def run(self, chunks, generate):
+        pool = self._pool()
+        attempts = {}
+        pending = {}
+        for chunk in chunks:
+            attempts[chunk] = 1
+            # Chunks run in the caller's context, so their model calls are
+            # admitted against its session and priority.
+            pending[pool.submit(contextvars.copy_context().run, generate,
+                                chunk)] = chunk
+        with self._lock:
+            self.runs += 1
+            self.chunks += len(chunks)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = pending.pop(future)
+                error = None
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result, error = None, e
+
+                if result:
+                    yield chunk, result, None
+                elif attempts[chunk] <= self.retries:
+                    attempts[chunk] += 1
+                    with self._lock:
+                        self.retried += 1
+                    pending[pool.submit(contextvars.copy_context().run,
+                                        generate, chunk)] = chunk
+                else:
+                    with self._lock:
+                        self.failed += 1
+                    yield chunk, None, error
+
+    def stats(self):
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'chunks': self.chunks,
+                'retried': self.retried,
+                'failed': self.failed
+            }
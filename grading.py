@@ -0,0 +1,105 @@
+"""Quiz grading shared by the section and interview quizzes.
+
+When a quiz is created it gets an answer key, stored with it:
+
+    {'kind': 'section', 'topic': ..., 'section': ...,
+     'answers': '2013', 'categories': 'gggg', 'ids': ['9f2c41d07a6e', ...]}
+
+answers holds each question's correct option index as one digit (there are
+at most four options), categories one letter per question (CATEGORIES) and
+ids a short hash of each question's kind, topic, text and options, which
+identifies the question in the results ledger (see results.py) wherever
+it is reused, e.g. in pre-generated quizzes, without merging the same
+wording asked in another topic or kind of quiz.
+
+grade() scores submitted answers against the key and returns both the
+response for the client and the record for the ledger.
+"""
+import hashlib
+import time
+
+CATEGORIES = {'general': 'g', 'behavioral': 'b', 'technical': 't'}
+CATEGORY_NAMES = {code: name for name, code in CATEGORIES.items()}
+QUESTION_TEXT_LIMIT = 200
+
+
+def question_id(question, kind=None, topic=None):
+    parts = [
+        kind or '', ' '.join((topic or '').casefold().split()),
+        question['question'], *(str(option) for option in question['options'])
+    ]
+    return hashlib.blake2b('\x1f'.join(parts).encode('utf-8'),
+                           digest_size=6).hexdigest()
+
+
+def answer_key(questions, kind, topic=None, section=None):
+    return {
+        'kind': kind,
+        'topic': topic,
+        'section': section,
+        'answers': ''.join(str(q['correct_answer']) for q in questions),
+        'categories': ''.join(
+            CATEGORIES.get(q.get('category'), 'g') for q in questions),
+        'ids': [question_id(q, kind, topic) for q in questions]
+    }
+
+
+def with_answer_key(quiz, kind, topic=None, section=None):
+    """Returns a copy of quiz with its answer key added."""
+    return dict(quiz,
+                key=answer_key(quiz['questions'], kind, topic, section))
+
+
+def grade(quiz, answers, key=None):
+    """Scores answers (option indexes) against the quiz's answer key, or
+    key when the quiz was stored without one. Returns (result, record):
+    the response body for the client and the entry for the results
+    ledger. Raises ValueError if the number of answers does not match.
+    """
+    key = key or quiz['key']
+    correct_answers = key['answers']
+    if len(answers) != len(correct_answers):
+        raise ValueError('Invalid number of answers')
+
+    questions = quiz['questions']
+    marks = ''.join('1' if str(answer) == correct else '0'
+                    for answer, correct in zip(answers, correct_answers))
+    score = marks.count('1')
+    total = len(correct_answers)
+
+    incorrect_questions = []
+    for i, mark in enumerate(marks):
+        if mark == '1':
+            continue
+        q = questions[i]
+        answer = answers[i]
+        incorrect_questions.append({
+            'question_number':
+            i + 1,
+            'question':
+            q['question'],
+            'your_answer':
+            q['options'][answer]
+            if 0 <= answer < len(q['options']) else 'Not answered',
+            'correct_answer':
+            q['options'][int(correct_answers[i])]
+        })
+
+    result = {
+        'score': score,
+        'total': total,
+        'percentage': (score / total * 100) if total > 0 else 0,
+        'incorrect_questions': incorrect_questions
+    }
+    record = {
+        'time': round(time.time(), 3),
+        'kind': key['kind'],
+        'topic': key['topic'],
+        'section': key['section'],
+        'ids': key['ids'],
+        'categories': key['categories'],
+        'marks': marks,
+        'questions':
+        [q['question'][:QUESTION_TEXT_LIMIT] for q in questions]
+    }
+    return result, record
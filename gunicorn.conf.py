@@ -0,0 +1,49 @@
+# Gunicorn settings for the deployment (gunicorn loads this file from the
+# working directory automatically). Every value can be overridden through
+# the environment so worker profiles can be compared without code changes.
+#
+# LLM calls are network-bound and can take a minute, so the default profile
+# uses threaded workers: a long completion occupies one thread, not a whole
+# worker process. Per-worker upstream concurrency is capped separately by
+# LLM_MAX_CONCURRENCY (see llm.py), which should stay below GUNICORN_THREADS.
+# Note that gunicorn silently turns a sync worker into gthread whenever
+# threads > 1, so a true sync profile also needs GUNICORN_THREADS=1.
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+reuse_port = True
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+# Threaded workers heartbeat from the main thread, so this only fires when a
+# worker is truly stuck, not when one completion is slow.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# GUNICORN_PRELOAD=1 imports the app, and the OpenAI SDK it otherwise loads
+# on first use, once in the master. Workers fork with those modules already
+# in memory and share the pages copy-on-write, at the cost of a slower
+# master start. The default keeps the master light and lets each worker
+# import the SDK in the background after it starts serving.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+
+
+def on_starting(server):
+    # Per-worker metric snapshots from a previous run would otherwise be
+    # merged into /metrics forever.
+    import metrics
+    metrics.clear_directory()
+
+
+def when_ready(server):
+    # Runs in the master before the first workers are forked.
+    if server.cfg.preload_app:
+        import clients
+        clients.import_sdk()
+
+
+def post_worker_init(worker):
+    # Each worker builds its own OpenAI client (see clients.py); open its
+    # first connections now rather than during the first user's request.
+    import clients
+    clients.warm_up_all()
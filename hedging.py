@@ -0,0 +1,122 @@
+import math
+import os
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class Hedger:
+    """Issues a second copy of a slow call and takes whichever finishes
+    first.
+
+    run() waits for the call up to the endpoint's recent latency
+    percentile; if it has not returned by then, start_hedge() is asked for
+    a duplicate (it may decline, e.g. when no upstream slot is free) and
+    both race. The loser runs to completion in the background and its
+    result is dropped. Endpoints are only hedged once min_samples
+    latencies have been seen, so the delay reflects real traffic.
+    """
+
+    def __init__(self,
+                 endpoints=(),
+                 percentile=0.95,
+                 window=200,
+                 min_samples=20,
+                 max_workers=12):
+        self.endpoints = frozenset(endpoints)
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._latencies = {}
+        self.hedged = 0
+        self.won = 0
+        self.declined = 0
+
+    def _pool(self):
+        # Executor threads do not survive a fork, so each gunicorn worker
+        # builds its own pool on first use.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='hedge')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def enabled(self, endpoint):
+        return endpoint in self.endpoints
+
+    def observe(self, endpoint, seconds):
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None:
+                latencies = self._latencies[endpoint] = deque(
+                    maxlen=self.window)
+            latencies.append(seconds)
+
+    def delay(self, endpoint):
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if not latencies or len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1,
+                           math.ceil(self.percentile * len(ordered)) - 1)]
+
+    def run(self, endpoint, call, start_hedge):
+        """Returns call()'s result, or that of the hedge started from
+        start_hedge() (a callable, or None to skip hedging) if it finishes
+        first.
+        """
+        delay = self.delay(endpoint)
+        if delay is None:
+            return call()
+
+        pool = self._pool()
+        first = pool.submit(call)
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+
+        hedge_call = start_hedge()
+        if hedge_call is None:
+            with self._lock:
+                self.declined += 1
+            return first.result()
+        with self._lock:
+            self.hedged += 1
+        second = pool.submit(hedge_call)
+
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is second:
+                    with self._lock:
+                        self.won += 1
+                return result
+        raise error
+
+    def stats(self):
+        with self._lock:
+            endpoints = sorted(self.endpoints)
+        return {
+            'endpoints': endpoints,
+            'delay_seconds':
+            {endpoint: self.delay(endpoint)
+             for endpoint in endpoints},
+            'hedged': self.hedged,
+            'hedge_won': self.won,
+            'declined': self.declined
+        }
@@ -0,0 +1,143 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SectionLoader:
+    """Fills in section bodies of outline-only learning plans on demand.
+
+    A lazy plan is stored with every section's content set to None. ensure()
+    generates a section's content the first time it is needed, writes it
+    back into the plan entry in the content store (so /generate-quiz and
+    /eli5-explain see a complete section) and calls on_loaded once per
+    section. If compact is given, the prompt-ready text of the body is
+    stored alongside it in section_texts. Bodies are cached by the outline
+    they were written for, so sessions that get the same outline share
+    them, and concurrent requests for one section share a single upstream
+    call. prefetch() does the same in the background for the section the
+    user is likely to open next.
+    """
+
+    def __init__(self,
+                 generate,
+                 cache,
+                 store,
+                 on_loaded=None,
+                 compact=None,
+                 max_workers=2):
+        self.generate = generate
+        self.cache = cache
+        self.store = store
+        self.on_loaded = on_loaded
+        self.compact = compact
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._prefetching = set()
+        self.loaded = 0
+        self.prefetched = 0
+        self.failed = 0
+
+    def _pool(self):
+        # Executor threads do not survive a fork, so each gunicorn worker
+        # builds its own pool on first use.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='section-loader')
+                self._executor_pid = os.getpid()
+                self._prefetching = set()
+            return self._executor
+
+    def section_key(self, stored_data, index):
+        section = stored_data['learning_content']['sections'][index]
+        return self.cache.key('section', stored_data['outline_key'], index,
+                              section['title'], section['key_points'])
+
+    def ensure(self, session_id, stored_data, index):
+        """Returns the section at index with its content, generating the
+        content if needed, or None if it could not be generated.
+        """
+        section = stored_data['learning_content']['sections'][index]
+        if section.get('content') is not None:
+            return section
+
+        content, _ = self.cache.get_or_compute(
+            self.section_key(stored_data, index),
+            lambda: self.generate(stored_data, index))
+        if not content:
+            with self._lock:
+                self.failed += 1
+            return None
+
+        section = dict(section, content=content)
+        if self._merge(session_id, stored_data['plan_id'], index, content):
+            with self._lock:
+                self.loaded += 1
+            if self.on_loaded:
+                self.on_loaded(session_id, stored_data['plan_id'], index,
+                               stored_data['topic'], section)
+        return section
+
+    def _merge(self, session_id, plan_id, index, content):
+        # Another worker can write the same entry; the cached body makes a
+        # lost update cheap to repair on the next ensure().
+        with self._lock:
+            stored_data = self.store.get(session_id)
+            if not stored_data or stored_data.get('plan_id') != plan_id:
+                return False
+            learning_content = stored_data['learning_content']
+            sections = list(learning_content['sections'])
+            if sections[index].get('content') is not None:
+                return False
+            # Copy instead of mutating: the memory store hands out the same
+            # objects the cache holds.
+            sections[index] = dict(sections[index], content=content)
+            stored_data = dict(stored_data,
+                               learning_content=dict(learning_content,
+                                                     sections=sections))
+            if self.compact:
+                texts = list(stored_data.get('section_texts')
+                             or [None] * len(sections))
+                texts[index] = self.compact(content)
+                stored_data['section_texts'] = texts
+            self.store.set(session_id, stored_data, owner=session_id)
+            return True
+
+    def prefetch(self, session_id, stored_data, index):
+        sections = stored_data['learning_content']['sections']
+        if (index >= len(sections)
+                or sections[index].get('content') is not None):
+            return
+        pool = self._pool()
+        job = (session_id, stored_data['plan_id'], index)
+        with self._lock:
+            if job in self._prefetching:
+                return
+            self._prefetching.add(job)
+            self.prefetched += 1
+        pool.submit(contextvars.copy_context().run, self._prefetch, job,
+                    session_id, stored_data, index)
+
+    def _prefetch(self, job, session_id, stored_data, index):
+        try:
+            self.ensure(session_id, stored_data, index)
+        except Exception:
+            # The section is generated again when it is actually opened.
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._prefetching.discard(job)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self.loaded,
+                'prefetched': self.prefetched,
+                'failed': self.failed,
+                'prefetching': len(self._prefetching)
+            }
@@ -0,0 +1,262 @@
+"""Read-only library of pre-generated learning plans.
+
+The library is built offline (`flask --app app pregenerate`) for the topics
+that make up most of the traffic. It is two files:
+
+- the data file, one zlib-compressed JSON record per entry, back to back;
+- an index (`<data>.idx`, JSON) mapping each entry's key to the offset and
+  length of its record, plus the topic, familiarity and time it was
+  generated for.
+
+ContentLibrary memory-maps the data file read-only, so every gunicorn
+worker shares the same page-cache pages, and keeps only the index in
+memory. A lookup is a dict lookup, a slice of the map and a decompress.
+
+While a build runs, each finished record is appended to a copy of the
+data file (`<data>.building`) and recorded in a journal (`<data>.journal`)
+before the next one starts, so an interrupted build resumes where it
+stopped. When the build finishes the copy is renamed over the data file,
+and only then is the index written, so an index never points past the
+data it describes. Running workers keep the index and map they loaded at
+startup.
+"""
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+INDEX_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+def _read_index(path):
+    try:
+        with open(path + '.idx', encoding='utf-8') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if index.get('version') != INDEX_VERSION:
+        raise RuntimeError(f'Unsupported library index version in {path}.idx')
+    return index['entries']
+
+
+def _read_journal(path):
+    entries = {}
+    try:
+        with open(path + '.journal', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut off by an interrupted build; its record is
+                    # truncated away and generated again.
+                    break
+                entries[entry.pop('key')] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+class ContentLibrary:
+    """Serves records from a library built by LibraryWriter. A missing
+    library is simply empty, and so is one whose data file is missing;
+    entries past the end of a truncated data file are left out.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._map = None
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+        entries = _read_index(path)
+        if not entries:
+            return
+        try:
+            with open(path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # ValueError: the data file is empty and cannot be mapped.
+            logger.warning(
+                'Content library %s has an index but no data; '
+                'serving it as empty', path)
+            return
+        size = len(self._map)
+        self.entries = {
+            key: entry
+            for key, entry in entries.items()
+            if entry['offset'] + entry['length'] <= size
+        }
+        if len(self.entries) < len(entries):
+            logger.warning(
+                'Content library %s is truncated; %d of %d entries are '
+                'missing', path,
+                len(entries) - len(self.entries), len(entries))
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self._count('misses')
+            return None
+        offset = entry['offset']
+        try:
+            record = json.loads(
+                zlib.decompress(self._map[offset:offset + entry['length']]))
+        except (zlib.error, ValueError):
+            self._count('errors')
+            return None
+        self._count('hits')
+        return record
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'entries': len(self.entries),
+                'bytes': len(self._map) if self._map is not None else 0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+
+class LibraryWriter:
+    """Appends records to a library, resuming an interrupted build.
+
+    Entries already in the index or the journal count as done, unless the
+    data no longer holds their record in full; anything the data holds past
+    the last journaled record is a partial write and is truncated away.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.building = path + '.building'
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Records are appended to a copy, so the file workers map does not
+        # change until finish() renames the copy into place.
+        if not os.path.exists(self.building):
+            try:
+                shutil.copyfile(path, self.building)
+            except FileNotFoundError:
+                pass
+        self._data = open(self.building, 'ab+')
+        size = self._data.seek(0, os.SEEK_END)
+
+        entries = _read_index(path)
+        journaled = _read_journal(path)
+        entries.update(journaled)
+        self.entries = {
+            key: entry
+            for key, entry in entries.items()
+            if entry['offset'] + entry['length'] <= size
+        }
+        end = max((entry['offset'] + entry['length']
+                   for entry in self.entries.values()),
+                  default=0)
+        self._data.truncate(end)
+        self._data.seek(end)
+        # Rewritten rather than appended to, so a line cut off by an
+        # interrupted build cannot run into the next one.
+        self._journal = open(path + '.journal', 'w', encoding='utf-8')
+        for key, entry in journaled.items():
+            if key in self.entries:
+                self._journal.write(json.dumps(dict(entry, key=key)) + '\n')
+        self._journal.flush()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def add(self, key, record, **meta):
+        blob = zlib.compress(
+            json.dumps(record, separators=(',', ':')).encode('utf-8'), 9)
+        with self._lock:
+            entry = dict(meta, offset=self._data.tell(), length=len(blob))
+            self._data.write(blob)
+            self._data.flush()
+            os.fsync(self._data.fileno())
+            self._journal.write(json.dumps(dict(entry, key=key)) + '\n')
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self.entries[key] = entry
+
+    def finish(self):
+        """Renames the data into place, then writes the index and drops
+        the journal it replaces.
+        """
+        with self._lock:
+            self._data.close()
+            self._journal.close()
+            os.replace(self.building, self.path)
+            tmp = self.path + '.idx.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': INDEX_VERSION,
+                    'entries': self.entries
+                }, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path + '.idx')
+            os.remove(self.path + '.journal')
+
+
+def build(writer, jobs, generate, concurrency=4, on_result=None):
+    """Generates the records for jobs, a list of (key, meta) pairs, that
+    the writer does not have yet, at most concurrency at a time.
+
+    generate(meta) returns the record or None; on_result(key, meta, ok,
+    error) is called as each job finishes. Returns (generated, failed).
+    Failed jobs are left out and retried by the next build.
+    """
+    pending = [(key, meta) for key, meta in dict(jobs).items()
+               if key not in writer]
+    generated = failed = 0
+    pool = ThreadPoolExecutor(max_workers=concurrency,
+                              thread_name_prefix='pregenerate')
+    try:
+        futures = {
+            pool.submit(generate, meta): (key, meta)
+            for key, meta in pending
+        }
+        for future in as_completed(futures):
+            key, meta = futures[future]
+            error = None
+            try:
+                record = future.result()
+            except Exception as e:
+                record, error = None, e
+            if record:
+                writer.add(key, record, **meta)
+                generated += 1
+            else:
+                failed += 1
+            if on_result:
+                on_result(key, meta, bool(record), error)
+    finally:
+        # On an interrupt, drop the queued jobs instead of waiting for
+        # them; the next build picks them up.
+        pool.shutdown(cancel_futures=True)
+    return generated, failed
@@ -0,0 +1,373 @@
+import json
+import math
+import os
+import time
+
+import metrics
+from admission import (AdmissionController, LLMBusyError, RateLimiter,
+                       current_caller)
+from clients import CONNECT_TIMEOUT, READ_TIMEOUT
+from hedging import Hedger
+from prompts import completion_budget
+from routing import ModelRouter, Route
+
+# Upper bound on upstream completions running at once in one worker. Keep it
+# below the gunicorn thread count so cheap requests (static files, quiz
+# submissions) always find a free thread while LLM calls are in flight.
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 12))
+LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT_SECONDS', 20))
+
+admission = AdmissionController(
+    max_in_flight=LLM_MAX_CONCURRENCY,
+    per_session=int(os.environ.get('LLM_MAX_CONCURRENCY_PER_SESSION', 8)),
+    queue_timeout=LLM_QUEUE_TIMEOUT,
+    background_timeout=float(
+        os.environ.get('LLM_BACKGROUND_QUEUE_TIMEOUT_SECONDS', 5)),
+    max_queue=int(os.environ.get('LLM_MAX_QUEUE', 64)))
+
+# LLM_REQUESTS_PER_SECOND=0 paces nothing until the provider returns 429.
+rate_limiter = RateLimiter(
+    rate=float(os.environ.get('LLM_REQUESTS_PER_SECOND', 0)),
+    burst=int(os.environ.get('LLM_RATE_BURST', LLM_MAX_CONCURRENCY)),
+    recovery=float(os.environ.get('LLM_RATE_RECOVERY_SECONDS', 30)))
+
+
+# Longest wait for the next byte from the API, per endpoint, so a stuck call
+# fails instead of holding a worker thread. For a streamed completion it
+# bounds the gap between chunks. Override one with LLM_READ_TIMEOUT_<ENDPOINT>,
+# e.g. LLM_READ_TIMEOUT_ELI5=20.
+READ_TIMEOUTS = {
+    endpoint: float(
+        os.environ.get(f'LLM_READ_TIMEOUT_{endpoint.upper()}', seconds))
+    for endpoint, seconds in {
+        'eli5': 30,
+        'section_quiz': 60,
+        'interview_quiz_chunk': 60,
+        'content_outline': 60,
+        'content_stream': 60,
+        'section_content': 90,
+        'interview_quiz': 120,
+        'content': 150
+    }.items()
+}
+
+# Short calls listed in LLM_HEDGE_ENDPOINTS (e.g. "eli5") get a duplicate
+# request when they run past the endpoint's recent p95 latency.
+hedger = Hedger(
+    endpoints=[
+        endpoint.strip()
+        for endpoint in os.environ.get('LLM_HEDGE_ENDPOINTS', '').split(',')
+        if endpoint.strip()
+    ],
+    percentile=float(os.environ.get('LLM_HEDGE_PERCENTILE', 0.95)),
+    min_samples=int(os.environ.get('LLM_HEDGE_MIN_SAMPLES', 20)),
+    max_workers=LLM_MAX_CONCURRENCY)
+
+
+def _budget(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return float(value) if value.strip() else None
+
+
+# Model per route: a primary, a fallback tried once when the primary times
+# out, fails or returns nothing usable, a p95 latency budget in seconds and
+# a cost budget in USD per upstream call. The primary is demoted to the
+# fallback while it misses a budget or validates poorly (see routing.py).
+# Override with LLM_MODEL_<ROUTE>, LLM_FALLBACK_MODEL_<ROUTE> ('' for
+# none), LLM_LATENCY_BUDGET_<ROUTE> and LLM_COST_BUDGET_<ROUTE> ('' for no
+# budget), e.g. LLM_MODEL_ELI5=gpt-5.
+ROUTES = {
+    name: Route(
+        os.environ.get(f'LLM_MODEL_{name.upper()}', primary),
+        os.environ.get(f'LLM_FALLBACK_MODEL_{name.upper()}', fallback)
+        or None,
+        _budget(f'LLM_LATENCY_BUDGET_{name.upper()}', latency_budget),
+        _budget(f'LLM_COST_BUDGET_{name.upper()}', cost_budget))
+    for name, (primary, fallback, latency_budget, cost_budget) in {
+        # Short answers and 3-question quizzes: a small model is good
+        # enough and several times faster.
+        'eli5': ('gpt-5-mini', 'gpt-5', 15, None),
+        'section_quiz': ('gpt-5-mini', 'gpt-5', 30, None),
+        'interview_quiz': ('gpt-5', 'gpt-5-mini', 60, None),
+        'content': ('gpt-5', 'gpt-5-mini', 120, None)
+    }.items()
+}
+ENDPOINT_ROUTES = {
+    'eli5': 'eli5',
+    'section_quiz': 'section_quiz',
+    'interview_quiz': 'interview_quiz',
+    'interview_quiz_chunk': 'interview_quiz',
+    'content': 'content',
+    'content_outline': 'content',
+    'content_stream': 'content',
+    'section_content': 'content'
+}
+# USD per million (input, output) tokens, for the cost budgets. Add or
+# override models with LLM_MODEL_PRICES='{"model": [input, output]}'.
+MODEL_PRICES = {
+    'gpt-5': (1.25, 10.0),
+    'gpt-5-mini': (0.25, 2.0),
+    'gpt-5-nano': (0.05, 0.4),
+    **json.loads(os.environ.get('LLM_MODEL_PRICES', '{}'))
+}
+
+router = ModelRouter(
+    ROUTES,
+    ENDPOINT_ROUTES,
+    MODEL_PRICES,
+    default=Route(os.environ.get('LLM_DEFAULT_MODEL', 'gpt-5')),
+    window=int(os.environ.get('LLM_ROUTE_WINDOW', 100)),
+    min_samples=int(os.environ.get('LLM_ROUTE_MIN_SAMPLES', 20)),
+    min_success=float(os.environ.get('LLM_ROUTE_MIN_SUCCESS', 0.9)),
+    probe_every=int(os.environ.get('LLM_ROUTE_PROBE_EVERY', 20)))
+
+
+def _acquire_slot(endpoint, model):
+    """Admits the call for the current caller and waits for its turn at
+    the rate limiter. Returns the session the slot is charged to.
+    """
+    session_id, priority = current_caller()
+    try:
+        admission.acquire(session_id, priority)
+    except LLMBusyError:
+        metrics.record_llm_call(endpoint, model, 'busy')
+        raise
+    try:
+        delay = rate_limiter.reserve(admission.timeouts[priority])
+    except LLMBusyError:
+        admission.release(session_id, 0)
+        metrics.record_llm_call(endpoint, model, 'busy')
+        raise
+    if delay:
+        time.sleep(delay)
+    return session_id
+
+
+def _try_slot():
+    """Takes a slot for a hedge only if one is free right now; returns
+    (True, session_id) or (False, None).
+    """
+    session_id, priority = current_caller()
+    if not admission.acquire(session_id, priority, wait=False):
+        return False, None
+    try:
+        rate_limiter.reserve(0)
+    except LLMBusyError:
+        admission.release(session_id, 0)
+        return False, None
+    return True, session_id
+
+
+def _provider_retry_after(error):
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        # An HTTP date; the default pause is used instead.
+        pass
+    return None
+
+
+def _failed(endpoint, model, error, started):
+    """Records a failed call. A provider 429 also slows the rate limiter
+    down and is returned as an LLMBusyError, so the client is told to retry
+    instead of getting a 500.
+    """
+    if getattr(error, 'status_code', None) != 429:
+        metrics.record_llm_call(endpoint, model, 'error',
+                                time.monotonic() - started)
+        return None
+    metrics.record_llm_call(endpoint, model, 'rate_limited',
+                            time.monotonic() - started)
+    retry_after = _provider_retry_after(error)
+    rate_limiter.provider_rejected(retry_after)
+    return LLMBusyError(
+        'The AI provider is rate limiting requests, please retry shortly',
+        max(1, math.ceil(retry_after or 1)))
+
+
+def _apply_budget(endpoint, kwargs):
+    # The max_completion_tokens a caller passes is the ceiling; the budget
+    # lowers it once enough completions for the endpoint have been seen.
+    if 'max_completion_tokens' in kwargs:
+        kwargs['max_completion_tokens'] = completion_budget.limit(
+            endpoint, kwargs['max_completion_tokens'])
+
+
+def _apply_timeout(endpoint, kwargs):
+    # Loaded by the time a call is made; see clients.py.
+    from openai import Timeout
+
+    kwargs.setdefault(
+        'timeout',
+        Timeout(READ_TIMEOUTS.get(endpoint, READ_TIMEOUT),
+                connect=CONNECT_TIMEOUT))
+
+
+def _observe_completion(endpoint, model, usage, finish_reason):
+    truncated = finish_reason == 'length'
+    if truncated:
+        metrics.inc('llm_truncated_total', {
+            'endpoint': endpoint,
+            'model': model
+        })
+    completion_budget.observe(endpoint, usage, truncated)
+
+
+def _complete(client, endpoint, model, kwargs, session_id):
+    # Runs on a slot taken by the caller and releases it.
+    started = time.monotonic()
+    try:
+        response = client.chat.completions.create(**kwargs)
+    except Exception as e:
+        busy = _failed(endpoint, model, e, started)
+        if busy is None:
+            raise
+        raise busy from e
+    finally:
+        admission.release(session_id, time.monotonic() - started)
+    elapsed = time.monotonic() - started
+    hedger.observe(endpoint, elapsed)
+    usage = getattr(response, 'usage', None)
+    metrics.record_llm_call(endpoint, model, 'ok', elapsed, usage)
+    router.observe_cost(endpoint, model, usage)
+    _observe_completion(
+        endpoint, model, usage,
+        response.choices[0].finish_reason if response.choices else None)
+    return response
+
+
+def _has_content(response):
+    return bool(response.choices and response.choices[0].message.content
+                and response.choices[0].message.content.strip())
+
+
+def _upstream_errors():
+    # Failures of the model or the API, as opposed to bugs here; only these
+    # count against a model and fall back. A provider 429 has become an
+    # LLMBusyError by then and is not retried. Loaded with the SDK by the
+    # time a call is made.
+    from openai import APIError
+
+    return (APIError, )
+
+
+def routed(endpoint, call, valid=bool):
+    """Runs call(model) with the model routed for endpoint, and once more
+    with the route's other model if the API call fails or valid(result)
+    is false.
+    """
+    return router.run(endpoint, call, valid, retry_on=_upstream_errors())
+
+
+def chat_completion(client, endpoint, **kwargs):
+    if 'model' not in kwargs:
+        return routed(
+            endpoint, lambda model: chat_completion(
+                client, endpoint, **dict(kwargs, model=model)), _has_content)
+    model = kwargs['model']
+    _apply_budget(endpoint, kwargs)
+    _apply_timeout(endpoint, kwargs)
+    session_id = _acquire_slot(endpoint, model)
+    if not hedger.enabled(endpoint):
+        return _complete(client, endpoint, model, kwargs, session_id)
+
+    def start_hedge():
+        admitted, hedge_session = _try_slot()
+        if not admitted:
+            return None
+        metrics.inc('llm_hedged_total', {'endpoint': endpoint})
+        return lambda: _complete(client, endpoint, model, kwargs,
+                                 hedge_session)
+
+    return hedger.run(
+        endpoint, lambda: _complete(client, endpoint, model, kwargs,
+                                    session_id), start_hedge)
+
+
+def stream_chat_completion(client, endpoint, **kwargs):
+    if 'model' not in kwargs:
+        return _routed_stream(client, endpoint, kwargs)
+    return _stream(client, endpoint, kwargs['model'], kwargs)
+
+
+def _routed_stream(client, endpoint, kwargs):
+    # A stream falls back to the route's other model only until its first
+    # token: after that, part of the reply may be on its way to the client.
+    upstream_errors = _upstream_errors()
+    models = router.models(endpoint)
+    for attempt, model in enumerate(models):
+        last = attempt == len(models) - 1
+        started = time.monotonic()
+        stream = _stream(client, endpoint, model, dict(kwargs, model=model))
+        head = []
+        try:
+            for chunk in stream:
+                head.append(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    break
+        except upstream_errors as e:
+            router.observe(endpoint, model, time.monotonic() - started,
+                           False)
+            if last:
+                raise
+            router.fell_back(endpoint, model, e)
+            continue
+        if head and head[-1].choices and head[-1].choices[0].delta.content:
+            break
+        # The stream ended without any content.
+        router.observe(endpoint, model, time.monotonic() - started, False)
+        if last:
+            yield from head
+            return
+        router.fell_back(endpoint, model)
+
+    yield from head
+    try:
+        yield from stream
+    except upstream_errors:
+        router.observe(endpoint, model, time.monotonic() - started, False)
+        raise
+    router.observe(endpoint, model, time.monotonic() - started, True)
+
+
+def _stream(client, endpoint, model, kwargs):
+    # The slot is held until the caller has consumed the whole stream.
+    _apply_budget(endpoint, kwargs)
+    _apply_timeout(endpoint, kwargs)
+    session_id = _acquire_slot(endpoint, model)
+    started = time.monotonic()
+    first_token = False
+    usage = None
+    finish_reason = None
+    try:
+        stream = client.chat.completions.create(
+            stream=True, stream_options={'include_usage': True}, **kwargs)
+        for chunk in stream:
+            if getattr(chunk, 'usage', None) is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].finish_reason:
+                finish_reason = chunk.choices[0].finish_reason
+            if (not first_token and chunk.choices
+                    and chunk.choices[0].delta.content):
+                first_token = True
+                metrics.record_time_to_first_token(endpoint, model,
+                                                   time.monotonic() - started)
+            yield chunk
+    except Exception as e:
+        busy = _failed(endpoint, model, e, started)
+        if busy is None:
+            raise
+        raise busy from e
+    else:
+        metrics.record_llm_call(endpoint, model, 'ok',
+                                time.monotonic() - started, usage)
+        router.observe_cost(endpoint, model, usage)
+        _observe_completion(endpoint, model, usage, finish_reason)
+    finally:
+        admission.release(session_id, time.monotonic() - started)
@@ -0,0 +1,313 @@
+"""Prometheus-format metrics shared across gunicorn workers.
+
+Each process keeps its own counters and histograms and periodically writes
+a snapshot to METRICS_DIR/metrics-<pid>-<token>.json, the token being
+drawn once per process so that a reused pid never overwrites another
+process's file. render() merges every snapshot in the directory, so
+whichever worker answers /metrics reports totals for the whole node.
+
+Snapshots are tagged with a run id, inherited by every process forked or
+started from the first one that imports this module (the gunicorn master
+imports it in on_starting). Snapshots of the current run are kept even
+after their worker exits, so totals survive worker restarts. Snapshots of
+other runs are only merged while their process is alive; otherwise they
+are deleted, at import and on every merge, so a previous `python app.py`
+or pregenerate run never leaks into /metrics. gunicorn.conf.py also
+clears the directory when the master starts.
+"""
+import atexit
+import glob
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'learning-app-metrics'))
+FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL_SECONDS', 1))
+RUN_ID = os.environ.setdefault('METRICS_RUN_ID', secrets.token_hex(8))
+
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+HEADER_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30,
+                60)
+
+# name -> (type, help, histogram buckets)
+DEFINITIONS = {
+    'llm_requests_total':
+    ('counter', 'Upstream chat completion calls by outcome.', None),
+    'llm_request_duration_seconds':
+    ('histogram', 'Wall time of upstream chat completion calls.',
+     LLM_BUCKETS),
+    'llm_time_to_first_token_seconds':
+    ('histogram', 'Time until the first streamed token arrived.',
+     LLM_BUCKETS),
+    'llm_admission_total':
+    ('counter', 'Upstream calls admitted or shed by admission control.',
+     None),
+    'llm_admission_wait_seconds':
+    ('histogram', 'Time calls waited for an admission slot.', HTTP_BUCKETS),
+    'llm_hedged_total':
+    ('counter', 'Duplicate requests issued for slow hedged calls.', None),
+    'llm_route_decisions_total':
+    ('counter', 'Model picked per route: primary, demoted (fallback used '
+     'instead) or probe (primary retried while demoted).', None),
+    'llm_route_fallbacks_total':
+    ('counter', 'Calls retried on the fallback model, by the failed model '
+     'and why (timeout, error, invalid).', None),
+    'llm_tokens_total':
+    ('counter', 'Prompt and completion tokens reported by the API.', None),
+    'llm_truncated_total':
+    ('counter', 'Completions cut off by max_completion_tokens.', None),
+    'llm_prompt_input_tokens_total':
+    ('counter',
+     'Estimated prompt input tokens before (raw) and after (sent) compaction.',
+     None),
+    'llm_structured_outputs_total':
+    ('counter', 'Schema-constrained completions by result '
+     '(valid, repaired, retried, failed).', None),
+    'llm_structured_retries_total':
+    ('counter', 'Follow-up requests for invalid or missing items.', None),
+    'llm_parse_failures_total':
+    ('counter', 'Model responses that could not be parsed or validated.',
+     None),
+    'quiz_submissions_total':
+    ('counter', 'Graded quiz submissions by kind (section, interview).',
+     None),
+    'http_request_header_bytes':
+    ('histogram', 'Size of the request headers, including cookies.',
+     HEADER_BUCKETS),
+    'http_response_bytes_total':
+    ('counter', 'Response body bytes before (raw) and after (sent) '
+     'compression.', None),
+    'http_request_duration_seconds':
+    ('histogram', 'Flask request handling time (until headers are sent).',
+     HTTP_BUCKETS),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_last_flush = 0.0
+_flush_scheduled = False
+_token = (None, None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, labels, value=1):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _maybe_flush()
+
+
+def observe(name, labels, value):
+    buckets = DEFINITIONS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(buckets), 0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[0][i] += 1
+                break
+        histogram[1] += value
+        histogram[2] += 1
+    _maybe_flush()
+
+
+def record_llm_call(endpoint, model, outcome, duration=None, usage=None):
+    labels = {'endpoint': endpoint, 'model': model}
+    inc('llm_requests_total', dict(labels, outcome=outcome))
+    if duration is not None:
+        observe('llm_request_duration_seconds', labels, duration)
+    if usage is not None:
+        inc('llm_tokens_total', dict(labels, kind='prompt'),
+            getattr(usage, 'prompt_tokens', 0) or 0)
+        inc('llm_tokens_total', dict(labels, kind='completion'),
+            getattr(usage, 'completion_tokens', 0) or 0)
+
+
+def record_time_to_first_token(endpoint, model, duration):
+    observe('llm_time_to_first_token_seconds', {
+        'endpoint': endpoint,
+        'model': model
+    }, duration)
+
+
+def record_parse_failure(endpoint, reason):
+    inc('llm_parse_failures_total', {'endpoint': endpoint, 'reason': reason})
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'run': RUN_ID,
+            'pid': os.getpid(),
+            'counters': [[name, list(labels), value]
+                         for (name, labels), value in _counters.items()],
+            'histograms':
+            [[name, list(labels), counts[:], total, count]
+             for (name, labels), (counts, total, count) in _histograms.items()]
+        }
+
+
+def _path():
+    # Drawn again after a fork, so every worker gets its own file.
+    global _token
+    pid = os.getpid()
+    if _token[0] != pid:
+        _token = (pid, secrets.token_hex(4))
+    return os.path.join(METRICS_DIR, f'metrics-{pid}-{_token[1]}.json')
+
+
+def flush():
+    global _last_flush, _flush_scheduled
+    _last_flush = time.monotonic()
+    _flush_scheduled = False
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = _path()
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(_snapshot(), f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def _maybe_flush():
+    # Writes at most once per interval; a trailing flush makes sure the last
+    # updates before a quiet period still reach the snapshot file.
+    global _flush_scheduled
+    elapsed = time.monotonic() - _last_flush
+    if elapsed >= FLUSH_INTERVAL:
+        flush()
+    elif not _flush_scheduled:
+        _flush_scheduled = True
+        timer = threading.Timer(FLUSH_INTERVAL - elapsed, flush)
+        timer.daemon = True
+        timer.start()
+
+
+def clear_directory():
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists, but owned by another user.
+        return True
+    return True
+
+
+def _stale(snapshot):
+    if snapshot.get('run') == RUN_ID:
+        return False
+    pid = snapshot.get('pid')
+    # A file of another run under our own pid was left by a dead process
+    # whose pid we were given.
+    return not isinstance(pid, int) or pid == os.getpid() or not _alive(pid)
+
+
+def _snapshots():
+    """Yields every live snapshot, deleting those of finished runs."""
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if _stale(snapshot):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        yield snapshot
+
+
+def _merged():
+    counters = {}
+    histograms = {}
+    for snapshot in _snapshots():
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total, count in snapshot['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(
+                key, [[0] * len(counts), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+            merged[2] += count
+    return counters, histograms
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"'
+                          for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    flush()
+    counters, histograms = _merged()
+    lines = []
+    for name, (kind, help_text, buckets) in DEFINITIONS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} '
+                                 f'{_format_value(value)}')
+            continue
+        for (metric, labels), (counts, total,
+                               count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket'
+                             f'{_format_labels(labels, [("le", bound)])} '
+                             f'{cumulative}')
+            lines.append(f'{name}_bucket'
+                         f'{_format_labels(labels, [("le", "+Inf")])} '
+                         f'{count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} '
+                         f'{_format_value(total)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def remove_stale():
+    for _ in _snapshots():
+        pass
+
+
+remove_stale()
+atexit.register(flush)
@@ -0,0 +1,174 @@
+"""Prompt preparation shared by the routes that call the model.
+
+Section bodies are stored as HTML for the browser; html_to_text() turns
+them into the compact plain text that goes into prompts, and fit() trims
+text to a token budget at a sentence or word boundary. CompletionBudget
+sizes max_completion_tokens per endpoint from the completion lengths
+actually observed, instead of one fixed ceiling for everything.
+
+Token counts are estimated at about four characters per token, which is
+close enough for budgeting and for comparing prompt sizes.
+"""
+import html
+import math
+import os
+import re
+import threading
+from collections import deque
+
+import metrics
+
+CHARS_PER_TOKEN = 4
+
+_BREAK_TAGS = re.compile(r'<\s*(?:br|/p|/div|/h[1-6]|/ul|/ol|/tr)\s*/?>', re.I)
+_LIST_ITEM = re.compile(r'<\s*li[^>]*>', re.I)
+_TAG = re.compile(r'<[^>]+>')
+_SPACES = re.compile(r'[ \t\r\f\v]+')
+_BLANK_LINES = re.compile(r'\s*\n\s*')
+_SENTENCE_END = re.compile(r'[.!?](?=\s)')
+
+_savings_lock = threading.Lock()
+_savings = {}
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def html_to_text(content):
+    """Strips markup but keeps paragraph and list structure as newlines."""
+    if not content:
+        return ''
+    text = _BREAK_TAGS.sub('\n', content)
+    text = _LIST_ITEM.sub('\n- ', text)
+    text = html.unescape(_TAG.sub('', text))
+    text = _SPACES.sub(' ', text)
+    return _BLANK_LINES.sub('\n', text).strip()
+
+
+def compact_whitespace(text):
+    return _BLANK_LINES.sub('\n', _SPACES.sub(' ', text or '')).strip()
+
+
+def fit(text, max_tokens):
+    """Returns text cut to roughly max_tokens, ending on a sentence (or at
+    least a word) boundary when one is reasonably close to the limit.
+    """
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    sentence_ends = [m.end() for m in _SENTENCE_END.finditer(cut)]
+    if sentence_ends and sentence_ends[-1] > limit // 2:
+        return cut[:sentence_ends[-1]]
+    space = cut.rfind(' ')
+    return cut[:space] if space > limit // 2 else cut
+
+
+def record_prompt(endpoint, raw_text, sent_text):
+    """Counts the estimated input tokens a prompt would have had without
+    compaction against what was actually sent.
+    """
+    raw = estimate_tokens(raw_text)
+    sent = estimate_tokens(sent_text)
+    metrics.inc('llm_prompt_input_tokens_total', {
+        'endpoint': endpoint,
+        'kind': 'raw'
+    }, raw)
+    metrics.inc('llm_prompt_input_tokens_total', {
+        'endpoint': endpoint,
+        'kind': 'sent'
+    }, sent)
+    with _savings_lock:
+        totals = _savings.setdefault(endpoint, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += raw
+        totals[2] += sent
+
+
+def savings():
+    with _savings_lock:
+        return {
+            endpoint: {
+                'calls': calls,
+                'raw_tokens': raw,
+                'sent_tokens': sent,
+                'saved_ratio': (raw - sent) / raw if raw else 0.0
+            }
+            for endpoint, (calls, raw, sent) in _savings.items()
+        }
+
+
+class CompletionBudget:
+    """Picks max_completion_tokens per endpoint from observed usage.
+
+    Until min_samples completions have been seen the endpoint's ceiling is
+    used. After that the limit is the chosen percentile of recent
+    completion lengths times headroom, clamped to [floor, ceiling]. A
+    completion cut off by the limit is recorded at the ceiling, so
+    truncations push the budget back up.
+    """
+
+    def __init__(self,
+                 window=200,
+                 min_samples=20,
+                 percentile=0.95,
+                 headroom=1.5,
+                 floor=256):
+        self.window = window
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.headroom = headroom
+        self.floor = floor
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._ceilings = {}
+        self._truncated = {}
+
+    def limit(self, endpoint, ceiling):
+        with self._lock:
+            self._ceilings[endpoint] = ceiling
+            samples = self._samples.get(endpoint)
+            if not samples or len(samples) < self.min_samples:
+                return ceiling
+            ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        wanted = math.ceil(ordered[index] * self.headroom)
+        return max(min(self.floor, ceiling), min(wanted, ceiling))
+
+    def observe(self, endpoint, usage, truncated=False):
+        completion_tokens = getattr(usage, 'completion_tokens', None)
+        with self._lock:
+            if truncated:
+                self._truncated[endpoint] = self._truncated.get(endpoint,
+                                                                0) + 1
+                completion_tokens = self._ceilings.get(endpoint,
+                                                       completion_tokens)
+            if not completion_tokens:
+                return
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+            samples.append(completion_tokens)
+
+    def stats(self):
+        with self._lock:
+            endpoints = set(self._ceilings) | set(self._samples)
+        return {
+            endpoint: {
+                'samples': len(self._samples.get(endpoint, ())),
+                'truncated': self._truncated.get(endpoint, 0),
+                'max_completion_tokens':
+                self.limit(endpoint, self._ceilings[endpoint])
+                if endpoint in self._ceilings else None
+            }
+            for endpoint in sorted(endpoints)
+        }
+
+
+completion_budget = CompletionBudget(
+    window=int(os.environ.get('COMPLETION_BUDGET_WINDOW', 200)),
+    min_samples=int(os.environ.get('COMPLETION_BUDGET_MIN_SAMPLES', 20)),
+    percentile=float(os.environ.get('COMPLETION_BUDGET_PERCENTILE', 0.95)),
+    headroom=float(os.environ.get('COMPLETION_BUDGET_HEADROOM', 1.5)),
+    floor=int(os.environ.get('COMPLETION_BUDGET_FLOOR', 256)))
@@ -0,0 +1,216 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from admission import LLMBusyError
+
+POLL_INTERVAL = 0.25
+BUSY_RETRY_AFTER = 5
+
+
+class QuizPipeline:
+    """Generates and deduplicates the quizzes for a plan's sections.
+
+    start() fans the sections out over a small thread pool as soon as a plan
+    is stored. Each finished quiz is written to the shared quiz store under
+    the same key /submit-quiz grades against, and a short-lived "pending"
+    marker lets any worker that receives /generate-quiz wait for the job
+    instead of issuing its own upstream call. get_or_generate() serves a
+    section on demand; concurrent requests for the same section attach to
+    the one generation already in flight.
+    """
+
+    def __init__(self,
+                 generate,
+                 store,
+                 key_for,
+                 is_current,
+                 max_workers=4,
+                 job_timeout=180):
+        self.generate = generate
+        self.store = store
+        self.key_for = key_for
+        self.is_current = is_current
+        self.max_workers = max_workers
+        self.job_timeout = job_timeout
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self.started = 0
+        self.generated = 0
+        self.failed = 0
+        self.served = 0
+        self.coalesced = 0
+
+    def _pool(self):
+        # Executor threads do not survive a fork, so each gunicorn worker
+        # builds its own pool on first use.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='quiz-pipeline')
+                self._executor_pid = os.getpid()
+                self._jobs = {}
+            return self._executor
+
+    def _mark_pending(self, session_id, plan_id, index):
+        self.store.set(self.key_for(session_id, index) + '_pending',
+                       {'plan_id': plan_id},
+                       ttl=self.job_timeout,
+                       owner=session_id)
+
+    def start(self, session_id, plan_id, topic, sections):
+        for index, section in enumerate(sections):
+            self.start_section(session_id, plan_id, index, topic, section)
+
+    def start_section(self, session_id, plan_id, index, topic, section):
+        pool = self._pool()
+        self.store.delete(self.key_for(session_id, index))
+        self._mark_pending(session_id, plan_id, index)
+        # Jobs run in the caller's context, so their model calls are
+        # admitted against its session and priority.
+        future = pool.submit(contextvars.copy_context().run, self._run,
+                             session_id, plan_id, index, topic, section)
+        with self._lock:
+            self._jobs[(session_id, index)] = future
+            self.started += 1
+        future.add_done_callback(
+            lambda f, job=(session_id, index): self._forget(job, f))
+
+    def _forget(self, job, future):
+        with self._lock:
+            if self._jobs.get(job) is future:
+                del self._jobs[job]
+
+    def _run(self, session_id, plan_id, index, topic, section):
+        key = self.key_for(session_id, index)
+        try:
+            quiz = self.generate(topic, section)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            marker = self.store.get(key + '_pending')
+            if marker and marker.get('plan_id') == plan_id:
+                self.store.delete(key + '_pending')
+
+        with self._lock:
+            if quiz:
+                self.generated += 1
+            else:
+                self.failed += 1
+        if quiz and self.is_current(session_id, plan_id):
+            self.store.set(key, quiz, owner=session_id)
+        return quiz
+
+    def get_or_generate(self, session_id, plan_id, index, topic, section,
+                        timeout):
+        """Returns the quiz for a section, generating it in the calling
+        thread only when no stored quiz or in-flight generation exists.
+        A caller attached to a generation that fails (e.g. a background
+        preload shed by admission control) generates the quiz itself, at
+        its own priority, instead of inheriting the failure. Raises
+        LLMBusyError if the quiz is still being generated after timeout.
+        """
+        deadline = time.monotonic() + timeout
+        quiz = self.wait(session_id, index, timeout)
+        if quiz:
+            return quiz
+
+        job = (session_id, index)
+        while True:
+            with self._lock:
+                future = self._jobs.get(job)
+                if future is not None and future.done() and (
+                        future.cancelled() or future.exception() is not None):
+                    # A failed pipeline job until its done callback runs.
+                    del self._jobs[job]
+                    future = None
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self._jobs[job] = future
+            if leader:
+                break
+            try:
+                quiz = future.result(
+                    timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                raise LLMBusyError(
+                    'The quiz is still being generated, please retry in '
+                    f'{BUSY_RETRY_AFTER}s', BUSY_RETRY_AFTER)
+            except Exception:
+                # The leader failed, perhaps shed at a lower priority than
+                # this caller's; take over.
+                continue
+            with self._lock:
+                self.coalesced += 1
+            return quiz
+
+        self._mark_pending(session_id, plan_id, index)
+        # The job is forgotten before its outcome is set, so a caller woken
+        # by a failure does not find it again.
+        try:
+            quiz = self._run(session_id, plan_id, index, topic, section)
+        except BaseException as e:
+            self._forget(job, future)
+            future.set_exception(e)
+            raise
+        self._forget(job, future)
+        future.set_result(quiz)
+        return quiz
+
+    def wait(self, session_id, index, timeout):
+        """Returns the stored quiz for a section, waiting if it is still
+        being generated here or in another worker, or None if there is none.
+        """
+        key = self.key_for(session_id, index)
+        quiz = self.store.get(key)
+        if quiz:
+            with self._lock:
+                self.served += 1
+            return quiz
+
+        with self._lock:
+            future = self._jobs.get((session_id, index))
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except FutureTimeoutError:
+                return None
+            except Exception:
+                # A failed background job is retried on demand by the caller.
+                return None
+            quiz = self.store.get(key)
+        else:
+            deadline = time.monotonic() + timeout
+            while (key + '_pending' in self.store
+                   and time.monotonic() < deadline):
+                time.sleep(POLL_INTERVAL)
+                quiz = self.store.get(key)
+                if quiz:
+                    break
+            else:
+                quiz = self.store.get(key)
+
+        if quiz:
+            with self._lock:
+                self.coalesced += 1
+        return quiz
+
+    def stats(self):
+        with self._lock:
+            return {
+                'started': self.started,
+                'generated': self.generated,
+                'failed': self.failed,
+                'in_progress': len(self._jobs),
+                'served': self.served,
+                'upstream_calls_saved': self.coalesced
+            }
@@ -0,0 +1,352 @@
+"""Append-only ledger of graded quiz submissions, with running aggregates.
+
+Every submission is appended to a local log file as one JSON line (see
+grading.grade() for the record). The file is opened with O_APPEND and each
+record goes out in a single write, so gunicorn workers can share it
+without a lock.
+
+Each worker keeps aggregates (per topic, per section, per question
+category and per question) and folds in only the records appended since
+it last looked, whoever wrote them, so stats() costs the same however long
+the history is. Aggregates are checkpointed to `<log>.snapshot` together
+with the log offset they cover, so a restarted worker reads the snapshot
+and the records after it instead of the whole log. Per-question, per-topic
+and per-section tallies are capped at max_entries each; the least recently
+answered are dropped first. The most submitted topics and sections and the
+most missed questions are kept ranked as records are folded in, so a
+summary never sorts a whole table.
+"""
+import bisect
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import grading
+
+SNAPSHOT_VERSION = 1
+
+
+def _tally():
+    # [submissions, questions answered, answered correctly]
+    return [0, 0, 0]
+
+
+def _add(tally, questions, correct):
+    tally[0] += 1
+    tally[1] += questions
+    tally[2] += correct
+
+
+def _describe(tally):
+    submissions, questions, correct = tally
+    return {
+        'submissions': submissions,
+        'questions': questions,
+        'correct': correct,
+        'accuracy': correct / questions if questions else 0.0
+    }
+
+
+class _Table:
+    """Tallies by key, dropping the least recently updated past a cap."""
+
+    def __init__(self, max_entries, entries=(), on_drop=None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict(entries)
+        self.on_drop = on_drop
+        self.dropped = 0
+
+    def get(self, key, default):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = default()
+            while len(self.entries) > self.max_entries:
+                dropped, _ = self.entries.popitem(last=False)
+                self.dropped += 1
+                if self.on_drop:
+                    self.on_drop(dropped)
+        else:
+            self.entries.move_to_end(key)
+        return entry
+
+
+class _Ranking:
+    """Keys kept in order of a sort key that is updated as their tallies
+    change, so the first few are read without sorting.
+    """
+
+    def __init__(self):
+        self._order = []
+        self._keys = {}
+
+    def update(self, key, sort_key):
+        self.remove(key)
+        self._keys[key] = sort_key
+        bisect.insort(self._order, (sort_key, key))
+
+    def remove(self, key):
+        sort_key = self._keys.pop(key, None)
+        if sort_key is not None:
+            del self._order[bisect.bisect_left(self._order, (sort_key, key))]
+
+    def top(self, count):
+        return [key for _, key in self._order[:count]]
+
+
+class ResultsLedger:
+
+    def __init__(self,
+                 path,
+                 max_entries=10000,
+                 snapshot_every=500,
+                 top=20,
+                 min_attempts=5):
+        self.path = path
+        self.max_entries = max_entries
+        self.snapshot_every = snapshot_every
+        self.top = top
+        self.min_attempts = min_attempts
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.write_errors = 0
+        self.skipped = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._reset()
+        self._load_snapshot()
+
+    def _reset(self):
+        self._offset = 0
+        self._applied = 0
+        self._since_snapshot = 0
+        self._overall = _tally()
+        self._kinds = {}
+        self._categories = {}
+        self._topics = self._table()
+        self._sections = self._table()
+        self._questions = self._table()
+        self._stats = None
+
+    def _table(self, entries=()):
+        ranking = _Ranking()
+        table = _Table(self.max_entries, entries, on_drop=ranking.remove)
+        table.ranking = ranking
+        return table
+
+    def _rank_tally(self, table, key, tally):
+        # Most submitted first.
+        table.ranking.update(key, -tally[0])
+
+    def _rank_question(self, question_id, question):
+        # Highest miss rate first, among questions answered often enough.
+        attempts, misses = question[0], question[1]
+        if attempts >= self.min_attempts:
+            self._questions.ranking.update(
+                question_id, (-misses / attempts, -attempts))
+
+    def _load_snapshot(self):
+        try:
+            with open(self.path + '.snapshot', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        # A log that is shorter than the snapshot was replaced; start over.
+        if snapshot.get('version') != SNAPSHOT_VERSION or snapshot[
+                'offset'] > size:
+            return
+        self._offset = snapshot['offset']
+        self._applied = snapshot['applied']
+        self._overall = snapshot['overall']
+        self._kinds = snapshot['kinds']
+        self._categories = snapshot['categories']
+        self._topics = self._table(snapshot['topics'])
+        self._sections = self._table([((topic, section), tally)
+                                      for topic, section, tally in
+                                      snapshot['sections']])
+        self._questions = self._table(snapshot['questions'])
+        for table in (self._topics, self._sections):
+            for key, tally in table.entries.items():
+                self._rank_tally(table, key, tally)
+        for question_id, question in self._questions.entries.items():
+            self._rank_question(question_id, question)
+
+    def _write_snapshot(self):
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'offset': self._offset,
+            'applied': self._applied,
+            'overall': self._overall,
+            'kinds': self._kinds,
+            'categories': self._categories,
+            'topics': list(self._topics.entries.items()),
+            'sections': [[topic, section, tally] for (topic, section), tally
+                         in self._sections.entries.items()],
+            'questions': list(self._questions.entries.items())
+        }
+        tmp = f'{self.path}.snapshot.{os.getpid()}'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(tmp, self.path + '.snapshot')
+        self._since_snapshot = 0
+
+    def record(self, record):
+        """Appends a submission to the log. A failed write is counted and
+        otherwise ignored; grading does not depend on it.
+        """
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                         0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        except OSError:
+            with self._lock:
+                self.write_errors += 1
+            return
+        with self._lock:
+            self.recorded += 1
+
+    def _apply(self, record):
+        # Everything is read before anything is counted, so a malformed
+        # record is skipped whole.
+        marks = record['marks']
+        kind = record['kind']
+        ids = record['ids']
+        categories = record['categories']
+        if len(ids) != len(marks):
+            raise ValueError('ids and marks differ in length')
+        if not isinstance(record.get('topic') or '', str) or not isinstance(
+                record.get('section') or '', str):
+            raise ValueError('topic and section must be strings')
+        correct = marks.count('1')
+        questions = len(marks)
+        _add(self._overall, questions, correct)
+        _add(self._kinds.setdefault(kind, _tally()), questions, correct)
+        topic = record.get('topic')
+        if topic:
+            tally = self._topics.get(topic, _tally)
+            _add(tally, questions, correct)
+            self._rank_tally(self._topics, topic, tally)
+            if record.get('section'):
+                key = (topic, record['section'])
+                tally = self._sections.get(key, _tally)
+                _add(tally, questions, correct)
+                self._rank_tally(self._sections, key, tally)
+
+        texts = record.get('questions') or []
+        for i, mark in enumerate(marks):
+            name = grading.CATEGORY_NAMES.get(categories[i:i + 1], 'general')
+            category = self._categories.setdefault(name, [0, 0])
+            category[0] += 1
+            category[1] += mark == '1'
+
+            # [attempts, misses, text, topic]
+            question = self._questions.get(ids[i],
+                                           lambda: [0, 0, None, None])
+            question[0] += 1
+            question[1] += mark != '1'
+            if question[2] is None and i < len(texts):
+                question[2] = texts[i]
+                question[3] = topic
+            self._rank_question(ids[i], question)
+        self._applied += 1
+        self._since_snapshot += 1
+
+    def _catch_up(self):
+        # Folds in the complete records appended since the last call.
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size < self._offset:
+            self._reset()
+        if size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError, IndexError, TypeError):
+                self.skipped += 1
+        self._offset += end
+        self._stats = None
+        if self._since_snapshot >= self.snapshot_every:
+            try:
+                self._write_snapshot()
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            self._catch_up()
+            if self._stats is None:
+                self._stats = self._summarize()
+            return dict(self._stats,
+                        recorded=self.recorded,
+                        write_errors=self.write_errors,
+                        skipped=self.skipped)
+
+    def _summarize(self):
+        # Recomputed only when new records were folded in, from the top
+        # entries of each ranking: most submitted topics and sections, and
+        # the questions with the highest miss rate among those answered at
+        # least min_attempts times.
+        topics = [(topic, self._topics.entries[topic])
+                  for topic in self._topics.ranking.top(self.top)]
+        sections = [(key, self._sections.entries[key])
+                    for key in self._sections.ranking.top(self.top)]
+        questions = []
+        for question_id in self._questions.ranking.top(self.top):
+            attempts, misses, text, topic = self._questions.entries[
+                question_id]
+            questions.append((misses / attempts, attempts, question_id,
+                              misses, text, topic))
+        return {
+            'submissions': self._applied,
+            'overall': _describe(self._overall),
+            'kinds': {kind: _describe(tally)
+                      for kind, tally in self._kinds.items()},
+            'categories': {
+                name: {
+                    'questions': answered,
+                    'correct': correct,
+                    'accuracy': correct / answered if answered else 0.0
+                }
+                for name, (answered, correct) in self._categories.items()
+            },
+            'topics': [
+                dict(_describe(tally), topic=topic) for topic, tally in topics
+            ],
+            'sections': [
+                dict(_describe(tally), topic=topic, section=section)
+                for (topic, section), tally in sections
+            ],
+            'most_missed_questions': [{
+                'id': question_id,
+                'question': text,
+                'topic': topic,
+                'attempts': attempts,
+                'misses': misses,
+                'miss_rate': miss_rate
+            } for miss_rate, attempts, question_id, misses, text, topic in
+                                      questions],
+            'tracked': {
+                'topics': len(self._topics.entries),
+                'sections': len(self._sections.entries),
+                'questions': len(self._questions.entries),
+                'dropped': self._topics.dropped + self._sections.dropped +
+                self._questions.dropped
+            },
+            'log_bytes': self._offset
+        }
@@ -0,0 +1,257 @@
+import math
+import threading
+import time
+from collections import deque
+
+import metrics
+
+
+class Route:
+    """Models for one kind of call: the primary, the fallback tried when
+    the primary fails, and the budgets the primary has to stay within
+    (latency_budget: p95 seconds per attempt, cost_budget: mean USD per
+    upstream call; None for no budget).
+    """
+
+    def __init__(self,
+                 primary,
+                 fallback=None,
+                 latency_budget=None,
+                 cost_budget=None):
+        self.primary = primary
+        self.fallback = fallback if fallback != primary else None
+        self.latency_budget = latency_budget
+        self.cost_budget = cost_budget
+
+
+class _ModelStats:
+
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.costs = deque(maxlen=window)
+
+    def success_rate(self):
+        return (sum(self.outcomes) /
+                len(self.outcomes) if self.outcomes else None)
+
+    def p95(self):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1,
+                           math.ceil(0.95 * len(ordered)) - 1)]
+
+    def mean_cost(self):
+        return sum(self.costs) / len(self.costs) if self.costs else None
+
+
+class ModelRouter:
+    """Picks the model for each call from its route and recent results.
+
+    Endpoints map onto routes (several endpoints can share one). A call
+    goes to the route's primary model unless the primary has, over its
+    last window attempts (once it has min_samples), a validation success
+    rate under min_success or broken its latency or cost budget while the
+    fallback has not; then the fallback is used and every probe_every-th
+    call still goes to the primary, so it is promoted back once it
+    recovers. run() retries a call once on the other model when the
+    upstream call fails or its result is not valid; callers that cannot go through run() (e.g.
+    streams) use models(), observe() and fell_back() directly.
+    """
+
+    def __init__(self,
+                 routes,
+                 endpoints,
+                 prices=None,
+                 default=None,
+                 window=100,
+                 min_samples=20,
+                 min_success=0.9,
+                 probe_every=20):
+        self.routes = routes
+        self.endpoints = endpoints
+        self.prices = prices or {}
+        self.default = default
+        self.window = window
+        self.min_samples = min_samples
+        self.min_success = min_success
+        self.probe_every = probe_every
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._calls = {}
+        self.decisions = {}
+        self.fallbacks = {}
+
+    def _route(self, endpoint):
+        name = self.endpoints.get(endpoint, endpoint)
+        return name, self.routes.get(name, self.default)
+
+    def _model_stats(self, route_name, model):
+        stats = self._stats.get((route_name, model))
+        if stats is None:
+            stats = self._stats[(route_name, model)] = _ModelStats(
+                self.window)
+        return stats
+
+    def _problem(self, route_name, route, model):
+        # Why model is not fit to serve the route right now, or None.
+        stats = self._stats.get((route_name, model))
+        if stats is None:
+            return None
+        if len(stats.outcomes) >= self.min_samples:
+            if stats.success_rate() < self.min_success:
+                return 'invalid'
+            if (route.latency_budget is not None
+                    and stats.p95() > route.latency_budget):
+                return 'slow'
+        if (route.cost_budget is not None
+                and len(stats.costs) >= self.min_samples
+                and stats.mean_cost() > route.cost_budget):
+            return 'costly'
+        return None
+
+    def choose(self, endpoint):
+        """Returns the model the next call for endpoint should use."""
+        route_name, route = self._route(endpoint)
+        if route is None:
+            return None
+        with self._lock:
+            if route.fallback is None:
+                model, reason = route.primary, 'primary'
+            elif self._problem(route_name, route, route.primary) is None:
+                model, reason = route.primary, 'primary'
+            elif self._problem(route_name, route, route.fallback):
+                # Both are struggling; stay on the primary.
+                model, reason = route.primary, 'primary'
+            else:
+                calls = self._calls.get(route_name, 0) + 1
+                self._calls[route_name] = calls
+                if calls % self.probe_every == 0:
+                    model, reason = route.primary, 'probe'
+                else:
+                    model, reason = route.fallback, 'demoted'
+            key = (route_name, model, reason)
+            self.decisions[key] = self.decisions.get(key, 0) + 1
+        metrics.inc('llm_route_decisions_total', {
+            'route': route_name,
+            'model': model,
+            'reason': reason
+        })
+        return model
+
+    def observe(self, endpoint, model, seconds, ok):
+        route_name, route = self._route(endpoint)
+        if route is None:
+            return
+        with self._lock:
+            stats = self._model_stats(route_name, model)
+            stats.latencies.append(seconds)
+            stats.outcomes.append(1 if ok else 0)
+
+    def observe_cost(self, endpoint, model, usage):
+        """Records what one upstream call cost, from its token usage."""
+        price = self.prices.get(model)
+        route_name, route = self._route(endpoint)
+        if price is None or usage is None or route is None:
+            return
+        input_price, output_price = price
+        cost = ((getattr(usage, 'prompt_tokens', 0) or 0) * input_price +
+                (getattr(usage, 'completion_tokens', 0) or 0) *
+                output_price) / 1e6
+        with self._lock:
+            self._model_stats(route_name, model).costs.append(cost)
+
+    def models(self, endpoint):
+        """The model the next call for endpoint should use (see choose()),
+        followed by the route's other model, if any, to fall back to.
+        """
+        _, route = self._route(endpoint)
+        model = self.choose(endpoint)
+        if route is None:
+            return [model]
+        return [model] + [
+            other for other in (route.primary, route.fallback)
+            if other and other != model
+        ][:1]
+
+    def fell_back(self, endpoint, model, error=None):
+        """Records that a call on model is retried on the route's other
+        model, because it raised error or, with no error, was not valid.
+        """
+        if error is None:
+            reason = 'invalid'
+        elif 'Timeout' in type(error).__name__:
+            reason = 'timeout'
+        else:
+            reason = 'error'
+        route_name, _ = self._route(endpoint)
+        with self._lock:
+            key = (route_name, model, reason)
+            self.fallbacks[key] = self.fallbacks.get(key, 0) + 1
+        metrics.inc('llm_route_fallbacks_total', {
+            'route': route_name,
+            'model': model,
+            'reason': reason
+        })
+
+    def run(self, endpoint, call, valid=bool, retry_on=(Exception, )):
+        """Returns call(model) for the chosen model, or, when that raises
+        one of the retry_on exceptions (the model or its API failed) or
+        valid(result) is false, call(other model). Any other exception,
+        e.g. a bug before the request was sent or a shed call, is raised at
+        once and does not count against the model.
+        """
+        models = self.models(endpoint)
+        for attempt, model in enumerate(models):
+            last = attempt == len(models) - 1
+            started = time.monotonic()
+            try:
+                result = call(model)
+            except retry_on as e:
+                self.observe(endpoint, model, time.monotonic() - started,
+                             False)
+                if last:
+                    raise
+                self.fell_back(endpoint, model, e)
+                continue
+            ok = valid(result)
+            self.observe(endpoint, model, time.monotonic() - started, ok)
+            if ok or last:
+                return result
+            self.fell_back(endpoint, model)
+
+    def stats(self):
+        with self._lock:
+            routes = {}
+            for name, route in self.routes.items():
+                models = {}
+                for model in (route.primary, route.fallback):
+                    stats = self._stats.get((name, model))
+                    if model is None or stats is None:
+                        continue
+                    models[model] = {
+                        'attempts': len(stats.outcomes),
+                        'success_rate': stats.success_rate(),
+                        'p95_seconds': stats.p95(),
+                        'mean_cost_usd': stats.mean_cost(),
+                        'problem': self._problem(name, route, model)
+                    }
+                routes[name] = {
+                    'primary': route.primary,
+                    'fallback': route.fallback,
+                    'latency_budget_seconds': route.latency_budget,
+                    'cost_budget_usd': route.cost_budget,
+                    'models': models,
+                    'decisions': {
+                        f'{model}:{reason}': count
+                        for (route_name, model, reason), count in
+                        self.decisions.items() if route_name == name
+                    },
+                    'fallbacks': {
+                        f'{model}:{reason}': count
+                        for (route_name, model, reason), count in
+                        self.fallbacks.items() if route_name == name
+                    }
+                }
+            return routes
@@ -0,0 +1,86 @@
+import time
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, written=0.0):
+
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.written = written
+        self.modified = False
+
+
+class StoreSessionInterface(SessionInterface):
+    """Keeps session data in a store; the cookie only carries its key.
+
+    The key is the session's 'session_id' value (see get_session_id() in
+    app.py), so the same opaque id names the session and everything the
+    app stores for it. An id the store does not know is ignored and a new
+    one is issued, so clients cannot pick their own. Sessions are written
+    back when modified, and otherwise once refresh_after seconds (a tenth
+    of the store's TTL by default) have passed since the last write, so a
+    session in use does not expire; an idle one expires with the TTL.
+    """
+
+    def __init__(self, store, generate_id, refresh_after=None):
+        self.store = store
+        self.generate_id = generate_id
+        self.refresh_after = (store.ttl /
+                              10 if refresh_after is None else refresh_after)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(sid)
+            if data is not None:
+                # Stores may hand back their own copy; leave it as it is.
+                data = dict(data)
+                written = data.pop('_written', 0.0)
+                return ServerSession(data, sid=sid, written=written)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.sid:
+                self.store.delete(session.sid)
+            if session.modified:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        if not session.modified:
+            if session.sid and now - session.written >= self.refresh_after:
+                self.store.set(session.sid,
+                               dict(session, _written=now),
+                               owner=session.sid)
+            return
+
+        sid = session.get('session_id')
+        if not sid:
+            sid = session['session_id'] = self.generate_id()
+        if session.sid and session.sid != sid:
+            self.store.delete(session.sid)
+        self.store.set(sid, dict(session, _written=now), owner=sid)
+
+        response.vary.add('Cookie')
+        if session.sid == sid:
+            return
+        response.set_cookie(name,
+                            sid,
+                            expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app),
+                            domain=domain,
+                            path=path,
+                            secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
@@ -0,0 +1,157 @@
+import hashlib
+import math
+import re
+import threading
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+# Words that carry no subject matter in a question. Everything else is a
+# content term: two questions only share an answer if they have the same
+# content terms.
+STOPWORDS = frozenset('''
+a about again also an and any are as at be been being between but by can
+could define definition describe difference differences do does doing
+eli5 example examples explain explanation for from give how i in into is
+it its just kid like me mean meaning means mention my of on or please
+really say simple simply so some tell term terms than that the their them
+then there these they thing things this those to vs versus was way we
+what whats when where which who why will with would you your
+'''.split())
+
+
+def normalize(text):
+    return _NON_WORD.sub(' ', text.casefold()).strip()
+
+
+def _fold(word):
+    # Plural folding, enough to match "lists" with "list".
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def terms(text):
+    """The content terms of text, in order."""
+    return [
+        _fold(word) for word in normalize(text).split()
+        if word not in STOPWORDS
+    ]
+
+
+def shingles(text):
+    """Content terms and adjacent pairs of them, so that word order counts:
+    "recursion instead of iteration" differs from the reverse.
+    """
+    words = terms(text)
+    return sorted(
+        set(words) | {f'{a} {b}'
+                      for a, b in zip(words, words[1:])})
+
+
+def weighted_similarity(shingles, other, idf):
+    """Jaccard similarity with each shingle weighted by idf."""
+    shingles, other = set(shingles), set(other)
+    union = sum(idf(shingle) for shingle in shingles | other)
+    if not union:
+        return 0.0
+    return sum(idf(shingle) for shingle in shingles & other) / union
+
+
+def _idf(documents):
+    frequencies = {}
+    for document in documents:
+        for shingle in set(document):
+            frequencies[shingle] = frequencies.get(shingle, 0) + 1
+    total = len(documents)
+    return lambda shingle: math.log(
+        (total + 1) / (frequencies.get(shingle, 0) + 1)) + 1
+
+
+def _same_terms(shingles, other):
+    return ({shingle for shingle in shingles if ' ' not in shingle} ==
+            {shingle for shingle in other if ' ' not in shingle})
+
+
+class SimilarityCache:
+    """Answers near-duplicate questions from earlier explanations.
+
+    Questions are grouped in buckets (one per topic and section). Each
+    bucket keeps up to per_bucket questions, as word shingles, in
+    least-recently-used order. A cached answer is only reused for a
+    question with exactly the same content terms (STOPWORDS aside, plurals
+    folded) whose IDF-weighted similarity to the cached question, with the
+    bucket's questions as the corpus, reaches the threshold; so "a list and
+    a tuple" never answers "a list and a set". A question with no content
+    terms at all, like "what is this?", only matches a cached question with
+    the same normalized text. Buckets live in a store, so they are shared
+    and evicted like any other entry.
+    """
+
+    def __init__(self, store, threshold=0.9, per_bucket=20):
+        self.store = store
+        self.threshold = threshold
+        self.per_bucket = per_bucket
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def bucket_key(self, *parts):
+        raw = '\x1f'.join(str(part) for part in parts)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def lookup(self, bucket_key, question):
+        signature = shingles(question)
+        # Entries written before shingles were stored have none.
+        entries = [
+            entry for entry in self.store.get(bucket_key) or []
+            if 'shingles' in entry
+        ]
+        best, best_score = None, 0.0
+        if signature:
+            idf = _idf([entry['shingles'] for entry in entries] +
+                       [signature])
+            for i, entry in enumerate(entries):
+                if not _same_terms(signature, entry['shingles']):
+                    continue
+                score = weighted_similarity(signature, entry['shingles'], idf)
+                if score > best_score:
+                    best, best_score = i, score
+        else:
+            text = normalize(question)
+            for i, entry in enumerate(entries):
+                if (not entry['shingles'] and text and
+                        normalize(entry['question']) == text):
+                    best, best_score = i, 1.0
+
+        with self._lock:
+            if best is None or best_score < self.threshold:
+                self.misses += 1
+                return None, signature
+            self.hits += 1
+
+        entry = entries.pop(best)
+        entries.append(entry)
+        self.store.set(bucket_key, entries)
+        return entry['answer'], signature
+
+    def add(self, bucket_key, question, answer, signature=None):
+        entries = [
+            entry for entry in self.store.get(bucket_key) or []
+            if 'shingles' in entry
+        ]
+        entries.append({
+            'question': question,
+            'shingles': signature or shingles(question),
+            'answer': answer
+        })
+        self.store.set(bucket_key, entries[-self.per_bucket:])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'store': self.store.stats()
+            }
@@ -2,7 +2,6 @@ let learningContent = null;
 let currentSection = 0;
 let currentQuiz = null;
 let currentQuizSection = -1;
-let currentQuizId = null;
 let completedSections = [];
 
 function toggleMobileMenu() {
@@ -53,20 +52,23 @@ document.getElementById('topic-form').addEventListener('submit', async (e) => {
     showLoading(true);
     
     try {
-        const response = await fetch('/generate-content', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ topic, familiarity, time })
-        });
-        
-        if (!response.ok) {
-            throw new Error('Failed to generate content');
+        const streamed = await streamContent({ topic, familiarity, time });
+        if (!streamed) {
+            const response = await fetch('/generate-content', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ topic, familiarity, time })
+            });
+            
+            if (!response.ok) {
+                throw new Error('Failed to generate content');
+            }
+            
+            learningContent = await response.json();
+            showLearningScreen();
         }
-        
-        learningContent = await response.json();
-        showLearningScreen();
     } catch (error) {
         alert('Error generating content. Please try again.');
         console.error(error);
@@ -75,6 +77,103 @@ document.getElementById('topic-form').addEventListener('submit', async (e) => {
     }
 });
 
+// Reads a text/event-stream response and calls onEvent(event, data) for
+// every frame, with data already parsed from JSON.
+async function readServerEvents(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) {
+                    event = line.slice(7);
+                } else if (line.startsWith('data: ')) {
+                    data += line.slice(6);
+                }
+            });
+            onEvent(event, data ? JSON.parse(data) : {});
+        }
+    }
+}
+
+// Reads /generate-content-stream and renders the overview and each section
+// as soon as the server sends them. Returns false when nothing was received
+// so the caller can fall back to the blocking endpoint.
+async function streamContent(payload) {
+    const response = await fetch('/generate-content-stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(payload)
+    });
+    
+    if (!response.ok || !response.body) {
+        return false;
+    }
+    
+    let received = false;
+    
+    const ensureStarted = (overview) => {
+        if (received) {
+            return;
+        }
+        received = true;
+        learningContent = { overview: overview, sections: [], streaming: true };
+        showLearningScreen();
+        showLoading(false);
+    };
+    
+    await readServerEvents(response, (event, message) => {
+        if (event === 'overview') {
+            ensureStarted(message.overview);
+        } else if (event === 'section') {
+            ensureStarted('Welcome to your learning session!');
+            learningContent.sections[message.index] = message.section;
+            onSectionStreamed();
+        } else if (event === 'done') {
+            learningContent.streaming = false;
+            onSectionStreamed();
+            console.log(`First section after ${message.first_section_ms} ms, full plan after ${message.total_ms} ms`);
+        } else if (event === 'error') {
+            if (!received) {
+                throw new Error(message.error);
+            }
+            learningContent.streaming = false;
+            onSectionStreamed();
+            alert('Some sections could not be generated.');
+        }
+    });
+    
+    if (received && learningContent.streaming) {
+        learningContent.streaming = false;
+        onSectionStreamed();
+    }
+    return received;
+}
+
+function onSectionStreamed() {
+    document.getElementById('total-sections').textContent = learningContent.sections.length;
+    updateProgress();
+    if (document.getElementById('sections-list').style.display === 'block') {
+        showSections();
+    }
+}
+
 function showLoading(show) {
     document.getElementById('loading').classList.toggle('active', show);
 }
@@ -110,6 +209,18 @@ function showSections() {
         sectionEl.onclick = () => showSection(index);
         container.appendChild(sectionEl);
     });
+    
+    if (learningContent.streaming) {
+        const pendingEl = document.createElement('div');
+        pendingEl.className = 'section-item pending';
+        pendingEl.innerHTML = `
+            <div>
+                <strong>More sections are on the way...</strong>
+            </div>
+            <span class="status">⏳</span>
+        `;
+        container.appendChild(pendingEl);
+    }
 }
 
 function showSection(index) {
@@ -120,7 +231,10 @@ function showSection(index) {
     document.getElementById('section-detail').style.display = 'block';
     
     document.getElementById('section-title').textContent = section.title;
-    document.getElementById('section-content').innerHTML = section.content;
+    const hasContent = section.content !== null && section.content !== undefined;
+    document.getElementById('section-content').innerHTML = hasContent
+        ? section.content
+        : '<p class="section-loading">Writing this section...</p>';
     
     const pointsEl = document.getElementById('section-points');
     if (section.key_points && section.key_points.length > 0) {
@@ -142,9 +256,46 @@ function showSection(index) {
     
     currentQuiz = null;
     currentQuizSection = -1;
-    currentQuizId = null;
     
-    preloadQuiz(index);
+    if (hasContent) {
+        preloadQuiz(index);
+    } else {
+        loadSectionContent(index);
+    }
+}
+
+// Outline-only plans arrive without section bodies; each one is fetched
+// when the section is first opened while the server prefetches the next.
+async function loadSectionContent(index) {
+    const isShown = () => currentSection === index &&
+        document.getElementById('section-detail').style.display === 'block';
+    
+    try {
+        const response = await fetch('/section-content', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ section_index: index })
+        });
+        
+        if (!response.ok) {
+            throw new Error('Failed to load section content');
+        }
+        
+        const result = await response.json();
+        learningContent.sections[index].content = result.section.content;
+        if (isShown()) {
+            document.getElementById('section-content').innerHTML = result.section.content;
+            preloadQuiz(index);
+        }
+    } catch (error) {
+        if (isShown()) {
+            document.getElementById('section-content').innerHTML =
+                '<p class="section-loading">This section could not be loaded. Go back and open it again to retry.</p>';
+        }
+        console.error(error);
+    }
 }
 
 async function askELI5() {
@@ -185,24 +336,34 @@ async function askELI5() {
     }
 }
 
+function retryAfterMs(response, maxMs = 10000) {
+    if (response.status !== 429) {
+        return null;
+    }
+    const seconds = parseFloat(response.headers.get('Retry-After'));
+    if (isNaN(seconds) || seconds * 1000 > maxMs) {
+        return null;
+    }
+    return seconds * 1000;
+}
+
 async function preloadQuiz(sectionIndex) {
     try {
+        // Background requests yield to ones a user is waiting on and are
+        // the first to be turned away when the server is busy.
         const response = await fetch('/generate-quiz', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Request-Priority': 'background'
             },
-            body: JSON.stringify({ 
-                section_index: sectionIndex,
-                store_quiz: false
-            })
+            body: JSON.stringify({ section_index: sectionIndex })
         });
         
         if (response.ok) {
             const quiz = await response.json();
             if (currentSection === sectionIndex && currentQuiz === null) {
                 currentQuiz = quiz;
-                currentQuizId = quiz.quiz_id;
                 currentQuizSection = sectionIndex;
             }
         }
@@ -214,7 +375,6 @@ async function preloadQuiz(sectionIndex) {
 function backToSections() {
     currentQuiz = null;
     currentQuizSection = -1;
-    currentQuizId = null;
     document.getElementById('section-detail').style.display = 'none';
     document.getElementById('quiz-section').style.display = 'none';
     document.getElementById('results-section').style.display = 'none';
@@ -223,51 +383,38 @@ function backToSections() {
 }
 
 async function startQuiz() {
-    if (currentQuiz && currentQuizSection === currentSection && currentQuizId) {
-        showLoading(true);
-        try {
-            const response = await fetch('/activate-quiz', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ 
-                    quiz_id: currentQuizId,
-                    section_index: currentSection
-                })
-            });
-            
-            if (response.ok) {
-                displayQuiz();
-                showLoading(false);
-                return;
-            }
-        } catch (error) {
-            console.log('Failed to activate preloaded quiz, generating new one');
-        }
-        showLoading(false);
+    if (currentQuiz && currentQuizSection === currentSection) {
+        displayQuiz();
+        return;
     }
     
+    // If the preload is still in flight the server attaches this request to
+    // the same generation, so no second quiz is produced.
     showLoading(true);
     
     try {
-        const response = await fetch('/generate-quiz', {
+        const request = () => fetch('/generate-quiz', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ 
-                section_index: currentSection,
-                store_quiz: true
-            })
+            body: JSON.stringify({ section_index: currentSection })
         });
+        let response = await request();
+        
+        // A 429 means the server shed the request under load; try once more
+        // when it says capacity should be back.
+        const retryAfter = retryAfterMs(response);
+        if (retryAfter !== null) {
+            await new Promise(resolve => setTimeout(resolve, retryAfter));
+            response = await request();
+        }
         
         if (!response.ok) {
             throw new Error('Failed to generate quiz');
         }
         
         currentQuiz = await response.json();
-        currentQuizId = currentQuiz.quiz_id;
         currentQuizSection = currentSection;
         displayQuiz();
     } catch (error) {
@@ -404,7 +551,6 @@ function goToNextSection() {
     if (nextIndex < learningContent.sections.length) {
         currentQuiz = null;
         currentQuizSection = -1;
-        currentQuizId = null;
         document.getElementById('results-section').style.display = 'none';
         showSection(nextIndex);
     }
@@ -413,7 +559,6 @@ function goToNextSection() {
 function backToOverview() {
     currentQuiz = null;
     currentQuizSection = -1;
-    currentQuizId = null;
     document.getElementById('results-section').style.display = 'none';
     document.getElementById('sections-list').style.display = 'block';
     showSections();
@@ -451,24 +596,28 @@ document.getElementById('interview-form').addEventListener('submit', async (e) =
     showLoading(true);
     
     try {
-        const response = await fetch('/generate-interview-quiz', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ 
-                position_title: positionTitle,
-                company: company,
-                job_description: jobDescription 
-            })
-        });
-        
-        if (!response.ok) {
-            throw new Error('Failed to generate interview questions');
+        const payload = {
+            position_title: positionTitle,
+            company: company,
+            job_description: jobDescription
+        };
+        const streamed = await streamInterviewQuiz(payload, positionTitle, company);
+        if (!streamed) {
+            const response = await fetch('/generate-interview-quiz', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(payload)
+            });
+            
+            if (!response.ok) {
+                throw new Error('Failed to generate interview questions');
+            }
+            
+            interviewQuiz = await response.json();
+            showInterviewQuiz(positionTitle, company);
         }
-        
-        interviewQuiz = await response.json();
-        showInterviewQuiz(positionTitle, company);
     } catch (error) {
         alert('Error generating interview questions. Please try again.');
         console.error(error);
@@ -477,11 +626,72 @@ document.getElementById('interview-form').addEventListener('submit', async (e) =
     }
 });
 
+// Reads /generate-interview-quiz-stream and shows each batch of questions
+// as soon as its chunk is generated. Returns false when nothing was
+// received so the caller can fall back to the blocking endpoint.
+async function streamInterviewQuiz(payload, positionTitle, company) {
+    const response = await fetch('/generate-interview-quiz-stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(payload)
+    });
+    
+    if (!response.ok || !response.body) {
+        return false;
+    }
+    
+    let received = false;
+    
+    await readServerEvents(response, (event, message) => {
+        if (event === 'questions') {
+            if (!received) {
+                received = true;
+                interviewQuiz = { questions: [], streaming: true };
+                showLoading(false);
+            }
+            message.questions.forEach((q, i) => {
+                interviewQuiz.questions[message.offset + i] = q;
+            });
+            showInterviewQuiz(positionTitle, company);
+        } else if (event === 'done') {
+            interviewQuiz.streaming = false;
+            showInterviewQuiz(positionTitle, company);
+            console.log(`${message.questions} interview questions after ${message.total_ms} ms`);
+        } else if (event === 'error') {
+            if (!received) {
+                throw new Error(message.error);
+            }
+            interviewQuiz.streaming = false;
+            showInterviewQuiz(positionTitle, company);
+            alert('Some interview questions could not be generated.');
+        }
+    });
+    
+    if (received && interviewQuiz.streaming) {
+        interviewQuiz.streaming = false;
+        showInterviewQuiz(positionTitle, company);
+    }
+    return received;
+}
+
 function showInterviewQuiz(positionTitle, company) {
     document.getElementById('interview-input-screen').classList.remove('active');
     document.getElementById('interview-quiz-screen').classList.add('active');
     
-    document.getElementById('interview-info').textContent = `Answer these 20 questions to prepare for your ${positionTitle} interview at ${company}`;
+    const total = interviewQuiz.questions.length;
+    document.getElementById('interview-info').textContent = interviewQuiz.streaming
+        ? `Generating questions for your ${positionTitle} interview at ${company}... ${total} ready so far`
+        : `Answer these ${total} questions to prepare for your ${positionTitle} interview at ${company}`;
+    document.getElementById('interview-submit').disabled = Boolean(interviewQuiz.streaming);
+    
+    // The quiz is re-rendered as streamed questions arrive; keep the
+    // answers already picked.
+    const selected = {};
+    document.querySelectorAll('#interview-quiz-container input:checked').forEach(input => {
+        selected[input.name] = input.value;
+    });
     
     const container = document.getElementById('interview-quiz-container');
     container.innerHTML = '';
@@ -542,6 +752,13 @@ function showInterviewQuiz(positionTitle, company) {
             questionNumber++;
         });
     }
+    
+    Object.entries(selected).forEach(([name, value]) => {
+        const input = container.querySelector(`input[name="${name}"][value="${value}"]`);
+        if (input) {
+            input.checked = true;
+        }
+    });
 }
 
 async function submitInterviewQuiz() {
@@ -0,0 +1,468 @@
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+DEFAULT_TTL = int(os.environ.get('STORAGE_TTL_SECONDS', 6 * 60 * 60))
+DEFAULT_MAX_ENTRIES = int(os.environ.get('STORAGE_MAX_ENTRIES', 10000))
+DEFAULT_MAX_BYTES = int(
+    os.environ.get('STORAGE_MAX_BYTES', 128 * 1024 * 1024))
+
+SWEEP_INTERVAL = 60
+
+
+def estimate_size(value):
+    return len(json.dumps(value, separators=(',', ':')))
+
+
+class MemoryStore:
+    """Process-local key/value store with per-entry TTL and LRU eviction.
+
+    Entries may be tagged with an owner (the session id) so that everything
+    a session created, including preloaded quizzes that were never
+    activated, can be dropped in one call when the session resets.
+    """
+
+    def __init__(self,
+                 name,
+                 ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (value, expires_at, size, owner), oldest access first
+        self._data = OrderedDict()
+        self._owners = {}
+        self._bytes = 0
+        self._last_sweep = time.monotonic()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[1] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None, owner=None):
+        size = estimate_size(value)
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size, owner)
+            self._bytes += size
+            if owner is not None:
+                self._owners.setdefault(owner, set()).add(key)
+            self._enforce_limits(keep=key)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+                return True
+            return False
+
+    def evict_owner(self, owner):
+        with self._lock:
+            keys = self._owners.pop(owner, set())
+            for key in keys:
+                entry = self._data.pop(key, None)
+                if entry is not None:
+                    self._bytes -= entry[2]
+            return len(keys)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] > time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'backend': 'memory',
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+    def _remove(self, key):
+        value, expires_at, size, owner = self._data.pop(key)
+        self._bytes -= size
+        if owner is not None:
+            keys = self._owners.get(owner)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._owners[owner]
+
+    def _sweep_expired(self):
+        now = time.monotonic()
+        expired = [k for k, entry in self._data.items() if entry[1] <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        self._last_sweep = now
+
+    def _enforce_limits(self, keep):
+        if time.monotonic() - self._last_sweep > SWEEP_INTERVAL:
+            self._sweep_expired()
+        if (len(self._data) <= self.max_entries
+                and self._bytes <= self.max_bytes):
+            return
+        self._sweep_expired()
+        while (len(self._data) > self.max_entries
+               or self._bytes > self.max_bytes) and len(self._data) > 1:
+            oldest = next(iter(self._data))
+            if oldest == keep:
+                self._data.move_to_end(keep)
+                oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+
+class SQLiteStore:
+    """Store shared by every worker on the node through one SQLite file.
+
+    The database runs in WAL mode so readers never block the writer, and
+    each thread (and each forked worker) opens its own connection. TTL,
+    LRU and owner semantics match MemoryStore; hit/miss counters are kept
+    per process.
+    """
+
+    TOUCH_INTERVAL = 30
+    LIMIT_CHECK_EVERY = 100
+
+    def __init__(self,
+                 name,
+                 path,
+                 ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.name = name
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self._connect()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path,
+                               timeout=10,
+                               isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                     'store TEXT NOT NULL, key TEXT NOT NULL, '
+                     'value TEXT NOT NULL, expires_at REAL NOT NULL, '
+                     'accessed_at REAL NOT NULL, size INTEGER NOT NULL, '
+                     'owner TEXT, PRIMARY KEY (store, key))')
+        conn.execute('CREATE INDEX IF NOT EXISTS entries_owner '
+                     'ON entries (store, owner)')
+        conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed '
+                     'ON entries (store, accessed_at)')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT value, expires_at, accessed_at FROM entries '
+            'WHERE store = ? AND key = ?', (self.name, key)).fetchone()
+        now = time.time()
+        if row is None:
+            self.misses += 1
+            return default
+        if row[1] <= now:
+            conn.execute('DELETE FROM entries WHERE store = ? AND key = ?',
+                         (self.name, key))
+            self.expirations += 1
+            self.misses += 1
+            return default
+        if now - row[2] > self.TOUCH_INTERVAL:
+            conn.execute(
+                'UPDATE entries SET accessed_at = ? '
+                'WHERE store = ? AND key = ?', (now, self.name, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None, owner=None):
+        payload = json.dumps(value, separators=(',', ':'))
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO entries '
+            '(store, key, value, expires_at, accessed_at, size, owner) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (self.name, key, payload, expires_at, now, len(payload), owner))
+        self._writes += 1
+        if self._writes % self.LIMIT_CHECK_EVERY == 0:
+            self._enforce_limits(conn)
+
+    def delete(self, key):
+        cursor = self._connect().execute(
+            'DELETE FROM entries WHERE store = ? AND key = ?',
+            (self.name, key))
+        return cursor.rowcount > 0
+
+    def evict_owner(self, owner):
+        cursor = self._connect().execute(
+            'DELETE FROM entries WHERE store = ? AND owner = ?',
+            (self.name, owner))
+        return cursor.rowcount
+
+    def __contains__(self, key):
+        row = self._connect().execute(
+            'SELECT 1 FROM entries WHERE store = ? AND key = ? '
+            'AND expires_at > ?', (self.name, key, time.time())).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self._connect().execute(
+            'SELECT COUNT(*) FROM entries WHERE store = ?',
+            (self.name, )).fetchone()[0]
+
+    def stats(self):
+        entries, size = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries '
+            'WHERE store = ?', (self.name, )).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'name': self.name,
+            'backend': 'sqlite',
+            'entries': entries,
+            'bytes': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expirations': self.expirations,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
+
+    def _enforce_limits(self, conn):
+        cursor = conn.execute(
+            'DELETE FROM entries WHERE store = ? AND expires_at <= ?',
+            (self.name, time.time()))
+        self.expirations += cursor.rowcount
+        entries, size = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries '
+            'WHERE store = ?', (self.name, )).fetchone()
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return
+        victims = []
+        for key, entry_size in conn.execute(
+                'SELECT key, size FROM entries WHERE store = ? '
+                'ORDER BY accessed_at', (self.name, )):
+            if entries <= self.max_entries and size <= self.max_bytes:
+                break
+            victims.append((self.name, key))
+            entries -= 1
+            size -= entry_size
+        conn.executemany('DELETE FROM entries WHERE store = ? AND key = ?',
+                         victims)
+        self.evictions += len(victims)
+
+
+class RedisStore:
+    """Store backed by any server speaking the Redis protocol (RESP).
+
+    Only a handful of commands are used (GET, SET PX, DEL, SADD, SMEMBERS,
+    PEXPIRE, PTTL, SCAN), so a local stand-in such as
+    benchmarks/resp_server.py can serve it. Size limits and LRU eviction
+    are delegated to the server's maxmemory policy. len() scans the
+    store's keys, so it is meant for stats, not hot paths.
+    """
+
+    def __init__(self, name, url, ttl=DEFAULT_TTL):
+        parsed = urlparse(url)
+        self.name = name
+        self.ttl = ttl
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key):
+        return f'learning:{self.name}:{key}'
+
+    def _owner_key(self, owner):
+        return f'learning:{self.name}:owner:{owner}'
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        sock = socket.create_connection((self.host, self.port), timeout=5)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile('rb'))
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        if self.password:
+            self._command('AUTH', self.password)
+        if self.db:
+            self._command('SELECT', self.db)
+        return conn
+
+    def _command(self, *args):
+        sock, reader = self._connection()
+        parts = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(f'${len(data)}\r\n'.encode() + data + b'\r\n')
+        try:
+            sock.sendall(b''.join(parts))
+            return _read_reply(reader)
+        except (OSError, ConnectionError):
+            self._local.conn = None
+            raise
+
+    def get(self, key, default=None):
+        raw = self._command('GET', self._key(key))
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None, owner=None):
+        ttl_ms = int((self.ttl if ttl is None else ttl) * 1000)
+        payload = json.dumps(value, separators=(',', ':'))
+        self._command('SET', self._key(key), payload, 'PX', ttl_ms)
+        if owner is not None:
+            owner_key = self._owner_key(owner)
+            self._command('SADD', owner_key, key)
+            # The index lives as long as the longest-lived entry it tracks.
+            # PTTL is -1 for the set SADD just created.
+            if self._command('PTTL', owner_key) < ttl_ms:
+                self._command('PEXPIRE', owner_key, ttl_ms)
+
+    def delete(self, key):
+        return bool(self._command('DEL', self._key(key)))
+
+    def evict_owner(self, owner):
+        owner_key = self._owner_key(owner)
+        keys = self._command('SMEMBERS', owner_key) or []
+        removed = 0
+        if keys:
+            removed = self._command('DEL',
+                                    *[self._key(k.decode()) for k in keys])
+        self._command('DEL', owner_key)
+        return removed
+
+    def __contains__(self, key):
+        return bool(self._command('EXISTS', self._key(key)))
+
+    def __len__(self):
+        owners = self._owner_key('').encode()
+        count = 0
+        cursor = b'0'
+        while True:
+            cursor, keys = self._command('SCAN', cursor, 'MATCH',
+                                         self._key('*'), 'COUNT', 1000)
+            count += sum(1 for key in keys if not key.startswith(owners))
+            if cursor == b'0':
+                return count
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'name': self.name,
+            'backend': 'redis',
+            'entries': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
+
+
+def _read_reply(reader):
+    line = reader.readline()
+    if not line:
+        raise ConnectionError('Connection closed by storage server')
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode()
+    if kind == b'-':
+        raise RuntimeError(rest.decode())
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        count = int(rest)
+        if count < 0:
+            return None
+        return [_read_reply(reader) for _ in range(count)]
+    raise RuntimeError(f'Unexpected reply from storage server: {line!r}')
+
+
+def create_store(name,
+                 ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES):
+    backend = os.environ.get('STORAGE_BACKEND', 'sqlite')
+    if backend == 'memory':
+        return MemoryStore(name,
+                           ttl=ttl,
+                           max_entries=max_entries,
+                           max_bytes=max_bytes)
+    if backend == 'sqlite':
+        path = os.environ.get(
+            'STORAGE_PATH',
+            os.path.join(tempfile.gettempdir(), 'learning-app.sqlite3'))
+        return SQLiteStore(name,
+                           path,
+                           ttl=ttl,
+                           max_entries=max_entries,
+                           max_bytes=max_bytes)
+    if backend == 'redis':
+        url = os.environ.get('STORAGE_REDIS_URL', 'redis://localhost:6379/0')
+        return RedisStore(name, url, ttl=ttl)
+    raise RuntimeError(f'Unknown STORAGE_BACKEND: {backend}')
@@ -0,0 +1,90 @@
+import json
+
+
+class LearningContentStreamParser:
+    """Incrementally scans a streamed learning-plan JSON document.
+
+    Feed it text chunks as they arrive; it returns ('overview', str) once the
+    top-level overview string is complete and ('section', dict) each time an
+    object inside the top-level "sections" array closes. Only the current
+    element is re-parsed, so the cost stays linear in the response size.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_key = None
+        self._current_key = None
+        self._awaiting_value = False
+        self._value_start = None
+        self._in_sections = False
+        self._element_start = None
+
+    def feed(self, chunk):
+        self.text += chunk
+        events = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            depth = len(self._stack)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if depth == 1:
+                        self._close_top_level_string(i, events)
+                continue
+
+            if depth == 1 and self._awaiting_value and not char.isspace():
+                self._awaiting_value = False
+                self._value_start = i
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char == ':' and depth == 1:
+                self._current_key = self._last_key
+                self._awaiting_value = True
+            elif char in '{[':
+                self._stack.append(char)
+                if depth == 1 and char == '[' and (self._current_key
+                                                   == 'sections'):
+                    self._in_sections = True
+                elif depth == 2 and char == '{' and self._in_sections:
+                    self._element_start = i
+            elif char in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if (depth == 3 and char == '}' and self._in_sections
+                        and self._element_start is not None):
+                    element = self._parse(self._element_start, i)
+                    self._element_start = None
+                    if isinstance(element, dict):
+                        events.append(('section', element))
+                elif depth == 2 and self._in_sections:
+                    self._in_sections = False
+        self._pos = len(text)
+        return events
+
+    def _close_top_level_string(self, end, events):
+        value = self._parse(self._string_start, end)
+        if self._value_start == self._string_start:
+            self._value_start = None
+            if self._current_key == 'overview' and isinstance(value, str):
+                events.append(('overview', value))
+        else:
+            self._last_key = value
+
+    def _parse(self, start, end):
+        try:
+            return json.loads(self.text[start:end + 1])
+        except json.JSONDecodeError:
+            return None
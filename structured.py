@@ -0,0 +1,344 @@
+"""Schema-enforced JSON outputs for the model calls.
+
+Each document the model returns is described by a pydantic model. The same
+model produces the strict JSON schema sent as response_format (structured
+outputs) and validates the reply. Validation is per list item, so one bad
+quiz question or section does not sink the document: the valid items are
+kept, a reply cut off mid-way is repaired back to its last complete item,
+and structured_completion() re-requests only the items that are missing,
+a bounded number of times.
+"""
+import json
+import os
+from typing import ClassVar, Literal, get_args
+
+from pydantic import BaseModel, ValidationError, field_validator, model_validator
+
+import metrics
+from llm import chat_completion, routed
+
+STRUCTURED_OUTPUT_RETRIES = int(
+    os.environ.get('STRUCTURED_OUTPUT_RETRIES', 1))
+
+
+class QuizQuestion(BaseModel):
+    question: str
+    options: list[str]
+    correct_answer: int
+
+    @field_validator('options', mode='before')
+    @classmethod
+    def usable_options(cls, options):
+        if not isinstance(options, list):
+            raise ValueError('options must be a list')
+        options = [str(option) for option in options if option][:4]
+        if len(options) < 2:
+            raise ValueError('at least two options are required')
+        return options
+
+    @model_validator(mode='after')
+    def answer_is_an_option(self):
+        if not 0 <= self.correct_answer < len(self.options):
+            raise ValueError('correct_answer does not point at an option')
+        return self
+
+
+class InterviewQuestion(QuizQuestion):
+    category: Literal['behavioral', 'technical']
+
+
+class OutlineSection(BaseModel):
+    title: str
+    estimated_time: int
+    key_points: list[str]
+
+    @field_validator('title')
+    @classmethod
+    def has_title(cls, title):
+        if not title.strip():
+            raise ValueError('title is empty')
+        return title
+
+    @field_validator('estimated_time', mode='before')
+    @classmethod
+    def minutes(cls, estimated_time):
+        try:
+            return int(float(estimated_time))
+        except (TypeError, ValueError):
+            return 5
+
+    @field_validator('key_points', mode='before')
+    @classmethod
+    def printable_points(cls, key_points):
+        if not isinstance(key_points, list):
+            return []
+        return [
+            str(point) for point in key_points
+            if point and isinstance(point, (str, int, float))
+        ]
+
+
+class Section(OutlineSection):
+    content: str
+
+    @field_validator('content')
+    @classmethod
+    def has_content(cls, content):
+        if not content.strip():
+            raise ValueError('content is empty')
+        return content
+
+
+class Document(BaseModel):
+    # Name of the list field validated item by item.
+    items_field: ClassVar[str]
+
+    @classmethod
+    def item_model(cls):
+        return get_args(cls.model_fields[cls.items_field].annotation)[0]
+
+
+class Quiz(Document):
+    items_field: ClassVar[str] = 'questions'
+    questions: list[QuizQuestion]
+
+
+class InterviewQuiz(Document):
+    items_field: ClassVar[str] = 'questions'
+    questions: list[InterviewQuestion]
+
+
+class LearningPlan(Document):
+    items_field: ClassVar[str] = 'sections'
+    overview: str
+    sections: list[Section]
+
+
+class LearningOutline(Document):
+    items_field: ClassVar[str] = 'sections'
+    overview: str
+    sections: list[OutlineSection]
+
+
+def _strict(schema):
+    # Structured outputs need every property listed as required, no extra
+    # properties and no defaults.
+    if not isinstance(schema, dict):
+        return schema
+    schema.pop('title', None)
+    schema.pop('default', None)
+    properties = schema.get('properties')
+    if schema.get('type') == 'object' and properties is not None:
+        schema['required'] = list(properties)
+        schema['additionalProperties'] = False
+        for value in properties.values():
+            _strict(value)
+    for key in ('items', 'anyOf', '$defs'):
+        value = schema.get(key)
+        if isinstance(value, list):
+            for item in value:
+                _strict(item)
+        elif key == '$defs' and isinstance(value, dict):
+            for item in value.values():
+                _strict(item)
+        else:
+            _strict(value)
+    return schema
+
+
+def response_format(document):
+    return {
+        'type': 'json_schema',
+        'json_schema': {
+            'name': document.__name__,
+            'strict': True,
+            'schema': _strict(document.model_json_schema())
+        }
+    }
+
+
+def repair_truncated_json(text):
+    """Parses a JSON document that was cut off, keeping everything up to the
+    last complete element of the array that was open, or returns None.
+    """
+    stack = []
+    in_string = False
+    escape = False
+    cut = None
+    for i, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append(char)
+        elif char in '}]':
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                break
+            if stack[-1] == '[':
+                cut = (i + 1, list(stack))
+    if cut is None:
+        return None
+    end, still_open = cut
+    closing = ''.join('}' if char == '{' else ']'
+                      for char in reversed(still_open))
+    try:
+        return json.loads(text[:end] + closing)
+    except json.JSONDecodeError:
+        return None
+
+
+class Parsed:
+
+    def __init__(self, fields, items, invalid, repaired):
+        # items holds the validated items in reply order, with None where
+        # an item failed validation.
+        self.fields = fields
+        self.items = items
+        self.invalid = invalid
+        self.repaired = repaired
+
+    def valid_items(self):
+        return [item for item in self.items if item is not None]
+
+
+def parse_document(document, data, repaired=False):
+    """Validates a decoded reply item by item; returns Parsed or None when
+    it is not a document of this shape at all.
+    """
+    if not isinstance(data, dict) or not isinstance(
+            data.get(document.items_field), list):
+        return None
+    item_model = document.item_model()
+    items = []
+    invalid = []
+    for item in data[document.items_field]:
+        try:
+            items.append(item_model.model_validate(item).model_dump())
+        except ValidationError:
+            items.append(None)
+            invalid.append(item)
+    fields = {
+        name: data.get(name)
+        for name in document.model_fields if name != document.items_field
+    }
+    return Parsed(fields, items, invalid, repaired)
+
+
+def parse_reply(document, raw):
+    try:
+        data = json.loads(raw)
+        repaired = False
+    except json.JSONDecodeError:
+        data = repair_truncated_json(raw)
+        repaired = True
+    return parse_document(document, data, repaired)
+
+
+def _count(endpoint, result):
+    metrics.inc('llm_structured_outputs_total', {
+        'endpoint': endpoint,
+        'result': result
+    })
+
+
+def structured_completion(client,
+                          endpoint,
+                          document,
+                          messages,
+                          expected=None,
+                          retry_messages=None,
+                          retries=STRUCTURED_OUTPUT_RETRIES,
+                          **kwargs):
+    """Runs a completion constrained to document's schema and returns
+    (fields, items): the document's other fields and its validated items,
+    or (None, None) if nothing usable came back.
+
+    When items are invalid or fewer than expected, retry_messages(missing,
+    items, invalid) builds a follow-up request for just those items; the
+    replacements fill the invalid slots first and are appended after that.
+
+    Without a model in kwargs, the endpoint's routed model is used and the
+    route's other model gets the whole document again if nothing usable
+    came back (see llm.routed).
+    """
+    if 'model' not in kwargs:
+        return routed(
+            endpoint, lambda model: structured_completion(
+                client, endpoint, document, messages, expected,
+                retry_messages, retries, **dict(kwargs, model=model)),
+            lambda result: result[1] is not None)
+
+    kwargs['response_format'] = response_format(document)
+
+    def request(request_messages):
+        response = chat_completion(client,
+                                   endpoint,
+                                   messages=request_messages,
+                                   **kwargs)
+        raw = response.choices[0].message.content
+        parsed = parse_reply(document, raw) if raw else None
+        if parsed is None:
+            metrics.record_parse_failure(endpoint, 'json')
+        elif parsed.repaired:
+            metrics.record_parse_failure(endpoint, 'truncated')
+        if parsed is not None and parsed.invalid:
+            metrics.record_parse_failure(endpoint, 'invalid')
+        return parsed
+
+    parsed = request(messages)
+    attempts = 0
+    while parsed is None and attempts < retries:
+        attempts += 1
+        metrics.inc('llm_structured_retries_total', {'endpoint': endpoint})
+        parsed = request(messages)
+    if parsed is None:
+        _count(endpoint, 'failed')
+        return None, None
+
+    items = parsed.items
+    invalid = parsed.invalid
+
+    def missing():
+        valid = sum(1 for item in items if item is not None)
+        shortfall = expected - valid if expected else 0
+        return max(len(invalid), shortfall)
+
+    while missing() and retry_messages and attempts < retries:
+        attempts += 1
+        metrics.inc('llm_structured_retries_total', {'endpoint': endpoint})
+        retry = request(
+            retry_messages(missing(),
+                           [item for item in items if item is not None],
+                           invalid))
+        if retry is None:
+            continue
+        replacements = retry.valid_items()[:missing()]
+        for i, item in enumerate(items):
+            if item is None and replacements:
+                items[i] = replacements.pop(0)
+        items.extend(replacements)
+        invalid = invalid[:sum(1 for item in items if item is None)]
+
+    items = [item for item in items if item is not None]
+    if expected:
+        items = items[:expected]
+    if not items:
+        _count(endpoint, 'failed')
+        return None, None
+    if attempts:
+        _count(endpoint, 'retried')
+    elif parsed.repaired or parsed.invalid:
+        _count(endpoint, 'repaired')
+    else:
+        _count(endpoint, 'valid')
+    return parsed.fields, items
@@ -0,0 +1,63 @@
+import unittest
+
+from similarity import SimilarityCache
+from storage import MemoryStore
+
+ANSWER = 'cached answer'
+
+
+class SimilarityCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = SimilarityCache(MemoryStore('eli5_test'))
+        self.bucket = self.cache.bucket_key('python', 'basics')
+
+    def answer_for(self, cached, question):
+        self.cache.add(self.bucket, cached, ANSWER)
+        answer, _ = self.cache.lookup(self.bucket, question)
+        return answer
+
+    def test_reuses_rephrased_question(self):
+        for cached, question in [
+            ('What is the difference between a list and a tuple?',
+             'difference between lists and tuples'),
+            ('What is a tuple?', 'Can you explain tuples?'),
+            ('GET vs POST', 'What is the difference between GET and POST'),
+        ]:
+            with self.subTest(question=question):
+                self.setUp()
+                self.assertEqual(self.answer_for(cached, question), ANSWER)
+
+    def test_different_questions_miss(self):
+        for cached, question in [
+            ('What is the difference between a list and a tuple?',
+             'What is the difference between a list and a set?'),
+            ('GET vs POST', 'PUT vs POST'),
+            ('How is recursion used in this algorithm?',
+             'How is iteration used in this algorithm?'),
+            ('Why use recursion instead of iteration?',
+             'Why use iteration instead of recursion?'),
+            ('What is a list?', 'What is a linked list?'),
+        ]:
+            with self.subTest(question=question):
+                self.setUp()
+                self.assertIsNone(self.answer_for(cached, question))
+
+    def test_question_of_stopwords_only_matches_same_text(self):
+        self.assertEqual(self.answer_for('What is this?', 'what is THIS'),
+                         ANSWER)
+
+    def test_question_of_stopwords_only_misses_other_text(self):
+        self.assertIsNone(self.answer_for('What is this?', 'Why is this?'))
+        self.assertIsNone(self.answer_for('What is this?', 'What is a set?'))
+
+    def test_other_questions_in_bucket_do_not_block_a_match(self):
+        for cached in ('What is a set?', 'What is a dict?',
+                       'What is a list comprehension?'):
+            self.cache.add(self.bucket, cached, cached)
+        self.assertEqual(self.answer_for('What is a tuple?', 'Explain tuples'),
+                         ANSWER)
+
+
+if __name__ == '__main__':
+    unittest.main()